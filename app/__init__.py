@@ -1,23 +1,27 @@
+import os
 from flask import Flask, render_template
-from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, current_user
-from flask_migrate import Migrate
 
-from app.config import Config
+from app.config import Config, config
+from app.utils.engine import RoutingSQLAlchemy
 
 # Initialize extensions
-db = SQLAlchemy()
+db = RoutingSQLAlchemy()
 login_manager = LoginManager()
-migrate = Migrate()
 
-def create_app(config_class=Config):
+def create_app(config_class=None):
     app = Flask(__name__)
-    app.config.from_object(config_class)
+    # FLASK_ENV picks the development, testing or production settings;
+    # anything else gets the base configuration
+    app.config.from_object(config_class or config.get(os.environ.get('FLASK_ENV'), Config))
 
     # Initialize extensions with app
     db.init_app(app)
     login_manager.init_app(app)
-    migrate.init_app(app, db)
+    
+    # Connection pool, read replica and per-connection SQLite tuning
+    from app.utils.engine import init_engine
+    init_engine(app)
     
     # Update login view to use members blueprint
     login_manager.login_view = 'members.login'
@@ -29,15 +33,31 @@ def create_app(config_class=Config):
     from app.routes.member_routes import members_bp
     from app.routes.circulation_routes import circulation_bp
     from app.routes.report_routes import reports_bp
+    from app.routes.api_routes import api_bp
 
     app.register_blueprint(books_bp)
     app.register_blueprint(members_bp)
     app.register_blueprint(circulation_bp)
     app.register_blueprint(reports_bp)
+    app.register_blueprint(api_bp)
+
+    # Count SQL statements per request
+    from app.utils.query_counter import init_query_counter
+    init_query_counter(app)
+
+    # Latency, SQL time and slow-query log per endpoint, served at /metrics
+    from app.utils.metrics import init_metrics
+    init_metrics(app)
+
+    # Cache hot reads (report aggregates, book pages, category lists)
+    from app.utils.cache import init_cache
+    init_cache(app)
 
-    # Create database tables
-    with app.app_context():
-        db.create_all()
+    # Register CLI commands (and `flask db` when run from the flask command).
+    # The schema is managed by migrations: `flask bootstrap` creates or
+    # upgrades it, so starting a worker never touches DDL
+    from app.commands import register_commands
+    register_commands(app)
 
     @app.route('/')
     def index():
@@ -46,20 +66,8 @@ def create_app(config_class=Config):
         
         # Add dashboard statistics if user is an admin
         if current_user.is_authenticated and current_user.is_admin:
-            from app.models.book import Book
-            from app.models.member import Member
-            from app.models.circulation import Circulation
-            from sqlalchemy import func
-            from datetime import datetime
-            
-            # Collect stats for admin dashboard
-            stats['total_books'] = db.session.query(func.sum(Book.quantity)).scalar() or 0
-            stats['total_members'] = Member.query.count()
-            stats['active_loans'] = Circulation.query.filter(Circulation.return_date.is_(None)).count()
-            stats['overdue_loans'] = Circulation.query.filter(
-                Circulation.return_date.is_(None),
-                Circulation.due_date < datetime.utcnow()
-            ).count()
+            from app.utils.stats import dashboard_stats
+            stats = dashboard_stats()
         
         # Render the homepage with stats
         return render_template('index.html', **stats)
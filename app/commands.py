@@ -0,0 +1,639 @@
+import click
+from flask.cli import with_appcontext
+from app import db
+
+
+@click.command('bootstrap')
+@with_appcontext
+def bootstrap_command():
+    """Create the database schema, or upgrade it to the latest migration
+
+    Run once per deploy, before starting the web workers. Databases whose
+    tables were created before migrations were used have to be stamped
+    with the matching revision first (see ``flask db stamp``).
+    """
+    from flask_migrate import upgrade
+    from sqlalchemy import inspect
+
+    tables = set(inspect(db.engine).get_table_names())
+    if tables and 'alembic_version' not in tables:
+        raise click.ClickException(
+            'The database has tables but no migration history. Stamp it with the revision '
+            'its schema matches (e.g. `flask db stamp b472ca279a85`), then run bootstrap again.'
+        )
+    upgrade()
+    click.echo('Schema is up to date.')
+
+
+@click.command('benchmark-startup')
+@click.option('--runs', default=5, show_default=True, help='Fresh interpreters to time.')
+@click.option('--path', default='/books/', show_default=True, help='Path of the first request.')
+@click.option('--top', default=10, show_default=True, help='Slowest top-level imports to list.')
+@click.option('--budget', type=float, help='Fail if the median time to first response exceeds this many seconds.')
+def benchmark_startup_command(runs, path, top, budget):
+    """Time a worker's start: imports, create_app and its first request
+
+    Each run starts a new interpreter, as a gunicorn worker would, creates
+    the app outside the flask command and serves ``--path`` through the
+    test client. One more run under ``python -X importtime`` lists the
+    slowest imports.
+    """
+    import json
+    import statistics
+    import subprocess
+    import sys
+    import time
+
+    probe = (
+        'import json, time; started = time.perf_counter()\n'
+        'from app import create_app; imported = time.perf_counter()\n'
+        'app = create_app(); created = time.perf_counter()\n'
+        f'status = app.test_client().get({path!r}).status_code; served = time.perf_counter()\n'
+        'print(json.dumps({"import": imported - started, "create_app": created - imported, '
+        '"first_request": served - created, "status": status}))'
+    )
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        output = subprocess.run([sys.executable, '-c', probe], capture_output=True, text=True, check=True)
+        timing = json.loads(output.stdout.strip().splitlines()[-1])
+        timing['total'] = time.perf_counter() - started
+        timings.append(timing)
+
+    for phase in ('import', 'create_app', 'first_request', 'total'):
+        values = [timing[phase] for timing in timings]
+        click.echo(f'{phase:<14} median {statistics.median(values) * 1000:7.1f}ms  '
+                   f'min {min(values) * 1000:7.1f}ms')
+    click.echo(f'first response: HTTP {timings[-1]["status"]} for {path}')
+
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'from app import create_app; create_app()'],
+                            capture_output=True, text=True, check=True)
+    imports = []
+    for line in output.stderr.splitlines():
+        fields = line.split('|')
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        name = fields[2].rstrip()
+        # Top-level imports are indented by a single space
+        if not name.startswith('  '):
+            imports.append((int(fields[1]), name.strip()))
+    click.echo('slowest top-level imports (cumulative):')
+    for microseconds, name in sorted(imports, reverse=True)[:top]:
+        click.echo(f'  {microseconds / 1000:7.1f}ms  {name}')
+
+    median_total = statistics.median(timing['total'] for timing in timings)
+    if budget is not None and median_total > budget:
+        raise click.ClickException(f'Median time to first response {median_total:.2f}s is over the {budget:.2f}s budget.')
+
+
+@click.command('search-reindex')
+@with_appcontext
+def search_reindex_command():
+    """Create the book and member full-text indexes and rebuild them"""
+    from app.utils.search import rebuild_search_index
+
+    with db.engine.begin() as connection:
+        rebuild_search_index(connection)
+    click.echo('Search indexes rebuilt.')
+
+
+@click.command('explain-queries')
+@click.option('--verbose', '-v', is_flag=True, help='Print every query plan.')
+@with_appcontext
+def explain_queries_command(verbose):
+    """EXPLAIN the hot report and circulation queries; fail on full scans"""
+    from app.utils.query_plans import KNOWN_FULL_SCANS, check_query_plans
+
+    failures = 0
+    for name, plan, scans in check_query_plans(db.session.connection()):
+        status = 'FULL SCAN' if scans else 'known' if name in KNOWN_FULL_SCANS else 'ok'
+        click.echo(f'{status:<10} {name}')
+        for line in (plan if verbose else scans):
+            click.echo(f'           {line}')
+        failures += bool(scans)
+    db.session.rollback()
+
+    if failures:
+        raise click.ClickException(f'{failures} queries fall back to a full table scan.')
+
+
+@click.command('rollup-backfill')
+@click.option('--since', type=click.DateTime(formats=['%Y-%m-%d']),
+              help='Only rebuild days on or after this date (YYYY-MM-DD).')
+@with_appcontext
+def rollup_backfill_command(since):
+    """Rebuild the daily circulation rollup from the circulations table"""
+    from app.models.circulation_stats import DailyCirculationStat
+    from app.utils.stats import invalidate_stats
+
+    written = DailyCirculationStat.backfill(since=since.date() if since else None)
+    db.session.commit()
+    invalidate_stats()
+    click.echo(f'Wrote {written} daily rollup rows.')
+
+
+@click.command('import-books')
+@click.argument('source', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'marc']), default=None,
+              help='Input format; guessed from the file extension by default.')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows per upsert and commit.')
+@with_appcontext
+def import_books_command(source, fmt, batch_size):
+    """Bulk import or update books from a CSV or MARC text file, keyed on ISBN"""
+    from app.utils.importer import import_books
+
+    if fmt is None:
+        fmt = 'marc' if source.name.endswith(('.mrk', '.marc', '.txt')) else 'csv'
+
+    def progress(result):
+        click.echo(f'{result.rows} rows read, {result.imported} imported '
+                   f'({result.rows_per_second:.0f} rows/s)', err=True)
+
+    result = import_books(source, fmt=fmt, batch_size=batch_size, progress=progress)
+    for line, message in result.errors:
+        click.echo(f'line {line}: {message}', err=True)
+    if result.error_count > len(result.errors):
+        click.echo(f'... and {result.error_count - len(result.errors)} more errors', err=True)
+    click.echo(f'Imported {result.imported} books from {result.rows} rows in {result.elapsed:.1f}s '
+               f'({result.rows_per_second:.0f} rows/s); {result.duplicates} duplicate ISBNs merged, '
+               f'{result.error_count} rows rejected.')
+
+
+@click.command('seed')
+@click.option('--scale', default=0.01, show_default=True,
+              help='Size relative to 1M books, 200k members and 10M loans.')
+@click.option('--seed', default=42, show_default=True, help='Random seed; the same seed gives the same data.')
+@click.option('--batch-size', default=10000, show_default=True, help='Rows per INSERT and commit.')
+@click.option('--books', type=int, help='Override the number of books.')
+@click.option('--members', type=int, help='Override the number of members.')
+@click.option('--loans', type=int, help='Override the number of circulation records.')
+@click.option('--as-of', type=click.DateTime(formats=['%Y-%m-%d', '%Y-%m-%d %H:%M:%S']),
+              help='Generate history up to this UTC time instead of now.')
+@click.option('--reset', is_flag=True, help='Delete the existing library data first.')
+@with_appcontext
+def seed_command(scale, seed, batch_size, books, members, loans, as_of, reset):
+    """Generate a synthetic library for development and load testing"""
+    import logging
+    from app.models.book import Book
+    from app.models.member import Member
+    from app.utils.synthetic import DEMO_ACCOUNTS, MEMBER_PASSWORD, clear_library, generate_library
+
+    if reset:
+        clear_library()
+    elif db.session.query(Book.id).first() or db.session.query(Member.id).first():
+        raise click.ClickException('The database already has books or members; pass --reset to replace them.')
+    # Every batch INSERT would be reported as a slow query
+    logging.getLogger('app.utils.metrics').setLevel(logging.ERROR)
+
+    def progress(result):
+        click.echo(f'{result.step}: {result.rows} rows in {result.elapsed:.1f}s '
+                   f'({result.rows_per_second:.0f} rows/s)', err=True)
+
+    result = generate_library(scale, seed, batch_size, books, members, loans, as_of, progress)
+    counts = ', '.join(f'{count} {name}' for name, count in result.counts.items())
+    click.echo(f'Generated {counts} in {result.elapsed:.1f}s ({result.rows_per_second:.0f} rows/s).')
+    for first, last, email, password, is_admin in DEMO_ACCOUNTS:
+        click.echo(f'{"Admin" if is_admin else "Member"} sign-in: {email} / {password}')
+    click.echo(f'Every other member: <email> / {MEMBER_PASSWORD}')
+
+
+@click.command('stress-checkout')
+@click.option('--copies', default=5, show_default=True, help='Copies of the scratch book.')
+@click.option('--workers', default=8, show_default=True, help='Parallel threads.')
+@click.option('--attempts', default=5, show_default=True, help='Checkout attempts per thread.')
+@with_appcontext
+def stress_checkout_command(copies, workers, attempts):
+    """Race parallel checkouts and returns of one book; fail if it is oversold
+
+    Works on a scratch book and member that are removed afterwards.
+    """
+    import threading
+    import uuid
+    from flask import current_app
+    from app.models.book import Book
+    from app.models.book_copy import BookCopy
+    from app.models.member import Member
+    from app.models.circulation import Circulation
+    from app.models.circulation_stats import DailyCirculationStat
+    from app.utils.transactions import retry_on_conflict
+
+    app = current_app._get_current_object()
+    tag = uuid.uuid4().hex[:8]
+    book = Book(title=f'Stress test {tag}', author='Stress test', isbn=f'stress-{tag}',
+                quantity=0, available_quantity=0)
+    member = Member(member_id=f'STRESS-{tag}', first_name='Stress', last_name='Test',
+                    email=f'stress-{tag}@example.invalid', password_hash='!')
+    db.session.add_all([book, member])
+    db.session.flush()
+    BookCopy.add(book.id, copies)
+    db.session.commit()
+    book_id, member_id = book.id, member.id
+
+    def race(work):
+        outcomes = []
+        barrier = threading.Barrier(workers)
+
+        def worker():
+            with app.app_context():
+                barrier.wait()
+                for _ in range(attempts):
+                    try:
+                        outcomes.append(work())
+                    except Exception as error:
+                        db.session.rollback()
+                        outcomes.append(error)
+                db.session.remove()
+
+        threads = [threading.Thread(target=worker) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return outcomes
+
+    def check_out():
+        return retry_on_conflict(lambda: Circulation.check_out(book_id, member_id)) is not None
+
+    def return_one():
+        loan = Circulation.query.filter_by(book_id=book_id, return_date=None).first()
+        return loan is not None and retry_on_conflict(loan.return_book)
+
+    def report(label, outcomes, expected):
+        errors = [outcome for outcome in outcomes if isinstance(outcome, Exception)]
+        succeeded = outcomes.count(True)
+        db.session.expire_all()
+        state = db.session.query(Book.available_quantity).filter(Book.id == book_id).scalar()
+        open_loans = Circulation.query.filter_by(book_id=book_id, return_date=None).count()
+        on_loan = BookCopy.query.filter_by(book_id=book_id, status=BookCopy.ON_LOAN).count()
+        click.echo(f'{label}: {len(outcomes)} attempts, {succeeded} succeeded, '
+                   f'{len(errors)} gave up on lock conflicts; available={state}, open loans={open_loans}, '
+                   f'copies on loan={on_loan}')
+        return succeeded == expected and state == copies - open_loans and on_loan == open_loans
+
+    try:
+        ok = report('checkout', race(check_out), copies)
+        ok = report('return', race(return_one), copies) and ok
+    finally:
+        DailyCirculationStat.query.filter_by(book_id=book_id).delete()
+        Circulation.query.filter_by(book_id=book_id).delete()
+        BookCopy.query.filter_by(book_id=book_id).delete()
+        Book.query.filter_by(id=book_id).delete()
+        Member.query.filter_by(id=member_id).delete()
+        db.session.commit()
+
+    if not ok:
+        raise click.ClickException('Availability drifted from the loans recorded under concurrent load.')
+    click.echo('No overselling.')
+
+
+def _benchmark_writer(config, book_ids, member_id, checkouts, barrier, results):
+    """One process of ``benchmark-sqlite-writes``, standing in for a gunicorn worker"""
+    from sqlalchemy.exc import OperationalError
+    from app import create_app
+    from app.models.circulation import Circulation
+    from app.utils.transactions import ConflictError, retry_on_conflict
+
+    lent = gave_up = 0
+    try:
+        app = create_app(config)
+        with app.app_context():
+            barrier.wait()
+            for n in range(checkouts):
+                book_id = book_ids[(member_id + n) % len(book_ids)]
+                try:
+                    loan = retry_on_conflict(lambda: Circulation.check_out(book_id, member_id), attempts=5)
+                    lent += loan is not None
+                except (OperationalError, ConflictError):
+                    gave_up += 1
+    finally:
+        results.put((lent, gave_up))
+
+
+@click.command('benchmark-sqlite-writes')
+@click.option('--writers', default=8, show_default=True, help='Concurrent writer processes.')
+@click.option('--checkouts', default=200, show_default=True, help='Checkouts per writer.')
+@click.option('--books', default=20, show_default=True, help='Books the writers contend on.')
+def benchmark_sqlite_writes_command(writers, checkouts, books):
+    """Time concurrent checkouts against SQLite with and without the connection profile
+
+    Each run uses a fresh database file in a scratch directory, seeded
+    with enough copies for every checkout, and ``--writers`` processes
+    that each create the app and check books out as fast as they can. The
+    untuned run uses SQLite's defaults (rollback journal, full sync).
+    """
+    import multiprocessing
+    import os
+    import tempfile
+    import time
+    from app import create_app
+    from app.config import Config
+    from app.models.book import Book
+    from app.models.book_copy import BookCopy
+    from app.models.member import Member
+
+    context = multiprocessing.get_context('fork')
+    with tempfile.TemporaryDirectory() as scratch:
+        for label, tuned in (('untuned', False), ('tuned', True)):
+            config = type('BenchmarkConfig', (Config,), {
+                'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.join(scratch, label)}.db',
+                'SQLITE_TUNING': tuned,
+                'CACHE_URL': 'memory://',
+            })
+            app = create_app(config)
+            with app.app_context():
+                db.create_all()
+                book_rows = [Book(title=f'Benchmark {n}', author='Benchmark', isbn=f'bench-{n}',
+                                  quantity=0, available_quantity=0) for n in range(books)]
+                db.session.add_all(book_rows)
+                db.session.add_all([
+                    Member(id=n, member_id=f'BENCH-{n}', first_name='Bench', last_name=str(n),
+                           email=f'bench-{n}@example.invalid', password_hash='!')
+                    for n in range(1, writers + 1)
+                ])
+                db.session.flush()
+                book_ids = [book.id for book in book_rows]
+                per_book = -(-writers * checkouts // books)
+                BookCopy.add_many({book_id: per_book for book_id in book_ids})
+                db.session.commit()
+                db.session.remove()
+                db.get_engine(app).dispose()
+
+            barrier = context.Barrier(writers + 1)
+            results = context.Queue()
+            processes = [
+                context.Process(target=_benchmark_writer,
+                                args=(config, book_ids, member_id, checkouts, barrier, results))
+                for member_id in range(1, writers + 1)
+            ]
+            for process in processes:
+                process.start()
+            barrier.wait()
+            started = time.perf_counter()
+            outcomes = [results.get() for _ in processes]
+            elapsed = time.perf_counter() - started
+            for process in processes:
+                process.join()
+
+            lent = sum(outcome[0] for outcome in outcomes)
+            gave_up = sum(outcome[1] for outcome in outcomes)
+            click.echo(f'{label:<8} {writers} writers: {lent} checkouts in {elapsed:.2f}s '
+                       f'({lent / elapsed:.0f}/s), {gave_up} gave up after retrying lock conflicts')
+
+
+@click.command('accrue-fines')
+@click.option('--as-of', type=click.DateTime(formats=['%Y-%m-%d', '%Y-%m-%d %H:%M:%S']),
+              help='Accrue up to this UTC time instead of now.')
+@with_appcontext
+def accrue_fines_command(as_of):
+    """Store current overdue days and fines on open loans; run daily from cron"""
+    from app.models.circulation import Circulation
+    from app.utils.stats import invalidate_stats
+
+    updated = Circulation.accrue_fines(as_of)
+    db.session.commit()
+    invalidate_stats()
+    click.echo(f'Updated fines on {updated} overdue loans.')
+
+
+@click.command('benchmark-fines')
+@click.option('--loans', default=1000000, show_default=True, help='Synthetic open loans to accrue over.')
+@click.option('--batch-size', default=50000, show_default=True, help='Loans per insert batch.')
+@with_appcontext
+def benchmark_fines_command(loans, batch_size):
+    """Time fine accrual over synthetic open loans
+
+    The loans, two thirds of them overdue by up to 90 days, are inserted in
+    one transaction that is rolled back afterwards, so the database is left
+    as it was. Three runs are timed: the first accrual, an immediate rerun
+    (which must update nothing) and the next day's incremental run.
+    """
+    import time
+    import uuid
+    from datetime import datetime, timedelta
+    from app.models.book import Book
+    from app.models.member import Member
+    from app.models.circulation import Circulation
+
+    tag = uuid.uuid4().hex[:8]
+    book = Book(title=f'Fine benchmark {tag}', author='Fine benchmark', isbn=f'fines-{tag}',
+                quantity=loans, available_quantity=0)
+    member = Member(member_id=f'FINES-{tag}', first_name='Fine', last_name='Benchmark',
+                    email=f'fines-{tag}@example.invalid', password_hash='!')
+    db.session.add_all([book, member])
+    db.session.flush()
+
+    now = datetime.utcnow()
+    try:
+        started = time.perf_counter()
+        for first in range(0, loans, batch_size):
+            rows = []
+            for n in range(first, min(first + batch_size, loans)):
+                due_date = now + timedelta(days=30 - n % 120, seconds=-n % 86400)
+                rows.append({
+                    'book_id': book.id, 'member_id': member.id,
+                    'checkout_date': due_date - timedelta(days=14), 'due_date': due_date,
+                    'fine_amount': 0.0, 'fine_paid': False, 'overdue_days': 0,
+                    'row_version': 1, 'updated_at': now
+                })
+            db.session.execute(Circulation.__table__.insert(), rows)
+        click.echo(f'Inserted {loans} open loans in {time.perf_counter() - started:.1f}s')
+
+        for label, as_of in (('first run', now), ('rerun', now), ('next day', now + timedelta(days=1))):
+            started = time.perf_counter()
+            updated = Circulation.accrue_fines(as_of)
+            elapsed = time.perf_counter() - started
+            click.echo(f'{label:<10} {updated:>9} loans updated in {elapsed:.2f}s')
+    finally:
+        db.session.rollback()
+
+
+@click.command('expire-holds')
+@with_appcontext
+def expire_holds_command():
+    """Expire uncollected holds and pass their copies on; run daily from cron"""
+    from app.models.hold import Hold
+    from app.utils.transactions import retry_on_conflict
+
+    expired = retry_on_conflict(Hold.expire_ready)
+    click.echo(f'Expired {expired} uncollected holds.')
+
+
+@click.command('stress-holds')
+@click.option('--holds', default=5000, show_default=True, help='Members queueing for the scratch book.')
+@click.option('--copies', default=10, show_default=True, help='Copies of the scratch book, all on loan.')
+@click.option('--workers', default=8, show_default=True, help='Parallel threads returning copies.')
+@click.option('--cancels', default=500, show_default=True, help='Ready holds cancelled to time reallocation.')
+@with_appcontext
+def stress_holds_command(holds, copies, workers, cancels):
+    """Queue thousands of holds on one bestseller and race returns against it
+
+    Every copy is on loan and ``--holds`` members are waiting. The copies
+    are returned in parallel; each must go to a different hold at the head
+    of the queue and none may reach the shelf. Ready holds are then
+    cancelled one after another, timing how long passing the copy to the
+    next in line takes as the queue drains. Works on scratch rows that are
+    removed afterwards.
+    """
+    import threading
+    import time
+    import uuid
+    from datetime import datetime, timedelta
+    from flask import current_app
+    from app.models.book import Book
+    from app.models.book_copy import BookCopy
+    from app.models.member import Member
+    from app.models.circulation import Circulation
+    from app.models.circulation_stats import DailyCirculationStat
+    from app.models.hold import Hold
+    from app.utils.transactions import retry_on_conflict
+
+    app = current_app._get_current_object()
+    tag = uuid.uuid4().hex[:8]
+    now = datetime.utcnow()
+    book = Book(title=f'Bestseller {tag}', author='Stress test', isbn=f'holds-{tag}',
+                quantity=0, available_quantity=0)
+    db.session.add(book)
+    db.session.flush()
+    book_id = book.id
+    BookCopy.add(book_id, copies)
+    db.session.execute(Member.__table__.insert(), [
+        {'member_id': f'HOLDS-{tag}-{n}', 'first_name': 'Hold', 'last_name': f'Test {n}',
+         'email': f'holds-{tag}-{n}@example.invalid', 'password_hash': '!', 'is_active': True,
+         'is_admin': False, 'registration_date': now, 'row_version': 1, 'updated_at': now,
+         'balance_cents': 0}
+        for n in range(holds + 1)
+    ])
+    member_ids = [member_id for member_id, in db.session.query(Member.id).filter(
+        Member.member_id.like(f'HOLDS-{tag}-%')).order_by(Member.id)]
+    borrower_id, holder_ids = member_ids[0], member_ids[1:]
+    for _ in range(copies):
+        db.session.add(Circulation(book_id=book_id, member_id=borrower_id,
+                                   copy_id=Book.take_copy(book_id, now)))
+    db.session.execute(Hold.__table__.insert(), [
+        {'book_id': book_id, 'member_id': member_id, 'status': Hold.WAITING,
+         'placed_at': now - timedelta(seconds=holds - n)}
+        for n, member_id in enumerate(holder_ids)
+    ])
+    db.session.commit()
+
+    def return_one():
+        loan = Circulation.query.filter_by(book_id=book_id, return_date=None).first()
+        return loan is not None and retry_on_conflict(loan.return_book)
+
+    ok = True
+    try:
+        outcomes = []
+        barrier = threading.Barrier(workers)
+
+        def worker():
+            with app.app_context():
+                barrier.wait()
+                for _ in range(copies * 3):
+                    try:
+                        outcomes.append(return_one())
+                    except Exception as error:
+                        db.session.rollback()
+                        outcomes.append(error)
+                    if not Circulation.query.filter_by(book_id=book_id, return_date=None).count():
+                        break
+                db.session.remove()
+
+        threads = [threading.Thread(target=worker) for _ in range(workers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        db.session.expire_all()
+        available = db.session.query(Book.available_quantity).filter(Book.id == book_id).scalar()
+        ready = [member_id for member_id, in db.session.query(Hold.member_id).filter(
+            Hold.book_id == book_id, Hold.status == Hold.READY)]
+        errors = [outcome for outcome in outcomes if isinstance(outcome, Exception)]
+        click.echo(f'returns: {copies} copies in {elapsed:.2f}s, {len(errors)} gave up on lock conflicts; '
+                   f'ready holds={len(ready)}, available={available}')
+        ok = available == 0 and sorted(ready) == sorted(holder_ids[:copies])
+
+        timings = []
+        for _ in range(min(cancels, holds - copies)):
+            hold = Hold.query.filter_by(book_id=book_id, status=Hold.READY).first()
+            started = time.perf_counter()
+            retry_on_conflict(hold.cancel)
+            timings.append(time.perf_counter() - started)
+        if timings:
+            head, tail = timings[:len(timings) // 10 or 1], timings[-(len(timings) // 10 or 1):]
+            click.echo(f'reallocation on cancel: {len(timings)} runs, mean {sum(timings) / len(timings) * 1000:.2f}ms, '
+                       f'first 10% {sum(head) / len(head) * 1000:.2f}ms, last 10% {sum(tail) / len(tail) * 1000:.2f}ms, '
+                       f'queue left {Hold.queue_length(book_id)}')
+        still_ready = Hold.query.filter_by(book_id=book_id, status=Hold.READY).count()
+        available = db.session.query(Book.available_quantity).filter(Book.id == book_id).scalar()
+        on_hold = BookCopy.query.filter_by(book_id=book_id, status=BookCopy.ON_HOLD).count()
+        ok = ok and still_ready + available == copies and on_hold == still_ready
+    finally:
+        Hold.query.filter_by(book_id=book_id).delete()
+        DailyCirculationStat.query.filter_by(book_id=book_id).delete()
+        Circulation.query.filter_by(book_id=book_id).delete()
+        BookCopy.query.filter_by(book_id=book_id).delete()
+        Book.query.filter_by(id=book_id).delete()
+        Member.query.filter(Member.id.in_(member_ids)).delete(synchronize_session=False)
+        db.session.commit()
+
+    if not ok:
+        raise click.ClickException('Returned copies were not allocated to the head of the queue.')
+    click.echo('Every copy went to the next hold in line.')
+
+
+@click.command('copies-reconcile')
+@with_appcontext
+def copies_reconcile_command():
+    """Reset every book's quantity and availability counters from its copies"""
+    from app.models.book_copy import BookCopy
+    from app.utils.stats import invalidate_stats
+
+    changed = BookCopy.reconcile()
+    db.session.commit()
+    invalidate_stats()
+    click.echo(f'Corrected the counters of {changed} books.')
+
+
+@click.command('cache-clear')
+@click.argument('namespaces', nargs=-1)
+@with_appcontext
+def cache_clear_command(namespaces):
+    """Clear cached reads: the given namespaces (e.g. stats, catalog) or all"""
+    from app.utils.cache import cache_stats, clear_caches
+
+    known = cache_stats()['namespaces']
+    unknown = [name for name in namespaces if name not in known]
+    if unknown:
+        raise click.BadParameter(f'unknown namespace(s) {", ".join(unknown)}; choose from {", ".join(known)}')
+    clear_caches(*namespaces)
+    click.echo(f'Cleared {", ".join(namespaces or known)}.')
+
+
+def register_commands(app):
+    """Attach the application's CLI commands to the Flask app
+
+    Flask-Migrate, and with it Alembic, is only loaded when the app is
+    being created by the ``flask`` command, so web workers skip the import.
+    """
+    if click.get_current_context(silent=True) is not None:
+        from flask_migrate import Migrate
+        Migrate(app, db)
+
+    app.cli.add_command(bootstrap_command)
+    app.cli.add_command(benchmark_startup_command)
+    app.cli.add_command(search_reindex_command)
+    app.cli.add_command(explain_queries_command)
+    app.cli.add_command(rollup_backfill_command)
+    app.cli.add_command(import_books_command)
+    app.cli.add_command(seed_command)
+    app.cli.add_command(stress_checkout_command)
+    app.cli.add_command(benchmark_sqlite_writes_command)
+    app.cli.add_command(accrue_fines_command)
+    app.cli.add_command(benchmark_fines_command)
+    app.cli.add_command(expire_holds_command)
+    app.cli.add_command(stress_holds_command)
+    app.cli.add_command(copies_reconcile_command)
+    app.cli.add_command(cache_clear_command)
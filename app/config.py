@@ -14,6 +14,23 @@ class Config:
     # SQLAlchemy configuration
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///bibliotheca.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Optional read replica for read-only views (reports, catalog listings)
+    REPLICA_DATABASE_URL = os.environ.get('REPLICA_DATABASE_URL')
+    
+    # Connection pool per worker process (SQLite files too, when tuned)
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = 30  # seconds to wait for a free connection
+    DB_POOL_RECYCLE = 1800  # seconds before a connection is replaced
+    DB_POOL_PRE_PING = True
+    
+    # SQLite connection profile (ignored for other databases): WAL
+    # journaling and a busy timeout so several workers can share one file
+    SQLITE_TUNING = os.environ.get('SQLITE_TUNING', 'True').lower() == 'true'
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    SQLITE_CACHE_SIZE = int(os.environ.get('SQLITE_CACHE_SIZE', -64000))  # negative: KiB
+    SQLITE_FOREIGN_KEYS = True
     
     # Flask-Login configuration
     REMEMBER_COOKIE_DURATION = timedelta(days=14)
@@ -25,6 +42,9 @@ class Config:
     MAX_LOAN_DAYS = 14
     FINE_PER_DAY = 0.25  # 25 cents per day overdue
     MAX_BOOKS_PER_MEMBER = 5
+    MAX_BATCH_SIZE = 100  # Items per batch checkout/return request
+    MAX_HOLDS_PER_MEMBER = 5
+    HOLD_PICKUP_DAYS = 7  # Days a returned copy waits on the hold shelf
     
     # Email configuration for future use
     MAIL_SERVER = os.environ.get('MAIL_SERVER')
@@ -37,19 +57,61 @@ class Config:
     # Pagination settings
     BOOKS_PER_PAGE = 12
     MEMBERS_PER_PAGE = 15
+    CIRCULATIONS_PER_PAGE = 20
+    API_PER_PAGE = 25
+    
+    # Cache backend: memory:// (per worker), sqlite:////path/cache.db
+    # (shared by the workers on one host) or redis://host:6379/0
+    CACHE_URL = os.environ.get('CACHE_URL', 'memory://')
+    CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 1024))
+    # Seconds to cache dashboard and report aggregates (0 disables)
+    STATS_CACHE_TTL = int(os.environ.get('STATS_CACHE_TTL', 60))
+    # Seconds to cache book detail pages and category lists (0 disables)
+    CATALOG_CACHE_TTL = int(os.environ.get('CATALOG_CACHE_TTL', 300))
+    # Seconds to cache the logged-in member's identity between requests (0
+    # disables); only used with a shared CACHE_URL (sqlite:// or redis://)
+    IDENTITY_CACHE_TTL = int(os.environ.get('IDENTITY_CACHE_TTL', 30))
+    
+    # Query count guard: warn when a single request runs more statements
+    MAX_QUERIES_PER_REQUEST = int(os.environ.get('MAX_QUERIES_PER_REQUEST', 30))
+    QUERY_COUNT_HEADER = False
+    
+    # Request instrumentation: a log line for every SQL statement slower
+    # than SLOW_QUERY_MS (0 disables), /metrics and, when enabled, a
+    # Server-Timing header showing SQL time and query counts to the client
+    SERVER_TIMING_HEADER = os.environ.get('SERVER_TIMING_HEADER', 'False').lower() == 'true'
+    SLOW_QUERY_MS = int(os.environ.get('SLOW_QUERY_MS', 250))
+    # SQLite file the workers publish their metrics to, so /metrics covers
+    # all of them; unset, /metrics reports the worker that answers
+    METRICS_DB = os.environ.get('METRICS_DB')
+    METRICS_PUBLISH_SECONDS = 1.0
+    # Bearer token that opens /metrics to scrapers; admins and requests
+    # from this host can read it without one
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
 
 class DevelopmentConfig(Config):
     """Development configuration."""
     DEBUG = True
+    DB_POOL_SIZE = 2
+    DB_MAX_OVERFLOW = 2
+    SERVER_TIMING_HEADER = True
 
 class TestingConfig(Config):
     """Testing configuration."""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///test.db'
+    QUERY_COUNT_HEADER = True
+    DB_POOL_SIZE = 1
+    DB_MAX_OVERFLOW = 0
+    DB_POOL_PRE_PING = False
 
 class ProductionConfig(Config):
     """Production configuration."""
     DEBUG = False
+    # Sized for gunicorn's threads per worker plus background work
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 5))
+    DB_POOL_RECYCLE = 900
 
 # Configuration dictionary to easily switch between environments
 config = {
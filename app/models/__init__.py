@@ -1,5 +1,9 @@
 from app.models.book import Book
+from app.models.book_copy import BookCopy
 from app.models.member import Member
 from app.models.circulation import Circulation
+from app.models.circulation_stats import DailyCirculationStat
+from app.models.fines import FineLedgerEntry
+from app.models.hold import Hold
 
-__all__ = ['Book', 'Member', 'Circulation']
\ No newline at end of file
+__all__ = ['Book', 'BookCopy', 'Member', 'Circulation', 'DailyCirculationStat', 'FineLedgerEntry', 'Hold']
\ No newline at end of file
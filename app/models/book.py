@@ -1,8 +1,21 @@
 from datetime import datetime
+from sqlalchemy import event
 from app import db
+from app.utils.search import install_search_index
 
 class Book(db.Model):
     __tablename__ = 'books'
+    __table_args__ = (
+        # Sort key for the keyset-paginated catalog listing
+        db.Index('ix_books_title_id', 'title', 'id'),
+        # Covers the inventory summary and per-category totals
+        db.Index('ix_books_inventory', 'category', 'quantity', 'available_quantity', 'loan_count'),
+        # Availability filters, and the title-ordered unavailable list
+        db.Index('ix_books_available_title', 'available_quantity', 'title', 'id'),
+        # Title-ordered never-loaned list
+        db.Index('ix_books_loan_count_title', 'loan_count', 'title', 'id'),
+        db.Index('ix_books_date_added', 'date_added'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(255), nullable=False)
@@ -19,9 +32,18 @@ class Book(db.Model):
     location_shelf = db.Column(db.String(50))
     date_added = db.Column(db.DateTime, default=datetime.utcnow)
     cover_image = db.Column(db.String(255))
+    loan_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    last_loaned_at = db.Column(db.DateTime)
+    # Bumped by every UPDATE, bulk ones included; API ETags and Last-Modified
+    row_version = db.Column(db.Integer, nullable=False, default=1, server_default='1',
+                            onupdate=db.text('row_version + 1'))
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationship with Circulation
     circulations = db.relationship('Circulation', back_populates='book', cascade='all, delete-orphan')
+    holds = db.relationship('Hold', back_populates='book', cascade='all, delete-orphan', lazy='dynamic')
+    copies = db.relationship('BookCopy', back_populates='book', cascade='all, delete-orphan',
+                             lazy='dynamic', order_by='BookCopy.id')
     
     def __repr__(self):
         return f'<Book {self.title} by {self.author}>'
@@ -30,10 +52,69 @@ class Book(db.Model):
         """Check if the book is available for borrowing"""
         return self.available_quantity > 0
         
-    def update_availability(self, change):
-        """Update book availability
+    @classmethod
+    def take_copy(cls, book_id, checkout_date, copy_id=None):
+        """Take one copy of a book off the shelf for a new loan
+        
+        The copy is claimed with a conditional UPDATE on its row (see
+        ``BookCopy.take``), so concurrent checkouts of the last copy cannot
+        both succeed. A single UPDATE of the book then lowers its available
+        count and counts the loan.
         
         Args:
-            change (int): +1 for return, -1 for borrow
+            book_id (int): Book to take a copy of
+            checkout_date (datetime): When the book was checked out
+            copy_id (int): The scanned copy, or None for any shelf copy
+        
+        Returns:
+            int: The copy taken, or None if none was available
         """
-        self.available_quantity += change
\ No newline at end of file
+        from app.models.book_copy import BookCopy
+        
+        copy_id = BookCopy.take(book_id, copy_id)
+        if copy_id is None:
+            return None
+        cls.query.filter(cls.id == book_id).update({
+            cls.available_quantity: cls.available_quantity - 1,
+            cls.loan_count: cls.loan_count + 1,
+            cls.last_loaned_at: checkout_date
+        }, synchronize_session='fetch')
+        return copy_id
+    
+    @classmethod
+    def take_held_copy(cls, book_id, copy_id, checkout_date):
+        """Lend the copy set aside on the hold shelf
+        
+        It already left the available count when it was set aside, so only
+        the copy's status and the loan stats change.
+        
+        Raises:
+            ConflictError: If the copy is no longer on the hold shelf
+        """
+        from app.models.book_copy import BookCopy
+        from app.utils.transactions import ConflictError
+        
+        taken = BookCopy.query.filter(
+            BookCopy.id == copy_id,
+            BookCopy.status == BookCopy.ON_HOLD
+        ).update({BookCopy.status: BookCopy.ON_LOAN}, synchronize_session=False)
+        if not taken:
+            raise ConflictError('The held copy changed concurrently.')
+        cls.query.filter(cls.id == book_id).update({
+            cls.loan_count: cls.loan_count + 1,
+            cls.last_loaned_at: checkout_date
+        }, synchronize_session='fetch')
+    
+    @classmethod
+    def refresh_loan_stats(cls):
+        """Recompute loan_count and last_loaned_at from the circulations table"""
+        from app.models.circulation import Circulation
+        
+        loans = db.session.query(Circulation.id).filter(Circulation.book_id == cls.id)
+        cls.query.update({
+            cls.loan_count: loans.with_entities(db.func.count(Circulation.id)).scalar_subquery(),
+            cls.last_loaned_at: loans.with_entities(db.func.max(Circulation.checkout_date)).scalar_subquery()
+        }, synchronize_session=False)
+
+# Build the full-text search index alongside the books table
+event.listen(Book.__table__, 'after_create', install_search_index)
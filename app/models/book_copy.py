@@ -0,0 +1,212 @@
+from datetime import datetime
+from sqlalchemy import case, func
+from app import db
+
+
+class BookCopy(db.Model):
+    """One physical copy of a book, identified by its barcode
+
+    Copy rows are the record of what the library owns and where each item
+    is. ``Book.quantity`` and ``Book.available_quantity`` stay as counters
+    beside them, moved by the same statements that change a copy's status,
+    so catalog listings and reports never have to count copies.
+    """
+    __tablename__ = 'book_copies'
+    __table_args__ = (
+        # Next copy on the shelf and per-status counts for one book,
+        # answered from the index alone
+        db.Index('ix_book_copies_book_status', 'book_id', 'status', 'id'),
+    )
+
+    AVAILABLE = 'available'
+    ON_LOAN = 'on_loan'
+    ON_HOLD = 'on_hold'
+    WITHDRAWN = 'withdrawn'
+    STATUSES = (AVAILABLE, ON_LOAN, ON_HOLD, WITHDRAWN)
+
+    id = db.Column(db.Integer, primary_key=True)
+    book_id = db.Column(db.Integer, db.ForeignKey('books.id', ondelete='CASCADE'), nullable=False)
+    barcode = db.Column(db.String(32), unique=True, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default=AVAILABLE)
+    location_shelf = db.Column(db.String(50))
+    added_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    book = db.relationship('Book', back_populates='copies')
+
+    def __repr__(self):
+        return f'<BookCopy {self.barcode} ({self.status})>'
+
+    @staticmethod
+    def barcode_for(book_id, number):
+        """Barcode of the ``number``-th copy ever added for a book"""
+        return f'B{book_id:08d}{number:04d}'
+
+    @classmethod
+    def add(cls, book_id, count, added_at=None):
+        """Add ``count`` new copies of a book, all on the shelf
+
+        Returns:
+            list: Barcodes of the new copies
+        """
+        return cls.add_many({book_id: count}, added_at)
+
+    @classmethod
+    def add_many(cls, counts, added_at=None):
+        """Add new shelf copies to several books
+
+        Copies owned so far are counted with one grouped query over the
+        copies index, the new rows go in with one INSERT, and every book's
+        counters are raised with one UPDATE. New copies have no location of
+        their own and sit on their book's shelf.
+
+        Args:
+            counts (dict): Book id -> number of copies to add
+
+        Returns:
+            list: Barcodes of the new copies
+        """
+        from app.models.book import Book
+
+        counts = {book_id: count for book_id, count in counts.items() if count > 0}
+        if not counts:
+            return []
+        added_at = added_at or datetime.utcnow()
+        owned = dict(
+            db.session.query(cls.book_id, func.count(cls.id))
+            .filter(cls.book_id.in_(counts))
+            .group_by(cls.book_id)
+        )
+        rows = [
+            {'book_id': book_id, 'barcode': cls.barcode_for(book_id, owned.get(book_id, 0) + n),
+             'status': cls.AVAILABLE, 'location_shelf': None, 'added_at': added_at}
+            for book_id, count in counts.items()
+            for n in range(1, count + 1)
+        ]
+        db.session.execute(cls.__table__.insert(), rows)
+        added = case(counts, value=Book.id)
+        Book.query.filter(Book.id.in_(counts)).update({
+            Book.quantity: func.coalesce(Book.quantity, 0) + added,
+            Book.available_quantity: func.coalesce(Book.available_quantity, 0) + added
+        }, synchronize_session='fetch')
+        return [row['barcode'] for row in rows]
+
+    @classmethod
+    def withdraw(cls, book_id, count):
+        """Take up to ``count`` shelf copies of a book out of circulation
+
+        The most recently added copies go first. Copies out on loan or held
+        for a member are never withdrawn, so fewer than ``count`` may be.
+
+        Returns:
+            int: Number of copies withdrawn
+        """
+        from app.models.book import Book
+
+        if count <= 0:
+            return 0
+        copy_ids = [
+            copy_id for copy_id, in db.session.query(cls.id).filter(
+                cls.book_id == book_id,
+                cls.status == cls.AVAILABLE
+            ).order_by(cls.id.desc()).limit(count)
+        ]
+        if not copy_ids:
+            return 0
+        withdrawn = cls.query.filter(cls.id.in_(copy_ids), cls.status == cls.AVAILABLE).update(
+            {cls.status: cls.WITHDRAWN}, synchronize_session=False
+        )
+        Book.query.filter(Book.id == book_id).update({
+            Book.quantity: Book.quantity - withdrawn,
+            Book.available_quantity: Book.available_quantity - withdrawn
+        }, synchronize_session='fetch')
+        return withdrawn
+
+    @classmethod
+    def take(cls, book_id, copy_id=None):
+        """Mark a shelf copy of a book as on loan
+
+        Without ``copy_id`` the first copy on the shelf is picked with one
+        index probe. The copy is claimed with a conditional UPDATE; if a
+        picked copy was claimed by another transaction in between,
+        ``ConflictError`` is raised so the checkout can be retried. Counters
+        are left to the caller.
+
+        Args:
+            copy_id (int): A specific copy, e.g. the one whose barcode was scanned
+
+        Returns:
+            int: The copy taken, or None if no (or not that) copy was available
+        """
+        from app.utils.transactions import ConflictError
+
+        picked = copy_id is None
+        if picked:
+            copy_id = db.session.query(cls.id).filter(
+                cls.book_id == book_id,
+                cls.status == cls.AVAILABLE
+            ).order_by(cls.id).limit(1).scalar()
+            if copy_id is None:
+                return None
+        taken = cls.query.filter(
+            cls.id == copy_id,
+            cls.book_id == book_id,
+            cls.status == cls.AVAILABLE
+        ).update({cls.status: cls.ON_LOAN}, synchronize_session=False)
+        if not taken and picked:
+            raise ConflictError('The copy was checked out concurrently.')
+        return copy_id if taken else None
+
+    @classmethod
+    def shelve(cls, copies):
+        """Put copies back on the shelf
+
+        One UPDATE for the copies and one raising each book's available
+        count by the number shelved.
+
+        Args:
+            copies (dict): Book id -> list of copy ids
+        """
+        from app.models.book import Book
+
+        copy_ids = [copy_id for ids in copies.values() for copy_id in ids]
+        if not copy_ids:
+            return
+        cls.query.filter(cls.id.in_(copy_ids)).update(
+            {cls.status: cls.AVAILABLE}, synchronize_session=False
+        )
+        shelved = {book_id: len(ids) for book_id, ids in copies.items() if ids}
+        Book.query.filter(Book.id.in_(shelved)).update({
+            Book.available_quantity: Book.available_quantity + case(shelved, value=Book.id)
+        }, synchronize_session=False)
+
+    @classmethod
+    def find_by_barcode(cls, barcode):
+        return cls.query.filter_by(barcode=(barcode or '').strip().upper()).first()
+
+    @classmethod
+    def reconcile(cls, book_ids=None):
+        """Reset book counters from the copy rows
+
+        Counters are normally kept in step incrementally; this is the
+        repair path after manual edits, run by ``flask copies-reconcile``.
+
+        Returns:
+            int: Number of books whose counters changed
+        """
+        from app.models.book import Book
+
+        def counted(*statuses):
+            return db.session.query(func.count(cls.id)).filter(
+                cls.book_id == Book.id,
+                cls.status.in_(statuses)
+            ).scalar_subquery()
+
+        owned = counted(cls.AVAILABLE, cls.ON_LOAN, cls.ON_HOLD)
+        available = counted(cls.AVAILABLE)
+        query = Book.query.filter(db.or_(Book.quantity != owned, Book.available_quantity != available))
+        if book_ids is not None:
+            query = query.filter(Book.id.in_(book_ids))
+        return query.update({
+            Book.quantity: owned,
+            Book.available_quantity: available
+        }, synchronize_session=False)
@@ -1,27 +1,62 @@
 from datetime import datetime, timedelta
+from sqlalchemy import literal
 from app import db
 from app.config import Config
+from app.utils.sql import days_between
 
 class Circulation(db.Model):
     __tablename__ = 'circulations'
+    __table_args__ = (
+        # Open-loan and overdue checks for a single member
+        db.Index('ix_circulations_member_open', 'member_id', 'return_date', 'due_date'),
+        # A member's loan history, newest first
+        db.Index('ix_circulations_member_checkout', 'member_id', 'checkout_date', 'id'),
+        # A book's loan history, newest first; also serves lookups by book
+        db.Index('ix_circulations_book_checkout', 'book_id', 'checkout_date', 'id'),
+        # Checkout-date ranges for reports and the circulation listing
+        db.Index('ix_circulations_checkout_date', 'checkout_date', 'id'),
+        db.Index('ix_circulations_return_date', 'return_date'),
+        # Open loans only: ordered by due date (overdue lists) and checkout date
+        db.Index(
+            'ix_circulations_open_due_date', 'due_date',
+            sqlite_where=db.text('return_date IS NULL'),
+            postgresql_where=db.text('return_date IS NULL')
+        ),
+        db.Index(
+            'ix_circulations_open_checkout_date', 'checkout_date', 'id',
+            sqlite_where=db.text('return_date IS NULL'),
+            postgresql_where=db.text('return_date IS NULL')
+        ),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     book_id = db.Column(db.Integer, db.ForeignKey('books.id'), nullable=False)
     member_id = db.Column(db.Integer, db.ForeignKey('members.id'), nullable=False)
+    # The physical copy lent; empty only for loans returned before copies were tracked
+    copy_id = db.Column(db.Integer, db.ForeignKey('book_copies.id'))
     checkout_date = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     due_date = db.Column(db.DateTime, nullable=False)
     return_date = db.Column(db.DateTime, nullable=True)
     fine_amount = db.Column(db.Float, default=0.0)
     fine_paid = db.Column(db.Boolean, default=False)
+    # Kept current for open loans by ``accrue_fines``, final once returned
+    overdue_days = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    fines_accrued_at = db.Column(db.DateTime)
     notes = db.Column(db.Text)
+    # Bumped by every UPDATE, bulk ones included; API ETags and Last-Modified
+    row_version = db.Column(db.Integer, nullable=False, default=1, server_default='1',
+                            onupdate=db.text('row_version + 1'))
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
     book = db.relationship('Book', back_populates='circulations')
     member = db.relationship('Member', back_populates='circulations')
+    copy = db.relationship('BookCopy')
     
-    def __init__(self, book_id, member_id, checkout_date=None):
+    def __init__(self, book_id, member_id, checkout_date=None, copy_id=None):
         self.book_id = book_id
         self.member_id = member_id
+        self.copy_id = copy_id
         self.checkout_date = checkout_date or datetime.utcnow()
         self.due_date = self.checkout_date + timedelta(days=Config.MAX_LOAN_DAYS)
     
@@ -34,20 +69,309 @@ class Circulation(db.Model):
             return self.return_date > self.due_date
         return datetime.utcnow() > self.due_date
     
-    def calculate_fine(self):
-        """Calculate fine for overdue books"""
-        if not self.is_overdue():
-            return 0.0
+    def calculate_fine(self, as_of=None):
+        """Calculate fine for overdue books
         
-        if self.return_date:
-            days_overdue = (self.return_date - self.due_date).days
-        else:
-            days_overdue = (datetime.utcnow() - self.due_date).days
+        Args:
+            as_of (datetime): Return time to assume for an open loan, now by default
+        """
+        end = self.return_date or as_of or datetime.utcnow()
+        return Circulation.fine_for(self.due_date, end)
+    
+    @staticmethod
+    def days_overdue(due_date, returned_at):
+        """Whole days past ``due_date`` at ``returned_at``, never negative"""
+        return max(0, (returned_at - due_date).days)
+    
+    @staticmethod
+    def fine_for(due_date, returned_at):
+        """Fine owed for a loan due at ``due_date`` and returned at ``returned_at``"""
+        return Circulation.days_overdue(due_date, returned_at) * Config.FINE_PER_DAY
+    
+    @classmethod
+    def accrue_fines(cls, as_of=None):
+        """Store overdue days and fines for every open overdue loan
         
-        return max(0, days_overdue) * Config.FINE_PER_DAY
+        One set-based UPDATE over the open-loan partial index; the day count
+        is computed in SQL. Only rows whose stored day count is stale are
+        written, so a rerun for the same moment changes nothing and a daily
+        run touches each overdue loan once.
+        
+        Args:
+            as_of (datetime): Moment to accrue up to, now by default
+        
+        Returns:
+            int: Number of loans updated
+        """
+        as_of = as_of or datetime.utcnow()
+        days = days_between(cls.due_date, literal(as_of, db.DateTime))
+        return cls.query.filter(
+            cls.return_date.is_(None),
+            cls.due_date < as_of,
+            cls.overdue_days != days
+        ).update({
+            cls.overdue_days: days,
+            cls.fine_amount: days * Config.FINE_PER_DAY,
+            cls.fines_accrued_at: as_of
+        }, synchronize_session=False)
+    
+    @classmethod
+    def check_out(cls, book_id, member_id, copy_id=None):
+        """Lend a copy of a book to a member, if one is available
+        
+        A copy set aside for the member's hold is used first; otherwise one
+        is taken from the shelf, and any hold they had waiting is closed.
+        If the member borrows a different copy than the one set aside for
+        them, that one passes to the next hold in line.
+        
+        Args:
+            copy_id (int): The scanned copy, or None for any available copy
+        
+        Returns:
+            Circulation: The new loan, or None if no copy was available
+        """
+        from app.models.book import Book
+        from app.models.circulation_stats import DailyCirculationStat
+        from app.models.hold import Hold
+        from app.utils.transactions import ConflictError
+        
+        loan = cls(book_id=book_id, member_id=member_id)
+        ready = Hold.query.filter_by(member_id=member_id, book_id=book_id, status=Hold.READY).first()
+        if ready and copy_id in (None, ready.copy_id):
+            if not Hold.fulfil(member_id, [book_id], Hold.READY, loan.checkout_date):
+                raise ConflictError('The hold was cancelled or expired concurrently.')
+            Book.take_held_copy(book_id, ready.copy_id, loan.checkout_date)
+            loan.copy_id = ready.copy_id
+        else:
+            loan.copy_id = Book.take_copy(book_id, loan.checkout_date, copy_id)
+            if loan.copy_id is None:
+                return None
+            Hold.fulfil(member_id, [book_id], Hold.WAITING, loan.checkout_date)
+            if ready:
+                ready.cancel(status=Hold.FULFILLED, now=loan.checkout_date)
+        db.session.add(loan)
+        DailyCirculationStat.record_checkout(loan)
+        return loan
     
     def return_book(self):
-        """Process book return"""
-        self.return_date = datetime.utcnow()
-        self.fine_amount = self.calculate_fine()
-        self.book.update_availability(1)  # Increase available quantity by 1
\ No newline at end of file
+        """Process book return
+        
+        The loan is closed with a conditional UPDATE, so a double submit or
+        two staff returning the same loan only puts the copy back once.
+        
+        Returns:
+            bool: False if the loan had already been returned
+        """
+        from app.models.book_copy import BookCopy
+        from app.models.circulation_stats import DailyCirculationStat
+        from app.models.fines import FineLedgerEntry
+        from app.models.hold import Hold
+        
+        return_date = datetime.utcnow()
+        closed = Circulation.query.filter(
+            Circulation.id == self.id,
+            Circulation.return_date.is_(None)
+        ).update({
+            Circulation.return_date: return_date,
+            Circulation.overdue_days: Circulation.days_overdue(self.due_date, return_date),
+            Circulation.fine_amount: self.calculate_fine(as_of=return_date)
+        }, synchronize_session='fetch')
+        if not closed:
+            return False
+        
+        # The copy goes to the next hold in line, or back on the shelf
+        BookCopy.shelve(Hold.allocate_copies({self.book_id: [self.copy_id]}, return_date))
+        DailyCirculationStat.record_return(self)
+        FineLedgerEntry.charge_fines([(self.member_id, self.id, self.fine_amount)], return_date)
+        return True
+    
+    @classmethod
+    def check_out_batch(cls, member_id, book_ids, limit):
+        """Lend several books to one member in a single transaction
+        
+        Availability is read for every book in one query, along with the
+        copies set aside for the member's holds in another. The first shelf
+        copy of each book is picked with one grouped query over the copies
+        index; shelf copies are then taken with one conditional UPDATE and
+        held copies claimed with another. If either changes fewer rows than
+        were read as eligible, another transaction won the race and
+        ``ConflictError`` is raised so the batch can be retried.
+        
+        Args:
+            member_id (int): Borrowing member, already checked for overdue loans
+            book_ids (list): Book ids in scan order
+            limit (int): How many more loans the member may take
+        
+        Returns:
+            list: One dict per requested id with ``book_id`` and ``status``
+            ('checked_out', 'unavailable', 'not_found', 'limit_reached' or
+            'duplicate'), plus ``circulation_id`` and ``due_date`` for loans
+        """
+        from sqlalchemy import func
+        from app.models.book import Book
+        from app.models.book_copy import BookCopy
+        from app.models.circulation_stats import DailyCirculationStat
+        from app.models.hold import Hold
+        from app.utils.transactions import ConflictError
+        
+        available = dict(
+            db.session.query(Book.id, Book.available_quantity).filter(Book.id.in_(set(book_ids)))
+        )
+        reserved = Hold.ready_copies(member_id, set(book_ids))
+        results, chosen, seen = [], [], set()
+        for book_id in book_ids:
+            result = {'book_id': book_id}
+            if book_id in seen:
+                result['status'] = 'duplicate'
+            elif book_id not in available:
+                result['status'] = 'not_found'
+            elif not available[book_id] and book_id not in reserved:
+                result['status'] = 'unavailable'
+            elif len(chosen) >= limit:
+                result['status'] = 'limit_reached'
+            else:
+                result['status'] = 'checked_out'
+                chosen.append(book_id)
+            seen.add(book_id)
+            results.append(result)
+        if not chosen:
+            return results
+        
+        checkout_date = datetime.utcnow()
+        held = [book_id for book_id in chosen if book_id in reserved]
+        shelf = [book_id for book_id in chosen if book_id not in reserved]
+        copies = {}
+        if held:
+            if Hold.fulfil(member_id, held, Hold.READY, checkout_date) != len(held):
+                raise ConflictError('A hold in the batch was cancelled or expired concurrently.')
+            copies = {book_id: reserved[book_id] for book_id in held}
+            taken = BookCopy.query.filter(
+                BookCopy.id.in_(copies.values()),
+                BookCopy.status == BookCopy.ON_HOLD
+            ).update({BookCopy.status: BookCopy.ON_LOAN}, synchronize_session=False)
+            if taken != len(held):
+                raise ConflictError('A held copy in the batch changed concurrently.')
+        if shelf:
+            # First copy on the shelf for every book, from the copies index
+            picked = dict(
+                db.session.query(BookCopy.book_id, func.min(BookCopy.id))
+                .filter(BookCopy.book_id.in_(shelf), BookCopy.status == BookCopy.AVAILABLE)
+                .group_by(BookCopy.book_id)
+            )
+            taken = 0
+            if len(picked) == len(shelf):
+                taken = BookCopy.query.filter(
+                    BookCopy.id.in_(picked.values()),
+                    BookCopy.status == BookCopy.AVAILABLE
+                ).update({BookCopy.status: BookCopy.ON_LOAN}, synchronize_session=False)
+            if taken != len(shelf):
+                raise ConflictError('A book in the batch was checked out concurrently.')
+            Book.query.filter(Book.id.in_(shelf)).update({
+                Book.available_quantity: Book.available_quantity - 1
+            }, synchronize_session=False)
+            Hold.fulfil(member_id, shelf, Hold.WAITING, checkout_date)
+            copies.update(picked)
+        Book.query.filter(Book.id.in_(chosen)).update({
+            Book.loan_count: Book.loan_count + 1,
+            Book.last_loaned_at: checkout_date
+        }, synchronize_session=False)
+        
+        loans = {
+            book_id: cls(book_id=book_id, member_id=member_id, checkout_date=checkout_date,
+                         copy_id=copies[book_id])
+            for book_id in chosen
+        }
+        db.session.add_all(loans.values())
+        db.session.flush()
+        DailyCirculationStat.record_many([
+            {'day': checkout_date.date(), 'book_id': book_id, 'member_id': member_id, 'checkouts': 1}
+            for book_id in chosen
+        ])
+        
+        for result in results:
+            loan = loans.get(result['book_id']) if result['status'] == 'checked_out' else None
+            if loan:
+                result.update(circulation_id=loan.id, due_date=loan.due_date.isoformat())
+        return results
+    
+    @classmethod
+    def return_batch(cls, circulation_ids):
+        """Return several loans in a single transaction
+        
+        The open loans are read in one query and closed with one
+        conditional UPDATE (fines computed per loan). Returned copies go to
+        waiting holds first, then the rest are shelved and each book's
+        availability raised by its count with one UPDATE each. A concurrent return of any of
+        the loans raises ``ConflictError``.
+        
+        Args:
+            circulation_ids (list): Loan ids in scan order
+        
+        Returns:
+            list: One dict per requested id with ``circulation_id`` and
+            ``status`` ('returned', 'already_returned', 'not_found' or
+            'duplicate'), plus ``book_id`` and ``fine_amount`` for returns
+        """
+        from collections import defaultdict
+        from sqlalchemy import case
+        from app.models.book_copy import BookCopy
+        from app.models.circulation_stats import DailyCirculationStat
+        from app.models.fines import FineLedgerEntry
+        from app.models.hold import Hold
+        from app.utils.transactions import ConflictError
+        
+        loans = {
+            row.id: row for row in db.session.query(
+                cls.id, cls.book_id, cls.copy_id, cls.member_id, cls.due_date, cls.return_date,
+                cls.fine_paid
+            ).filter(cls.id.in_(set(circulation_ids)))
+        }
+        return_date = datetime.utcnow()
+        results, fines, days, seen = [], {}, {}, set()
+        for circulation_id in circulation_ids:
+            result = {'circulation_id': circulation_id}
+            loan = loans.get(circulation_id)
+            if circulation_id in seen:
+                result['status'] = 'duplicate'
+            elif loan is None:
+                result['status'] = 'not_found'
+            elif loan.return_date is not None:
+                result['status'] = 'already_returned'
+            else:
+                days[circulation_id] = cls.days_overdue(loan.due_date, return_date)
+                fines[circulation_id] = cls.fine_for(loan.due_date, return_date)
+                result.update(status='returned', book_id=loan.book_id, fine_amount=fines[circulation_id])
+            seen.add(circulation_id)
+            results.append(result)
+        if not fines:
+            return results
+        
+        closed = cls.query.filter(cls.id.in_(fines), cls.return_date.is_(None)).update({
+            cls.return_date: return_date,
+            cls.overdue_days: case(days, value=cls.id),
+            cls.fine_amount: case(fines, value=cls.id)
+        }, synchronize_session=False)
+        if closed != len(fines):
+            raise ConflictError('A loan in the batch was returned concurrently.')
+        
+        copies = defaultdict(list)
+        for circulation_id in fines:
+            copies[loans[circulation_id].book_id].append(loans[circulation_id].copy_id)
+        BookCopy.shelve(Hold.allocate_copies(copies, return_date))
+        
+        DailyCirculationStat.record_many([
+            {
+                'day': return_date.date(),
+                'book_id': loans[circulation_id].book_id,
+                'member_id': loans[circulation_id].member_id,
+                'returns': 1,
+                'fines_assessed': fine,
+                'fines_collected': fine if loans[circulation_id].fine_paid else 0.0
+            }
+            for circulation_id, fine in fines.items()
+        ])
+        FineLedgerEntry.charge_fines([
+            (loans[circulation_id].member_id, circulation_id, fine)
+            for circulation_id, fine in fines.items()
+        ], return_date)
+        return results
@@ -0,0 +1,181 @@
+from datetime import datetime, time, timedelta
+from sqlalchemy import case, func
+from sqlalchemy.dialects import postgresql, sqlite
+from app import db
+
+
+class DailyCirculationStat(db.Model):
+    """Per-day circulation totals for each (book, member) pair
+
+    Maintained incrementally on checkout and return, and rebuilt from the
+    circulations table with ``flask rollup-backfill``. Reports read these
+    narrow rows instead of scanning circulations.
+    """
+    __tablename__ = 'daily_circulation_stats'
+
+    day = db.Column(db.Date, primary_key=True)
+    book_id = db.Column(db.Integer, db.ForeignKey('books.id', ondelete='CASCADE'), primary_key=True)
+    member_id = db.Column(db.Integer, db.ForeignKey('members.id', ondelete='CASCADE'), primary_key=True)
+    checkouts = db.Column(db.Integer, nullable=False, default=0)
+    returns = db.Column(db.Integer, nullable=False, default=0)
+    fines_assessed = db.Column(db.Float, nullable=False, default=0.0)
+    fines_collected = db.Column(db.Float, nullable=False, default=0.0)
+
+    def __repr__(self):
+        return f'<DailyCirculationStat {self.day}: Book {self.book_id} - Member {self.member_id}>'
+
+    @classmethod
+    def record(cls, day, book_id, member_id, checkouts=0, returns=0, fines_assessed=0.0, fines_collected=0.0):
+        """Add activity to a day's row, creating it if needed
+        
+        Runs as a single upsert in the current transaction, so the rollup
+        commits (or rolls back) together with the circulation change.
+        """
+        cls.record_many([{
+            'day': day,
+            'book_id': book_id,
+            'member_id': member_id,
+            'checkouts': checkouts,
+            'returns': returns,
+            'fines_assessed': fines_assessed,
+            'fines_collected': fines_collected,
+        }])
+
+    @classmethod
+    def record_many(cls, entries):
+        """Add a batch of activity with one executemany upsert
+
+        Entries for the same (day, book, member) are merged first, since a
+        batched upsert may not touch the same row twice.
+
+        Args:
+            entries (list): Dicts with day, book_id and member_id plus any of
+                the counter columns
+        """
+        increments = ('checkouts', 'returns', 'fines_assessed', 'fines_collected')
+        merged = {}
+        for entry in entries:
+            key = (entry['day'], entry['book_id'], entry['member_id'])
+            row = merged.setdefault(key, cls._empty_row(*key))
+            for name in increments:
+                row[name] += entry.get(name, 0)
+        if not merged:
+            return
+        rows = list(merged.values())
+
+        table = cls.__table__
+        dialect = db.session.connection().dialect.name
+
+        if dialect in ('sqlite', 'postgresql'):
+            insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+            statement = insert(table)
+            statement = statement.on_conflict_do_update(
+                index_elements=['day', 'book_id', 'member_id'],
+                set_={name: table.c[name] + statement.excluded[name] for name in increments}
+            )
+            db.session.execute(statement, rows)
+            return
+
+        # Other backends: update in place, insert when the row is new
+        for row in rows:
+            result = db.session.execute(
+                table.update().where(
+                    table.c.day == row['day'],
+                    table.c.book_id == row['book_id'],
+                    table.c.member_id == row['member_id']
+                ).values({name: table.c[name] + row[name] for name in increments})
+            )
+            if result.rowcount == 0:
+                db.session.execute(table.insert().values(**row))
+
+    @classmethod
+    def record_checkout(cls, circulation):
+        cls.record(circulation.checkout_date.date(), circulation.book_id, circulation.member_id, checkouts=1)
+
+    @classmethod
+    def record_return(cls, circulation):
+        fine = circulation.fine_amount or 0.0
+        cls.record(
+            circulation.return_date.date(),
+            circulation.book_id,
+            circulation.member_id,
+            returns=1,
+            fines_assessed=fine,
+            fines_collected=fine if circulation.fine_paid else 0.0
+        )
+
+    @classmethod
+    def backfill(cls, since=None, window_days=31):
+        """Rebuild the rollup from the circulations table
+
+        Works through the history one window at a time so memory use is
+        bounded by a single window's activity.
+
+        Args:
+            since (date): Only rebuild days on or after this date
+            window_days (int): Number of days aggregated per batch
+
+        Returns:
+            int: Number of rollup rows written
+        """
+        from app.models.circulation import Circulation
+
+        first_checkout = db.session.query(func.min(Circulation.checkout_date)).scalar()
+        if first_checkout is None:
+            return 0
+        start = max(first_checkout.date(), since) if since else first_checkout.date()
+        end = datetime.utcnow().date() + timedelta(days=1)
+
+        query = cls.query
+        if since:
+            query = query.filter(cls.day >= since)
+        query.delete(synchronize_session=False)
+
+        written = 0
+        window_start = start
+        while window_start < end:
+            window_end = window_start + timedelta(days=window_days)
+            # Range-filter the raw timestamps so the date indexes are used
+            lower = datetime.combine(window_start, time.min)
+            upper = datetime.combine(window_end, time.min)
+            rows = {}
+
+            checkout_day = func.date(Circulation.checkout_date, type_=db.Date)
+            checkouts = db.session.query(
+                checkout_day, Circulation.book_id, Circulation.member_id, func.count(Circulation.id)
+            ).filter(
+                Circulation.checkout_date >= lower, Circulation.checkout_date < upper
+            ).group_by(checkout_day, Circulation.book_id, Circulation.member_id)
+            for day, book_id, member_id, count in checkouts:
+                rows[(day, book_id, member_id)] = cls._empty_row(day, book_id, member_id, checkouts=count)
+
+            return_day = func.date(Circulation.return_date, type_=db.Date)
+            returns = db.session.query(
+                return_day, Circulation.book_id, Circulation.member_id,
+                func.count(Circulation.id),
+                func.coalesce(func.sum(Circulation.fine_amount), 0.0),
+                func.coalesce(func.sum(case((Circulation.fine_paid == True, Circulation.fine_amount))), 0.0)
+            ).filter(
+                Circulation.return_date >= lower, Circulation.return_date < upper
+            ).group_by(return_day, Circulation.book_id, Circulation.member_id)
+            for day, book_id, member_id, count, assessed, collected in returns:
+                row = rows.setdefault((day, book_id, member_id), cls._empty_row(day, book_id, member_id))
+                row.update(returns=count, fines_assessed=assessed, fines_collected=collected)
+
+            if rows:
+                db.session.bulk_insert_mappings(cls, list(rows.values()))
+                written += len(rows)
+            window_start = window_end
+        return written
+
+    @staticmethod
+    def _empty_row(day, book_id, member_id, checkouts=0):
+        return {
+            'day': day,
+            'book_id': book_id,
+            'member_id': member_id,
+            'checkouts': checkouts,
+            'returns': 0,
+            'fines_assessed': 0.0,
+            'fines_collected': 0.0,
+        }
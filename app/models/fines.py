@@ -0,0 +1,206 @@
+from collections import Counter
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+from sqlalchemy import case, func
+from app import db
+
+CENT = Decimal('0.01')
+
+
+def to_cents(amount):
+    """Convert a money amount (str, int, float or Decimal) to integer cents"""
+    return int((Decimal(str(amount)) / CENT).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+def from_cents(cents):
+    """Convert integer cents to a two-place Decimal"""
+    return (Decimal(cents or 0) * CENT).quantize(CENT)
+
+
+class FineLedgerEntry(db.Model):
+    """One fine charged to, or payment received from, a member
+
+    The ledger is append-only. Amounts are integer cents: positive for
+    fines, negative for payments and waivers. Every entry is applied to
+    ``Member.balance_cents`` in the same transaction, so a member's
+    outstanding balance is a single-row read rather than a history scan.
+    """
+    __tablename__ = 'fine_ledger'
+    __table_args__ = (
+        # A member's statement, newest first
+        db.Index('ix_fine_ledger_member_created', 'member_id', 'created_at', 'id'),
+        # Collections by period for reports
+        db.Index('ix_fine_ledger_kind_created', 'kind', 'created_at'),
+        db.Index('ix_fine_ledger_circulation_id', 'circulation_id'),
+    )
+
+    FINE = 'fine'
+    PAYMENT = 'payment'
+    WAIVER = 'waiver'
+    CREDITS = (PAYMENT, WAIVER)
+
+    id = db.Column(db.Integer, primary_key=True)
+    member_id = db.Column(db.Integer, db.ForeignKey('members.id', ondelete='CASCADE'), nullable=False)
+    circulation_id = db.Column(db.Integer, db.ForeignKey('circulations.id', ondelete='SET NULL'))
+    kind = db.Column(db.String(10), nullable=False)
+    amount_cents = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    recorded_by_id = db.Column(db.Integer, db.ForeignKey('members.id', ondelete='SET NULL'))
+    note = db.Column(db.String(255))
+
+    member = db.relationship('Member', foreign_keys=[member_id], back_populates='fine_entries')
+    circulation = db.relationship('Circulation')
+
+    def __repr__(self):
+        return f'<FineLedgerEntry #{self.id}: Member {self.member_id} {self.kind} {self.amount_cents}>'
+
+    @property
+    def amount(self):
+        return from_cents(self.amount_cents)
+
+    @classmethod
+    def charge_fines(cls, fines, charged_at=None):
+        """Post the fines for returned loans
+
+        All entries go in with one INSERT, and member balances are raised
+        with one UPDATE.
+
+        Args:
+            fines (list): (member_id, circulation_id, amount) tuples; zero
+                amounts are skipped
+            charged_at (datetime): Entry time, now by default
+        """
+        from app.models.member import Member
+
+        charged_at = charged_at or datetime.utcnow()
+        rows = [
+            {
+                'member_id': member_id, 'circulation_id': circulation_id, 'kind': cls.FINE,
+                'amount_cents': to_cents(amount), 'created_at': charged_at,
+                'recorded_by_id': None, 'note': None
+            }
+            for member_id, circulation_id, amount in fines
+        ]
+        rows = [row for row in rows if row['amount_cents'] > 0]
+        if not rows:
+            return
+        db.session.execute(cls.__table__.insert(), rows)
+
+        owed = Counter()
+        for row in rows:
+            owed[row['member_id']] += row['amount_cents']
+        Member.query.filter(Member.id.in_(owed)).update({
+            Member.balance_cents: Member.balance_cents + case(dict(owed), value=Member.id)
+        }, synchronize_session='fetch')
+
+    @classmethod
+    def record_payment(cls, member_id, amount, kind=PAYMENT, circulation_id=None,
+                       recorded_by_id=None, note=None):
+        """Take a full or partial payment (or waiver) off a member's balance
+
+        The balance is lowered with a conditional UPDATE, so two desks
+        taking payments for the same member can never push it below zero.
+        A loan's ``fine_paid`` flag is set once the credits against it
+        cover its fine, and every fined loan is flagged once the member
+        owes nothing.
+
+        Returns:
+            FineLedgerEntry: The new entry, or None if ``amount`` exceeds
+            the outstanding balance
+
+        Raises:
+            ValueError: For an unknown kind, a non-positive amount or a
+                loan that is not the member's
+            decimal.InvalidOperation: If ``amount`` is not a number
+        """
+        from app.models.member import Member
+        from app.models.circulation import Circulation
+
+        cents = to_cents(amount)
+        if kind not in cls.CREDITS:
+            raise ValueError(f'Unknown credit kind: {kind}')
+        if cents <= 0:
+            raise ValueError('Amount must be positive.')
+        if circulation_id and not db.session.query(Circulation.id).filter(
+            Circulation.id == circulation_id,
+            Circulation.member_id == member_id
+        ).first():
+            raise ValueError('That loan does not belong to this member.')
+
+        taken = Member.query.filter(
+            Member.id == member_id,
+            Member.balance_cents >= cents
+        ).update({Member.balance_cents: Member.balance_cents - cents}, synchronize_session='fetch')
+        if not taken:
+            return None
+
+        entry = cls(member_id=member_id, circulation_id=circulation_id, kind=kind,
+                    amount_cents=-cents, recorded_by_id=recorded_by_id, note=note)
+        db.session.add(entry)
+        db.session.flush()
+
+        unpaid = Circulation.query.filter(
+            Circulation.member_id == member_id,
+            Circulation.return_date.isnot(None),
+            Circulation.fine_paid.isnot(True),
+            Circulation.fine_amount > 0
+        )
+        balance = db.session.query(Member.balance_cents).filter(Member.id == member_id).scalar()
+        if balance <= 0:
+            unpaid.update({Circulation.fine_paid: True}, synchronize_session='fetch')
+        elif circulation_id:
+            owed = db.session.query(func.sum(cls.amount_cents)).filter(
+                cls.circulation_id == circulation_id
+            ).scalar()
+            if owed is not None and owed <= 0:
+                unpaid.filter(Circulation.id == circulation_id).update(
+                    {Circulation.fine_paid: True}, synchronize_session='fetch'
+                )
+        return entry
+
+    @classmethod
+    def collected_since(cls, start):
+        """Payments received since ``start``, as a Decimal (waivers excluded)"""
+        cents = db.session.query(func.coalesce(func.sum(-cls.amount_cents), 0)).filter(
+            cls.kind == cls.PAYMENT,
+            cls.created_at >= start
+        ).scalar()
+        return from_cents(cents)
+
+    @classmethod
+    def backfill(cls):
+        """Rebuild the ledger and member balances from the circulations table
+
+        Each fined return becomes a fine entry, and each one flagged as paid
+        also gets a matching payment, both dated at the return.
+        """
+        from app.models.circulation import Circulation
+
+        cls.query.delete(synchronize_session=False)
+        fined = db.session.query(
+            Circulation.id, Circulation.member_id, Circulation.return_date,
+            Circulation.fine_amount, Circulation.fine_paid
+        ).filter(Circulation.return_date.isnot(None), Circulation.fine_amount > 0)
+
+        rows = []
+        for loan in fined:
+            entry = {'member_id': loan.member_id, 'circulation_id': loan.id,
+                     'created_at': loan.return_date, 'recorded_by_id': None, 'note': None}
+            cents = to_cents(loan.fine_amount)
+            rows.append(dict(entry, kind=cls.FINE, amount_cents=cents))
+            if loan.fine_paid:
+                rows.append(dict(entry, kind=cls.PAYMENT, amount_cents=-cents))
+        if rows:
+            db.session.execute(cls.__table__.insert(), rows)
+        cls.refresh_balances()
+        return len(rows)
+
+    @classmethod
+    def refresh_balances(cls):
+        """Recompute every member's balance from their ledger entries"""
+        from app.models.member import Member
+
+        balance = db.session.query(func.coalesce(func.sum(cls.amount_cents), 0)).filter(
+            cls.member_id == Member.id
+        ).scalar_subquery()
+        Member.query.update({Member.balance_cents: balance}, synchronize_session=False)
@@ -0,0 +1,235 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import case, tuple_
+from app import db
+from app.config import Config
+
+
+class Hold(db.Model):
+    """A member's place in the queue for a book
+
+    Holds start out ``waiting``. When a copy comes back it goes to the
+    first waiting hold instead of the shelf, and the hold becomes ``ready``
+    until the member picks it up (``fulfilled``) or the pickup window
+    closes (``expired``). Members may also cancel at any point.
+    """
+    __tablename__ = 'holds'
+    __table_args__ = (
+        # The queue itself: next in line is the first entry for the book,
+        # an O(log n) index probe however long the queue is
+        db.Index(
+            'ix_holds_queue', 'book_id', 'placed_at', 'id',
+            sqlite_where=db.text("status = 'waiting'"),
+            postgresql_where=db.text("status = 'waiting'")
+        ),
+        # One open hold per member and book
+        db.Index(
+            'ix_holds_member_book_open', 'member_id', 'book_id', unique=True,
+            sqlite_where=db.text("status IN ('waiting', 'ready')"),
+            postgresql_where=db.text("status IN ('waiting', 'ready')")
+        ),
+        # Copies waiting on the pickup shelf, by deadline
+        db.Index(
+            'ix_holds_ready_expires', 'expires_at',
+            sqlite_where=db.text("status = 'ready'"),
+            postgresql_where=db.text("status = 'ready'")
+        ),
+    )
+
+    WAITING = 'waiting'
+    READY = 'ready'
+    FULFILLED = 'fulfilled'
+    CANCELLED = 'cancelled'
+    EXPIRED = 'expired'
+    OPEN = (WAITING, READY)
+
+    id = db.Column(db.Integer, primary_key=True)
+    book_id = db.Column(db.Integer, db.ForeignKey('books.id', ondelete='CASCADE'), nullable=False)
+    member_id = db.Column(db.Integer, db.ForeignKey('members.id', ondelete='CASCADE'), nullable=False)
+    # The copy set aside while the hold is ready
+    copy_id = db.Column(db.Integer, db.ForeignKey('book_copies.id', ondelete='SET NULL'))
+    status = db.Column(db.String(10), nullable=False, default=WAITING)
+    placed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    ready_at = db.Column(db.DateTime)
+    expires_at = db.Column(db.DateTime)
+    closed_at = db.Column(db.DateTime)
+
+    book = db.relationship('Book', back_populates='holds')
+    member = db.relationship('Member', back_populates='holds')
+    copy = db.relationship('BookCopy')
+
+    def __repr__(self):
+        return f'<Hold #{self.id}: Book {self.book_id} - Member {self.member_id} ({self.status})>'
+
+    @property
+    def is_open(self):
+        return self.status in self.OPEN
+
+    def queue_position(self):
+        """1-based place in the book's queue, or None once the hold has left it"""
+        if self.status != self.WAITING:
+            return None
+        ahead = Hold.query.filter(
+            Hold.book_id == self.book_id,
+            Hold.status == Hold.WAITING,
+            tuple_(Hold.placed_at, Hold.id) < tuple_(self.placed_at, self.id)
+        ).count()
+        return ahead + 1
+
+    @classmethod
+    def queue_length(cls, book_id):
+        return cls.query.filter(cls.book_id == book_id, cls.status == cls.WAITING).count()
+
+    @classmethod
+    def allocate(cls, book_id, copy_ids, now=None):
+        """Set returned copies of a book aside for the first holds in its queue
+
+        The next holds are found with one probe of the queue index and
+        flipped to ready, each with its own copy, by one conditional UPDATE.
+        If another transaction got to any of them first, ``ConflictError``
+        is raised so the unit of work can be retried.
+
+        Args:
+            copy_ids (list): The copies coming back
+
+        Returns:
+            list: The copies now on the hold shelf, at most one per waiting
+            hold; empty if nobody is waiting
+        """
+        from app.models.book_copy import BookCopy
+        from app.utils.transactions import ConflictError
+
+        now = now or datetime.utcnow()
+        next_ids = [
+            hold_id for hold_id, in db.session.query(cls.id).filter(
+                cls.book_id == book_id,
+                cls.status == cls.WAITING
+            ).order_by(cls.placed_at, cls.id).limit(len(copy_ids))
+        ]
+        if not next_ids:
+            return []
+
+        held = list(copy_ids[:len(next_ids)])
+        ready = cls.query.filter(cls.id.in_(next_ids), cls.status == cls.WAITING).update({
+            cls.status: cls.READY,
+            cls.copy_id: case(dict(zip(next_ids, held)), value=cls.id),
+            cls.ready_at: now,
+            cls.expires_at: now + timedelta(days=Config.HOLD_PICKUP_DAYS)
+        }, synchronize_session='fetch')
+        if ready != len(next_ids):
+            raise ConflictError('A hold was allocated or cancelled concurrently.')
+        BookCopy.query.filter(BookCopy.id.in_(held)).update(
+            {BookCopy.status: BookCopy.ON_HOLD}, synchronize_session=False
+        )
+        return held
+
+    @classmethod
+    def allocate_copies(cls, copies, now=None):
+        """Offer returned copies of several books to their queues
+
+        Args:
+            copies (dict): Book id -> list of copy ids coming back
+
+        Returns:
+            dict: Book id -> the copies nobody was waiting for, to go back
+            on the shelf
+        """
+        queued = [
+            book_id for book_id, in db.session.query(cls.book_id).filter(
+                cls.book_id.in_(copies),
+                cls.status == cls.WAITING
+            ).distinct()
+        ]
+        left = {book_id: list(copy_ids) for book_id, copy_ids in copies.items()}
+        for book_id in queued:
+            held = cls.allocate(book_id, left[book_id], now)
+            left[book_id] = left[book_id][len(held):]
+        return {book_id: copy_ids for book_id, copy_ids in left.items() if copy_ids}
+
+    @classmethod
+    def ready_copies(cls, member_id, book_ids):
+        """Copies set aside for the member, as book id -> copy id"""
+        return dict(
+            db.session.query(cls.book_id, cls.copy_id).filter(
+                cls.member_id == member_id,
+                cls.book_id.in_(book_ids),
+                cls.status == cls.READY
+            )
+        )
+
+    @classmethod
+    def fulfil(cls, member_id, book_ids, status, now=None):
+        """Close the member's holds in ``status`` on books they have just borrowed
+
+        Returns:
+            int: Number of holds closed
+        """
+        return cls.query.filter(
+            cls.member_id == member_id,
+            cls.book_id.in_(book_ids),
+            cls.status == status
+        ).update({
+            cls.status: cls.FULFILLED,
+            cls.closed_at: now or datetime.utcnow()
+        }, synchronize_session='fetch')
+
+    def cancel(self, status=CANCELLED, now=None):
+        """Take the hold out of the queue
+
+        A copy that was set aside for it passes to the next hold in line,
+        or back to the shelf if nobody is waiting.
+
+        Args:
+            status (str): ``cancelled``, or ``expired`` for a missed pickup
+
+        Returns:
+            bool: False if the hold was already closed
+        """
+        from app.models.book_copy import BookCopy
+        from app.utils.transactions import ConflictError
+
+        if not self.is_open:
+            return False
+        now = now or datetime.utcnow()
+        was_ready = self.status == self.READY
+        closed = Hold.query.filter(Hold.id == self.id, Hold.status == self.status).update({
+            Hold.status: status,
+            Hold.closed_at: now
+        }, synchronize_session='fetch')
+        if not closed:
+            raise ConflictError('The hold changed concurrently.')
+        if was_ready:
+            BookCopy.shelve(Hold.allocate_copies({self.book_id: [self.copy_id]}, now))
+        return True
+
+    @classmethod
+    def expire_ready(cls, now=None):
+        """Expire every hold whose pickup window has closed
+
+        The copies are passed down each book's queue, or shelved.
+
+        Returns:
+            int: Number of holds expired
+        """
+        from app.models.book_copy import BookCopy
+        from app.utils.transactions import ConflictError
+
+        now = now or datetime.utcnow()
+        missed = db.session.query(cls.id, cls.book_id, cls.copy_id).filter(
+            cls.status == cls.READY,
+            cls.expires_at < now
+        ).all()
+        if not missed:
+            return 0
+
+        expired = cls.query.filter(cls.id.in_([hold.id for hold in missed]), cls.status == cls.READY).update({
+            cls.status: cls.EXPIRED,
+            cls.closed_at: now
+        }, synchronize_session=False)
+        if expired != len(missed):
+            raise ConflictError('A hold was picked up or cancelled concurrently.')
+        copies = defaultdict(list)
+        for hold in missed:
+            copies[hold.book_id].append(hold.copy_id)
+        BookCopy.shelve(cls.allocate_copies(copies, now))
+        return expired
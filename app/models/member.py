@@ -1,9 +1,17 @@
 from datetime import datetime
 from flask_login import UserMixin
+from sqlalchemy import and_, case, event, exists, func, select
+from sqlalchemy.ext.hybrid import hybrid_property
 from app import db, login_manager
+from app.models.circulation import Circulation
+from app.utils.cache import Cache
+from app.utils.search import install_search_index
 
 class Member(db.Model, UserMixin):
     __tablename__ = 'members'
+    __table_args__ = (
+        db.Index('ix_members_registration_date', 'registration_date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     member_id = db.Column(db.String(20), unique=True, nullable=False)
@@ -16,9 +24,20 @@ class Member(db.Model, UserMixin):
     registration_date = db.Column(db.DateTime, default=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
     is_admin = db.Column(db.Boolean, default=False)
+    # Outstanding fines in cents, kept in step with the fine ledger
+    balance_cents = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Bumped by every UPDATE, bulk ones included; API ETags and Last-Modified
+    row_version = db.Column(db.Integer, nullable=False, default=1, server_default='1',
+                            onupdate=db.text('row_version + 1'))
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationship with Circulation
     circulations = db.relationship('Circulation', back_populates='member', cascade='all, delete-orphan')
+    holds = db.relationship('Hold', back_populates='member', cascade='all, delete-orphan', lazy='dynamic')
+    fine_entries = db.relationship(
+        'FineLedgerEntry', foreign_keys='FineLedgerEntry.member_id', back_populates='member',
+        cascade='all, delete-orphan', lazy='dynamic'
+    )
     
     @property
     def full_name(self):
@@ -27,15 +46,134 @@ class Member(db.Model, UserMixin):
     def __repr__(self):
         return f'<Member {self.member_id}: {self.full_name}>'
     
+    @property
+    def balance(self):
+        """Outstanding fines as a Decimal"""
+        from app.models.fines import from_cents
+        return from_cents(self.balance_cents)
+    
+    @hybrid_property
     def has_overdue_books(self):
         """Check if member has any overdue books"""
-        from app.models.circulation import Circulation
-        return any(circulation.is_overdue() for circulation in self.circulations if not circulation.return_date)
+        return db.session.query(
+            exists().where(self._overdue_loan_filter(self.id))
+        ).scalar()
+    
+    @has_overdue_books.expression
+    def has_overdue_books(cls):
+        return exists().where(cls._overdue_loan_filter(cls.id))
+    
+    @hybrid_property
+    def active_loans_count(self):
+        """Count of books currently borrowed by the member"""
+        return db.session.query(func.count(Circulation.id)).filter(
+            Circulation.member_id == self.id,
+            Circulation.return_date.is_(None)
+        ).scalar()
+    
+    @active_loans_count.expression
+    def active_loans_count(cls):
+        return select(func.count(Circulation.id)).where(
+            Circulation.member_id == cls.id,
+            Circulation.return_date.is_(None)
+        ).scalar_subquery()
+    
+    @staticmethod
+    def _overdue_loan_filter(member_id):
+        return and_(
+            Circulation.member_id == member_id,
+            Circulation.return_date.is_(None),
+            Circulation.due_date < datetime.utcnow()
+        )
     
     def get_active_loans_count(self):
         """Get the count of books currently borrowed by the member"""
-        return sum(1 for circulation in self.circulations if not circulation.return_date)
+        return self.active_loans_count
+    
+    def get_loan_status(self):
+        """Get the member's open and overdue loan counts in one query
+        
+        Both counts are answered from the (member_id, return_date, due_date)
+        index without touching the member's returned loans.
+        
+        Returns:
+            tuple: (active loan count, overdue loan count)
+        """
+        active, overdue = db.session.query(
+            func.count(Circulation.id),
+            func.count(case((Circulation.due_date < datetime.utcnow(), 1)))
+        ).filter(
+            Circulation.member_id == self.id,
+            Circulation.return_date.is_(None)
+        ).one()
+        return active, overdue
+
+# Build the full-text index for member type-ahead alongside the members table
+event.listen(Member.__table__, 'after_create', install_search_index)
+
+# Who is logged in, per member id; any committed write to members clears it,
+# so edits and deactivation in members.edit take effect on the next request.
+# A per-worker copy would keep a deactivated or demoted member's rights on the
+# other workers, so it is only cached in a shared backend.
+identity_cache = Cache('identity', ttl=30, models=('Member',), shared_only=True)
+
+IDENTITY_FIELDS = ('id', 'first_name', 'last_name', 'is_active', 'is_admin')
+
+
+class MemberIdentity(UserMixin):
+    """The logged-in member as ``current_user`` sees it
+    
+    Holds only the columns checked on every request (id, name and the
+    active/admin flags). Any other attribute loads the full ``Member`` row
+    once, on first use.
+    """
+    
+    def __init__(self, id, first_name, last_name, is_active, is_admin):
+        self.id = id
+        self.first_name = first_name
+        self.last_name = last_name
+        self._is_active = bool(is_active)
+        self.is_admin = bool(is_admin)
+        self._member = None
+    
+    @property
+    def is_active(self):
+        return self._is_active
+    
+    @property
+    def full_name(self):
+        return f"{self.first_name} {self.last_name}"
+    
+    @property
+    def member(self):
+        """The full ``Member`` row"""
+        if self._member is None:
+            self._member = Member.query.get(self.id)
+        return self._member
+    
+    def __getattr__(self, name):
+        # Only reached for attributes not set above
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.member, name)
+    
+    def __repr__(self):
+        return f'<MemberIdentity {self.id}>'
 
 @login_manager.user_loader
 def load_user(id):
-    return Member.query.get(int(id))
\ No newline at end of file
+    """Rebuild ``current_user`` from the identity cache
+    
+    A miss reads the identity columns alone. Deactivated members are
+    logged out.
+    """
+    def compute():
+        row = db.session.query(*[getattr(Member, field) for field in IDENTITY_FIELDS]).filter(
+            Member.id == int(id)
+        ).first()
+        return tuple(row) if row else None
+    
+    fields = identity_cache.get_or_set((int(id),), compute)
+    if fields is None or not fields[IDENTITY_FIELDS.index('is_active')]:
+        return None
+    return MemberIdentity(*fields)
\ No newline at end of file
@@ -0,0 +1,342 @@
+from decimal import InvalidOperation
+from functools import wraps
+from flask import Blueprint, jsonify, request, url_for, current_app
+from flask_login import current_user
+from werkzeug.exceptions import HTTPException
+from app import db
+from app.models.book import Book
+from app.models.member import Member
+from app.models.circulation import Circulation
+from app.models.fines import FineLedgerEntry, from_cents
+from app.utils.api import (
+    compute_etag, not_modified, parse_fields, parse_per_page, serialize, with_validators
+)
+from app.utils.cache import cache_stats
+from app.utils.pagination import keyset_paginate
+from app.utils.search import suggest_books, suggest_members
+from app.utils.transactions import retry_on_conflict
+
+API_VERSION = 'v1'
+SUGGEST_MAX_LIMIT = 25
+
+api_bp = Blueprint('api', __name__, url_prefix=f'/api/{API_VERSION}')
+
+# Public fields per resource, in output order. Anything not listed here
+# (password hashes in particular) is never exposed.
+BOOK_FIELDS = {
+    'id': Book.id,
+    'title': Book.title,
+    'author': Book.author,
+    'isbn': Book.isbn,
+    'publisher': Book.publisher,
+    'publication_year': Book.publication_year,
+    'description': Book.description,
+    'category': Book.category,
+    'language': Book.language,
+    'pages': Book.pages,
+    'quantity': Book.quantity,
+    'available_quantity': Book.available_quantity,
+    'location_shelf': Book.location_shelf,
+    'cover_image': Book.cover_image,
+    'date_added': Book.date_added,
+    'loan_count': Book.loan_count,
+    'last_loaned_at': Book.last_loaned_at,
+    'updated_at': Book.updated_at,
+}
+
+MEMBER_FIELDS = {
+    'id': Member.id,
+    'member_id': Member.member_id,
+    'first_name': Member.first_name,
+    'last_name': Member.last_name,
+    'email': Member.email,
+    'phone': Member.phone,
+    'address': Member.address,
+    'registration_date': Member.registration_date,
+    'is_active': Member.is_active,
+    'is_admin': Member.is_admin,
+    'balance_cents': Member.balance_cents,
+    'updated_at': Member.updated_at,
+}
+
+CIRCULATION_FIELDS = {
+    'id': Circulation.id,
+    'book_id': Circulation.book_id,
+    'member_id': Circulation.member_id,
+    'copy_id': Circulation.copy_id,
+    'checkout_date': Circulation.checkout_date,
+    'due_date': Circulation.due_date,
+    'return_date': Circulation.return_date,
+    'fine_amount': Circulation.fine_amount,
+    'fine_paid': Circulation.fine_paid,
+    'notes': Circulation.notes,
+    'updated_at': Circulation.updated_at,
+}
+
+
+@api_bp.errorhandler(HTTPException)
+def api_error(error):
+    return jsonify(error=error.description), error.code
+
+
+def api_login_required(view):
+    """Like ``login_required``, but answers 401 JSON instead of redirecting"""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if not current_user.is_authenticated:
+            return jsonify(error='Authentication required.'), 401
+        return view(*args, **kwargs)
+    return wrapped
+
+
+def _collection(endpoint, query, model, fields_map, sort_key, descending=False, **url_args):
+    """Answer a keyset-paginated collection request
+
+    The page is located with a keys-only query (sort key, id, row_version)
+    whose result alone determines the ETag, so a matching If-None-Match is
+    answered with 304 before any full rows are loaded or serialized.
+    """
+    fields = parse_fields(fields_map)
+    per_page = parse_per_page(current_app.config['API_PER_PAGE'])
+
+    key_columns = sort_key + [
+        column for column in (model.id, model.row_version)
+        if not any(column is key for key in sort_key)
+    ]
+    keys = query.with_entities(*key_columns)
+    page = keyset_paginate(
+        keys, sort_key, per_page,
+        after=request.args.get('after'),
+        before=request.args.get('before'),
+        descending=descending
+    )
+    ids = [row.id for row in page.items]
+    etag = compute_etag(
+        API_VERSION, endpoint, fields,
+        [(row.id, row.row_version) for row in page.items],
+        page.next_cursor, page.prev_cursor
+    )
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    rows = {}
+    if ids:
+        columns = [fields_map[name].label(name) for name in fields]
+        rows = {row.id: row for row in db.session.query(*columns).filter(model.id.in_(ids))}
+
+    links = {}
+    args = dict(url_args, fields=request.args.get('fields'), per_page=request.args.get('per_page'))
+    if page.has_next:
+        links['next'] = url_for(endpoint, after=page.next_cursor, **args)
+    if page.has_prev:
+        links['prev'] = url_for(endpoint, before=page.prev_cursor, **args)
+
+    response = jsonify(data=[serialize(rows[id_], fields) for id_ in ids if id_ in rows], links=links)
+    return with_validators(response, etag)
+
+
+def _resource(endpoint, model, fields_map, resource_id, visible=None):
+    """Answer a single-resource request, 304 when the row version is unchanged
+
+    Args:
+        visible (callable): Gets the version row (which includes
+            ``member_id`` for circulations) and returns False to hide it
+    """
+    fields = parse_fields(fields_map)
+    version_columns = [model.row_version, model.updated_at]
+    if model is Circulation:
+        version_columns.append(Circulation.member_id)
+    version = db.session.query(*version_columns).filter(model.id == resource_id).first()
+    if version is None or (visible and not visible(version)):
+        return jsonify(error='Not found.'), 404
+
+    etag = compute_etag(API_VERSION, endpoint, resource_id, version.row_version, fields)
+    cached = not_modified(etag, version.updated_at)
+    if cached:
+        return cached
+
+    columns = [fields_map[name].label(name) for name in fields]
+    row = db.session.query(*columns).filter(model.id == resource_id).one()
+    return with_validators(jsonify(data=serialize(row, fields)), etag, version.updated_at)
+
+
+def _staff_only():
+    if not current_user.is_admin:
+        return jsonify(error='Forbidden.'), 403
+    return None
+
+
+@api_bp.route('/books')
+def list_books():
+    """Catalog, ordered by title; filter with ``category`` and ``available=1``"""
+    query = Book.query
+    url_args = {}
+    if request.args.get('category'):
+        url_args['category'] = request.args['category']
+        query = query.filter(Book.category == url_args['category'])
+    if request.args.get('available', type=int):
+        url_args['available'] = 1
+        query = query.filter(Book.available_quantity > 0)
+    return _collection('api.list_books', query, Book, BOOK_FIELDS, [Book.title, Book.id], **url_args)
+
+
+def _suggest_limit():
+    return min(max(request.args.get('limit', default=10, type=int), 1), SUGGEST_MAX_LIMIT)
+
+
+@api_bp.route('/books/suggest')
+def suggest_books_view():
+    """Type-ahead for book pickers: ``q`` prefix, ``available=1``, ``limit``"""
+    rows = suggest_books(
+        request.args.get('q', ''),
+        limit=_suggest_limit(),
+        available_only=bool(request.args.get('available', type=int))
+    )
+    return jsonify(data=[
+        {'id': id_, 'title': title, 'author': author, 'isbn': isbn, 'available_quantity': available}
+        for id_, title, author, isbn, available in rows
+    ])
+
+
+@api_bp.route('/books/<int:book_id>')
+def get_book(book_id):
+    return _resource('api.get_book', Book, BOOK_FIELDS, book_id)
+
+
+@api_bp.route('/members')
+@api_login_required
+def list_members():
+    """Member directory (staff only), ordered by id"""
+    denied = _staff_only()
+    if denied:
+        return denied
+    return _collection('api.list_members', Member.query, Member, MEMBER_FIELDS, [Member.id])
+
+
+@api_bp.route('/members/suggest')
+@api_login_required
+def suggest_members_view():
+    """Type-ahead for member pickers (staff only): ``q`` prefix, ``active=1``, ``limit``"""
+    denied = _staff_only()
+    if denied:
+        return denied
+    rows = suggest_members(
+        request.args.get('q', ''),
+        limit=_suggest_limit(),
+        active_only=bool(request.args.get('active', type=int))
+    )
+    return jsonify(data=[
+        {'id': id_, 'member_id': member_id, 'name': f'{first_name} {last_name}', 'email': email}
+        for id_, member_id, first_name, last_name, email in rows
+    ])
+
+
+@api_bp.route('/members/<int:member_id>')
+@api_login_required
+def get_member(member_id):
+    """A member's profile; members may only read their own"""
+    if not current_user.is_admin and current_user.id != member_id:
+        return jsonify(error='Not found.'), 404
+    return _resource('api.get_member', Member, MEMBER_FIELDS, member_id)
+
+
+def _balance(member_id):
+    balance_cents = db.session.query(Member.balance_cents).filter(Member.id == member_id).scalar()
+    return {'member_id': member_id, 'balance_cents': balance_cents, 'balance': str(from_cents(balance_cents))}
+
+
+@api_bp.route('/members/<int:member_id>/balance')
+@api_login_required
+def get_member_balance(member_id):
+    """A member's outstanding fines, read from the stored balance"""
+    if not current_user.is_admin and current_user.id != member_id:
+        return jsonify(error='Not found.'), 404
+    if not db.session.query(Member.id).filter(Member.id == member_id).first():
+        return jsonify(error='Not found.'), 404
+    return jsonify(data=_balance(member_id))
+
+
+@api_bp.route('/members/<int:member_id>/payments', methods=['POST'])
+@api_login_required
+def create_payment(member_id):
+    """Record a fine payment or waiver (staff only)
+
+    Takes a JSON body with ``amount`` in dollars (a string such as ``"2.50"``
+    avoids float rounding) and optional ``kind`` (``payment`` or
+    ``waiver``), ``circulation_id`` and ``note``. Answers 409 if the amount
+    exceeds the outstanding balance.
+    """
+    denied = _staff_only()
+    if denied:
+        return denied
+    if not db.session.query(Member.id).filter(Member.id == member_id).first():
+        return jsonify(error='Not found.'), 404
+
+    payload = request.get_json(silent=True) or {}
+    try:
+        entry = retry_on_conflict(lambda: FineLedgerEntry.record_payment(
+            member_id,
+            payload.get('amount', ''),
+            kind=payload.get('kind', FineLedgerEntry.PAYMENT),
+            circulation_id=payload.get('circulation_id'),
+            recorded_by_id=current_user.id,
+            note=payload.get('note')
+        ))
+    except InvalidOperation:
+        return jsonify(error='amount must be a number.'), 400
+    except ValueError as error:
+        return jsonify(error=str(error)), 400
+    if entry is None:
+        return jsonify(error='Amount exceeds the outstanding balance.', data=_balance(member_id)), 409
+
+    return jsonify(data=dict(
+        _balance(member_id), id=entry.id, kind=entry.kind,
+        amount_cents=-entry.amount_cents, circulation_id=entry.circulation_id
+    )), 201
+
+
+@api_bp.route('/cache')
+@api_login_required
+def get_cache_stats():
+    """Cache backend and this worker's hit and miss counters (staff only)"""
+    denied = _staff_only()
+    if denied:
+        return denied
+    return jsonify(data=cache_stats())
+
+
+@api_bp.route('/circulations')
+@api_login_required
+def list_circulations():
+    """Loans, newest first
+
+    Staff see every loan and may filter by ``member_id``; members only see
+    their own. ``status`` is ``open`` or ``returned``.
+    """
+    query = Circulation.query
+    url_args = {}
+    member_id = request.args.get('member_id', type=int) if current_user.is_admin else current_user.id
+    if member_id:
+        if current_user.is_admin:
+            url_args['member_id'] = member_id
+        query = query.filter(Circulation.member_id == member_id)
+    status = request.args.get('status')
+    if status in ('open', 'returned'):
+        url_args['status'] = status
+    if status == 'open':
+        query = query.filter(Circulation.return_date.is_(None))
+    elif status == 'returned':
+        query = query.filter(Circulation.return_date.isnot(None))
+    return _collection(
+        'api.list_circulations', query, Circulation, CIRCULATION_FIELDS,
+        [Circulation.checkout_date, Circulation.id], descending=True, **url_args
+    )
+
+
+@api_bp.route('/circulations/<int:circulation_id>')
+@api_login_required
+def get_circulation(circulation_id):
+    def visible(version):
+        return current_user.is_admin or version.member_id == current_user.id
+    return _resource('api.get_circulation', Circulation, CIRCULATION_FIELDS, circulation_id, visible)
@@ -1,20 +1,77 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+import io
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, abort
+from flask_login import login_required, current_user
+from sqlalchemy.orm import joinedload, load_only
 from app import db
 from app.models.book import Book
+from app.models.book_copy import BookCopy
+from app.models.circulation import Circulation
+from app.models.hold import Hold
+from app.models.member import Member
+from app.utils.catalog import book_categories, book_detail
+from app.utils.engine import replica_reads
+from app.utils.importer import IMPORT_FORMATS, import_books
+from app.utils.pagination import keyset_paginate
+from app.utils.search import search_books
 
 books_bp = Blueprint('books', __name__, url_prefix='/books')
 
 @books_bp.route('/')
+@replica_reads
 def index():
-    """List all books in the catalog"""
-    books = Book.query.all()
-    return render_template('books/index.html', books=books)
+    """List the books in the catalog, one keyset page at a time"""
+    # Only read the columns the catalog cards actually render
+    query = Book.query.options(load_only(
+        Book.id, Book.title, Book.author, Book.category, Book.description,
+        Book.cover_image, Book.quantity, Book.available_quantity
+    ))
+    page = keyset_paginate(
+        query,
+        [Book.title, Book.id],
+        per_page=current_app.config['BOOKS_PER_PAGE'],
+        after=request.args.get('after'),
+        before=request.args.get('before')
+    )
+    return render_template('books/index.html', books=page.items, page=page, categories=book_categories())
 
 @books_bp.route('/<int:book_id>')
 def view(book_id):
     """View a specific book's details"""
-    book = Book.query.get_or_404(book_id)
-    return render_template('books/view.html', book=book)
+    # Catalog fields and counters come from the cache
+    book = book_detail(book_id)
+    if book is None:
+        abort(404)
+    
+    # Queue length and the viewer's own hold, both from the holds indexes
+    queue_length = Hold.queue_length(book_id)
+    my_hold = None
+    if current_user.is_authenticated:
+        my_hold = Hold.query.filter(
+            Hold.book_id == book_id,
+            Hold.member_id == current_user.id,
+            Hold.status.in_(Hold.OPEN)
+        ).first()
+    
+    # Staff also see the individual copies and the loan history, newest
+    # first a page at a time
+    copies, history = [], None
+    if current_user.is_authenticated and current_user.is_admin:
+        copies = BookCopy.query.filter(
+            BookCopy.book_id == book_id,
+            BookCopy.status != BookCopy.WITHDRAWN
+        ).order_by(BookCopy.id).all()
+        history = keyset_paginate(
+            Circulation.query.options(
+                joinedload(Circulation.member).load_only(Member.id, Member.first_name, Member.last_name)
+            ).filter(Circulation.book_id == book_id),
+            [Circulation.checkout_date, Circulation.id],
+            current_app.config['CIRCULATIONS_PER_PAGE'],
+            after=request.args.get('history_after'),
+            before=request.args.get('history_before'),
+            descending=True
+        )
+    return render_template('books/view.html', book=book, queue_length=queue_length, my_hold=my_hold,
+                           copies=copies, history=history)
 
 @books_bp.route('/add', methods=['GET', 'POST'])
 def add():
@@ -44,13 +101,15 @@ def add():
             category=category,
             language=language,
             pages=pages,
-            quantity=quantity,
-            available_quantity=quantity,
+            quantity=0,
+            available_quantity=0,
             location_shelf=location_shelf
         )
         
-        # Save to database
+        # Save to database; the counters follow the copies added
         db.session.add(new_book)
+        db.session.flush()
+        BookCopy.add(new_book.id, quantity)
         db.session.commit()
         
         flash('Book added successfully!', 'success')
@@ -58,6 +117,33 @@ def add():
     
     return render_template('books/add.html')
 
+@books_bp.route('/import', methods=['GET', 'POST'])
+@login_required
+def bulk_import():
+    """Import or update many books at once from an uploaded file"""
+    if not current_user.is_admin:
+        return render_template('errors/403.html'), 403
+    
+    result = None
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        fmt = request.form.get('format', 'csv')
+        if not upload or not upload.filename:
+            flash('Choose a file to import.', 'danger')
+            return redirect(url_for('books.bulk_import'))
+        if fmt not in IMPORT_FORMATS:
+            flash('Unsupported import format.', 'danger')
+            return redirect(url_for('books.bulk_import'))
+        
+        # Decode the upload as it is read instead of loading it into memory
+        stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', errors='replace', newline='')
+        result = import_books(stream, fmt=fmt)
+        flash(f'Imported {result.imported} books from {result.rows} rows '
+              f'({result.rows_per_second:.0f} rows/s).',
+              'warning' if result.error_count else 'success')
+    
+    return render_template('books/import.html', result=result)
+
 @books_bp.route('/<int:book_id>/edit', methods=['GET', 'POST'])
 def edit(book_id):
     """Edit an existing book"""
@@ -75,12 +161,19 @@ def edit(book_id):
         book.language = request.form.get('language')
         book.pages = request.form.get('pages')
         
-        new_quantity = int(request.form.get('quantity', 1))
-        quantity_diff = new_quantity - book.quantity
-        book.quantity = new_quantity
-        book.available_quantity += quantity_diff
-        
         book.location_shelf = request.form.get('location_shelf')
+        db.session.flush()
+        
+        # Quantity changes add or withdraw copies; only shelf copies can be withdrawn
+        new_quantity = int(request.form.get('quantity', 1))
+        if new_quantity > book.quantity:
+            BookCopy.add(book.id, new_quantity - book.quantity)
+        elif new_quantity < book.quantity:
+            wanted = book.quantity - new_quantity
+            withdrawn = BookCopy.withdraw(book.id, wanted)
+            if withdrawn < wanted:
+                flash(f'Only {withdrawn} of {wanted} copies could be withdrawn; '
+                      f'the rest are on loan or on hold.', 'warning')
         
         db.session.commit()
         flash('Book updated successfully!', 'success')
@@ -106,23 +199,25 @@ def delete(book_id):
     return redirect(url_for('books.index'))
 
 @books_bp.route('/search')
+@replica_reads
 def search():
     """Search for books by various criteria"""
     query = request.args.get('query', '')
     category = request.args.get('category', '')
+    page = request.args.get('page', 1, type=int)
     
-    # Build the search query
-    search_query = Book.query
-    
-    if query:
-        search_query = search_query.filter(
-            (Book.title.ilike(f'%{query}%')) | 
-            (Book.author.ilike(f'%{query}%')) | 
-            (Book.isbn.ilike(f'%{query}%'))
-        )
-    
-    if category:
-        search_query = search_query.filter(Book.category == category)
-    
-    books = search_query.all()
-    return render_template('books/search.html', books=books, query=query, category=category)
\ No newline at end of file
+    books, has_next = search_books(
+        query,
+        category=category,
+        page=page,
+        per_page=current_app.config['BOOKS_PER_PAGE']
+    )
+    return render_template(
+        'books/search.html',
+        books=books,
+        query=query,
+        category=category,
+        page=page,
+        has_next=has_next,
+        categories=book_categories()
+    )
@@ -1,25 +1,60 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, jsonify
 from flask_login import login_required, current_user
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
 from datetime import datetime
 from app import db
 from app.models.book import Book
+from app.models.book_copy import BookCopy
 from app.models.member import Member
 from app.models.circulation import Circulation
+from app.models.fines import FineLedgerEntry
+from app.models.hold import Hold
 from app.config import Config
+from app.utils.pagination import keyset_paginate
+from app.utils.transactions import retry_on_conflict
 
 circulation_bp = Blueprint('circulation', __name__, url_prefix='/circulation')
 
 @circulation_bp.route('/')
 @login_required
 def index():
-    """List all circulation records"""
+    """List circulation records, paging current loans and history separately"""
+    per_page = current_app.config['CIRCULATIONS_PER_PAGE']
+    
+    # Load each row's book and member in the same SELECT
+    query = Circulation.query.options(
+        joinedload(Circulation.book).load_only(Book.id, Book.title, Book.author),
+        joinedload(Circulation.member).load_only(Member.id, Member.first_name, Member.last_name)
+    )
+    
     # Admins see all records, regular members see only their own
-    if current_user.is_admin:
-        circulations = Circulation.query.order_by(Circulation.checkout_date.desc()).all()
-    else:
-        circulations = Circulation.query.filter_by(member_id=current_user.id).order_by(Circulation.checkout_date.desc()).all()
+    if not current_user.is_admin:
+        query = query.filter(Circulation.member_id == current_user.id)
+    
+    sort_key = [Circulation.checkout_date, Circulation.id]
+    active_page = keyset_paginate(
+        query.filter(Circulation.return_date.is_(None)),
+        sort_key,
+        per_page,
+        after=request.args.get('active_after'),
+        before=request.args.get('active_before'),
+        descending=True
+    )
+    history_page = keyset_paginate(
+        query.filter(Circulation.return_date.isnot(None)),
+        sort_key,
+        per_page,
+        after=request.args.get('history_after'),
+        before=request.args.get('history_before'),
+        descending=True
+    )
     
-    return render_template('circulation/index.html', circulations=circulations)
+    return render_template(
+        'circulation/index.html',
+        active_page=active_page,
+        history_page=history_page
+    )
 
 @circulation_bp.route('/checkout', methods=['GET', 'POST'])
 @login_required
@@ -29,43 +64,135 @@ def checkout():
         book_id = request.form.get('book_id', type=int)
         member_id = request.form.get('member_id', type=int)
         
+        # A scanned barcode names the exact copy, and with it the book
+        copy = None
+        if request.form.get('barcode', '').strip():
+            copy = BookCopy.find_by_barcode(request.form['barcode'])
+            if copy is None or (book_id and copy.book_id != book_id):
+                flash('No copy of that book has this barcode.', 'danger')
+                return redirect(url_for('circulation.checkout'))
+            book_id = copy.book_id
+        
+        if not book_id or not member_id:
+            flash('Choose a book and a member from the suggestions.', 'danger')
+            return redirect(url_for('circulation.checkout'))
+        
         # Validate book and member
         book = Book.query.get_or_404(book_id)
         member = Member.query.get_or_404(member_id)
         
-        # Check if book is available
-        if not book.is_available():
+        # Check if book is available, on the shelf or set aside for this member
+        if not book.is_available() and not Hold.ready_copies(member.id, [book.id]):
             flash('Book is not available for checkout.', 'danger')
             return redirect(url_for('circulation.checkout'))
         
+        # Check loan limit and overdue status in a single indexed lookup
+        active_loans_count, overdue_count = member.get_loan_status()
+        
         # Check if member has reached max books limit
-        active_loans_count = member.get_active_loans_count()
-        if active_loans_count >= Config.MAX_BOOKS_PER_USER:
-            flash(f'Member has reached the maximum loan limit of {Config.MAX_BOOKS_PER_USER} books.', 'danger')
+        if active_loans_count >= Config.MAX_BOOKS_PER_MEMBER:
+            flash(f'Member has reached the maximum loan limit of {Config.MAX_BOOKS_PER_MEMBER} books.', 'danger')
             return redirect(url_for('circulation.checkout'))
         
         # Check if member has any overdue books
-        if member.has_overdue_books():
+        if overdue_count:
             flash('Member has overdue books. Cannot check out more books until overdue items are returned.', 'danger')
             return redirect(url_for('circulation.checkout'))
         
-        # Create new circulation record
-        checkout = Circulation(book_id=book_id, member_id=member_id)
-        
-        # Update book availability
-        book.update_availability(-1)  # Decrease available quantity by 1
-        
-        db.session.add(checkout)
-        db.session.commit()
+        # Take the copy and record the loan in one transaction; the
+        # conditional UPDATE is what actually guards the last copy
+        checkout = retry_on_conflict(
+            lambda: Circulation.check_out(book_id, member_id, copy_id=copy.id if copy else None)
+        )
+        if checkout is None:
+            flash('Book is not available for checkout.', 'danger')
+            return redirect(url_for('circulation.checkout'))
         
-        flash(f'Book "{book.title}" checked out successfully to {member.full_name}.', 'success')
+        flash(f'Book "{book.title}" (copy {checkout.copy.barcode}) checked out successfully '
+              f'to {member.full_name}.', 'success')
         return redirect(url_for('circulation.index'))
     
-    # For GET request, show checkout form
-    books = Book.query.filter(Book.available_quantity > 0).all()
-    members = Member.query.filter_by(is_active=True).all()
+    # For GET request, show checkout form. Books and members are picked
+    # through the type-ahead API; only a book linked from its page is loaded.
+    book_id = request.args.get('book_id', type=int)
+    selected_book = Book.query.get(book_id) if book_id else None
     
-    return render_template('circulation/checkout.html', books=books, members=members)
+    return render_template('circulation/checkout.html', selected_book=selected_book)
+
+def _batch_ids(name):
+    """Read a list of integer ids from a JSON body or repeated form fields
+    
+    Returns None unless the ids come as a list; JSON booleans are not ids.
+    """
+    payload = request.get_json(silent=True)
+    values = payload.get(name, []) if isinstance(payload, dict) else request.form.getlist(name)
+    if not isinstance(values, list) or any(isinstance(value, bool) for value in values):
+        return None
+    try:
+        return [int(value) for value in values]
+    except (TypeError, ValueError):
+        return None
+
+
+@circulation_bp.route('/checkout/batch', methods=['POST'])
+@login_required
+def checkout_batch():
+    """Check out a pile of scanned books to one member in a single request
+    
+    Takes ``member_id`` and ``book_ids`` and answers with a status per book.
+    """
+    if not current_user.is_admin:
+        return jsonify(error='Only staff can check out books.'), 403
+    
+    payload = request.get_json(silent=True)
+    member_id = payload.get('member_id') if isinstance(payload, dict) else request.form.get('member_id', type=int)
+    book_ids = _batch_ids('book_ids')
+    if not isinstance(member_id, int) or isinstance(member_id, bool) or not book_ids:
+        return jsonify(error='member_id and a list of book_ids are required.'), 400
+    if len(book_ids) > current_app.config['MAX_BATCH_SIZE']:
+        return jsonify(error=f'At most {current_app.config["MAX_BATCH_SIZE"]} items per batch.'), 400
+    
+    member = Member.query.get(member_id)
+    if member is None:
+        return jsonify(error='Member not found.'), 404
+    
+    # Loan limit and overdue status are checked once for the whole batch
+    active_loans_count, overdue_count = member.get_loan_status()
+    if overdue_count:
+        return jsonify(
+            error='Member has overdue books. Cannot check out more books until overdue items are returned.'
+        ), 409
+    
+    slots = max(Config.MAX_BOOKS_PER_MEMBER - active_loans_count, 0)
+    results = retry_on_conflict(lambda: Circulation.check_out_batch(member.id, book_ids, slots))
+    return jsonify(
+        member_id=member.id,
+        checked_out=sum(result['status'] == 'checked_out' for result in results),
+        results=results
+    )
+
+@circulation_bp.route('/return/batch', methods=['POST'])
+@login_required
+def return_batch():
+    """Return a pile of scanned loans in a single request
+    
+    Takes ``circulation_ids`` and answers with a status per loan.
+    """
+    if not current_user.is_admin:
+        return jsonify(error='Only staff can return books.'), 403
+    
+    circulation_ids = _batch_ids('circulation_ids')
+    if not circulation_ids:
+        return jsonify(error='A list of circulation_ids is required.'), 400
+    if len(circulation_ids) > current_app.config['MAX_BATCH_SIZE']:
+        return jsonify(error=f'At most {current_app.config["MAX_BATCH_SIZE"]} items per batch.'), 400
+    
+    results = retry_on_conflict(lambda: Circulation.return_batch(circulation_ids))
+    return jsonify(
+        returned=sum(result['status'] == 'returned' for result in results),
+        fines_total=sum(result.get('fine_amount', 0.0) for result in results),
+        results=results
+    )
 
 @circulation_bp.route('/return/<int:circulation_id>', methods=['GET', 'POST'])
 @login_required
@@ -79,14 +206,28 @@ def return_book(circulation_id):
         return redirect(url_for('circulation.index'))
     
     if request.method == 'POST':
-        # Process return
-        circulation.return_book()
+        fine_paid = current_user.is_admin and 'fine_paid' in request.form
         
-        # Update database
-        db.session.commit()
+        def return_and_pay():
+            if not circulation.return_book():
+                return False
+            # The fine is charged by the return; a payment at the desk settles it at once
+            if fine_paid and circulation.fine_amount > 0:
+                FineLedgerEntry.record_payment(
+                    circulation.member_id, circulation.fine_amount,
+                    circulation_id=circulation.id, recorded_by_id=current_user.id
+                )
+            return True
+        
+        # Process return
+        if not retry_on_conflict(return_and_pay):
+            flash('This book has already been returned.', 'warning')
+            return redirect(url_for('circulation.index'))
         
         # Check if there was a fine
-        if circulation.fine_amount > 0:
+        if circulation.fine_amount > 0 and circulation.fine_paid:
+            flash(f'Book returned; fine of ${circulation.fine_amount:.2f} paid.', 'success')
+        elif circulation.fine_amount > 0:
             flash(f'Book returned with fine: ${circulation.fine_amount:.2f}', 'warning')
         else:
             flash('Book returned successfully.', 'success')
@@ -99,23 +240,34 @@ def return_book(circulation_id):
 @circulation_bp.route('/overdue')
 @login_required
 def overdue():
-    """List all overdue books"""
+    """List overdue books, most overdue first"""
     today = datetime.utcnow()
     
+    query = Circulation.query.filter(
+        Circulation.return_date.is_(None),
+        Circulation.due_date < today
+    )
     # Build query based on user role
-    if current_user.is_admin:
-        overdue_loans = Circulation.query.filter(
-            Circulation.return_date == None,
-            Circulation.due_date < today
-        ).order_by(Circulation.due_date).all()
-    else:
-        overdue_loans = Circulation.query.filter(
-            Circulation.member_id == current_user.id,
-            Circulation.return_date == None,
-            Circulation.due_date < today
-        ).order_by(Circulation.due_date).all()
+    if not current_user.is_admin:
+        query = query.filter(Circulation.member_id == current_user.id)
+    overdue_count = query.with_entities(db.func.count(Circulation.id)).scalar()
+    
+    # Load each row's book and member in the same SELECT, a page at a time
+    overdue_page = keyset_paginate(
+        query.options(
+            joinedload(Circulation.book).load_only(Book.id, Book.title, Book.author),
+            joinedload(Circulation.member).load_only(
+                Member.id, Member.first_name, Member.last_name, Member.email
+            )
+        ),
+        [Circulation.due_date, Circulation.id],
+        current_app.config['CIRCULATIONS_PER_PAGE'],
+        after=request.args.get('after'),
+        before=request.args.get('before')
+    )
     
-    return render_template('circulation/overdue.html', overdue_loans=overdue_loans)
+    return render_template('circulation/overdue.html', overdue_page=overdue_page,
+                           overdue_count=overdue_count, today=today)
 
 @circulation_bp.route('/renew/<int:circulation_id>', methods=['POST'])
 @login_required
@@ -144,4 +296,71 @@ def renew(circulation_id):
     db.session.commit()
     
     flash(f'Book renewed successfully. New due date: {circulation.due_date.strftime("%Y-%m-%d")}', 'success')
-    return redirect(url_for('circulation.index'))
\ No newline at end of file
+    return redirect(url_for('circulation.index'))
+
+@circulation_bp.route('/holds')
+@login_required
+def holds():
+    """The hold shelf: copies set aside and waiting for pickup, oldest first"""
+    if not current_user.is_admin:
+        return render_template('errors/403.html'), 403
+    
+    ready_holds = Hold.query.options(
+        joinedload(Hold.book).load_only(Book.id, Book.title, Book.author),
+        joinedload(Hold.member).load_only(Member.id, Member.first_name, Member.last_name, Member.email)
+    ).filter(Hold.status == Hold.READY).order_by(Hold.expires_at).all()
+    return render_template('circulation/holds.html', ready_holds=ready_holds, now=datetime.utcnow())
+
+@circulation_bp.route('/holds/place', methods=['POST'])
+@login_required
+def place_hold():
+    """Join the queue for a book with no copies on the shelf
+    
+    Members place holds for themselves; staff may pass ``member_id``.
+    """
+    book = Book.query.get_or_404(request.form.get('book_id', type=int))
+    member_id = current_user.id
+    if current_user.is_admin and request.form.get('member_id', type=int):
+        member_id = request.form.get('member_id', type=int)
+    member = Member.query.get_or_404(member_id)
+    back = redirect(url_for('books.view', book_id=book.id))
+    
+    if book.is_available():
+        flash('Copies of this book are on the shelf; check one out instead.', 'warning')
+        return back
+    if not member.is_active:
+        flash('Inactive members cannot place holds.', 'danger')
+        return back
+    if Circulation.query.filter_by(book_id=book.id, member_id=member.id, return_date=None).first():
+        flash(f'{member.full_name} already has this book on loan.', 'warning')
+        return back
+    if member.holds.filter(Hold.status.in_(Hold.OPEN)).count() >= Config.MAX_HOLDS_PER_MEMBER:
+        flash(f'Members may have at most {Config.MAX_HOLDS_PER_MEMBER} holds at a time.', 'danger')
+        return back
+    
+    hold = Hold(book_id=book.id, member_id=member.id)
+    db.session.add(hold)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # The partial unique index allows one open hold per member and book
+        db.session.rollback()
+        flash(f'{member.full_name} already has a hold on this book.', 'warning')
+        return back
+    
+    flash(f'Hold placed for "{book.title}"; {member.full_name} is number {hold.queue_position()} in the queue.', 'success')
+    return back
+
+@circulation_bp.route('/holds/<int:hold_id>/cancel', methods=['POST'])
+@login_required
+def cancel_hold(hold_id):
+    """Cancel a hold; a copy set aside for it passes to the next in line"""
+    hold = Hold.query.get_or_404(hold_id)
+    if not current_user.is_admin and hold.member_id != current_user.id:
+        return render_template('errors/403.html'), 403
+    
+    if retry_on_conflict(hold.cancel):
+        flash('Hold cancelled.', 'success')
+    else:
+        flash('This hold is no longer open.', 'warning')
+    return redirect(url_for('members.view', member_id=hold.member_id))
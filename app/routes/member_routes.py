@@ -1,12 +1,34 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import login_user, logout_user, login_required, current_user
+from sqlalchemy import case, func
+from sqlalchemy.orm import joinedload
+from decimal import InvalidOperation
 import uuid
 from app import db
+from app.models.book import Book
 from app.models.member import Member
+from app.models.circulation import Circulation
+from app.models.fines import FineLedgerEntry
+from app.models.hold import Hold
+from app.utils.pagination import keyset_paginate
+from app.utils.search import like_escape
+from app.utils.transactions import retry_on_conflict
+
+# Ledger entries shown on a member's profile
+RECENT_FINE_ENTRIES = 10
 
 members_bp = Blueprint('members', __name__, url_prefix='/members')
 
+def _with_overdue_flag(query):
+    """Add each member's overdue flag to a member query as a column
+    
+    The listing shows the flag for every row; selecting the hybrid's SQL
+    expression avoids one EXISTS query per member. Rows unpack as
+    ``(member, has_overdue)``.
+    """
+    return query.add_columns(Member.has_overdue_books.label('has_overdue'))
+
 @members_bp.route('/')
 @login_required
 def index():
@@ -14,8 +36,8 @@ def index():
     page = request.args.get('page', 1, type=int)
     per_page = 10  # Number of items per page
     
-    # Get paginated members
-    pagination = Member.query.paginate(page=page, per_page=per_page, error_out=False)
+    # Get paginated members, each with its overdue flag from the same query
+    pagination = _with_overdue_flag(Member.query).paginate(page=page, per_page=per_page, error_out=False)
     members = pagination.items
     total_pages = pagination.pages
     
@@ -85,15 +107,15 @@ def search():
     per_page = 10  # Number of items per page
     
     if query:
-        search_term = f"%{query}%"
-        pagination = Member.query.filter(
-            (Member.first_name.ilike(search_term)) |
-            (Member.last_name.ilike(search_term)) |
-            (Member.email.ilike(search_term)) |
-            (Member.member_id.ilike(search_term))
+        search_term = f"%{like_escape(query)}%"
+        pagination = _with_overdue_flag(Member.query).filter(
+            (Member.first_name.ilike(search_term, escape='\\')) |
+            (Member.last_name.ilike(search_term, escape='\\')) |
+            (Member.email.ilike(search_term, escape='\\')) |
+            (Member.member_id.ilike(search_term, escape='\\'))
         ).paginate(page=page, per_page=per_page, error_out=False)
     else:
-        pagination = Member.query.paginate(page=page, per_page=per_page, error_out=False)
+        pagination = _with_overdue_flag(Member.query).paginate(page=page, per_page=per_page, error_out=False)
     
     members = pagination.items
     total_pages = pagination.pages
@@ -111,7 +133,81 @@ def search():
 def view(member_id):
     """View a specific member's details"""
     member = Member.query.get_or_404(member_id)
-    return render_template('members/view.html', member=member)
+    
+    loans = Circulation.query.options(
+        joinedload(Circulation.book).load_only(Book.id, Book.title, Book.author)
+    ).filter(Circulation.member_id == member.id)
+    
+    # Current loans are capped by MAX_BOOKS_PER_MEMBER; history is paged
+    active_loans = loans.filter(Circulation.return_date.is_(None)).order_by(Circulation.due_date).all()
+    history_page = keyset_paginate(
+        loans.filter(Circulation.return_date.isnot(None)),
+        [Circulation.checkout_date, Circulation.id],
+        current_app.config['CIRCULATIONS_PER_PAGE'],
+        after=request.args.get('history_after'),
+        before=request.args.get('history_before'),
+        descending=True
+    )
+    
+    # Lifetime statistics in a single aggregate query
+    stats = None
+    if current_user.is_admin:
+        stats = db.session.query(
+            func.count(Circulation.id).label('total_borrowed'),
+            func.count(case((Circulation.return_date > Circulation.due_date, 1))).label('total_overdue')
+        ).filter(Circulation.member_id == member.id).one()
+    
+    # Outstanding balance is stored on the member; only the latest entries are read
+    fine_entries = member.fine_entries.order_by(
+        FineLedgerEntry.created_at.desc(), FineLedgerEntry.id.desc()
+    ).limit(RECENT_FINE_ENTRIES).all()
+    
+    open_holds = member.holds.options(
+        joinedload(Hold.book).load_only(Book.id, Book.title, Book.author)
+    ).filter(Hold.status.in_(Hold.OPEN)).order_by(Hold.placed_at).all()
+    
+    return render_template(
+        'members/view.html',
+        member=member,
+        active_loans=active_loans,
+        history_page=history_page,
+        stats=stats,
+        fine_entries=fine_entries,
+        open_holds=open_holds
+    )
+
+@members_bp.route('/<int:member_id>/payments', methods=['POST'])
+@login_required
+def record_payment(member_id):
+    """Record a full or partial fine payment, or a waiver"""
+    if not current_user.is_admin:
+        flash('You do not have permission to record payments.', 'danger')
+        return redirect(url_for('index'))
+    
+    member = Member.query.get_or_404(member_id)
+    kind = request.form.get('kind', FineLedgerEntry.PAYMENT)
+    try:
+        entry = retry_on_conflict(lambda: FineLedgerEntry.record_payment(
+            member.id,
+            request.form.get('amount', '').strip(),
+            kind=kind,
+            circulation_id=request.form.get('circulation_id', type=int),
+            recorded_by_id=current_user.id,
+            note=request.form.get('note') or None
+        ))
+    except InvalidOperation:
+        flash('Enter the amount as a number, e.g. 2.50.', 'danger')
+        return redirect(url_for('members.view', member_id=member.id))
+    except ValueError as error:
+        flash(str(error), 'danger')
+        return redirect(url_for('members.view', member_id=member.id))
+    
+    if entry is None:
+        flash(f'The amount exceeds the outstanding balance of ${member.balance}.', 'danger')
+    else:
+        db.session.refresh(member)
+        flash(f'Recorded {kind} of ${-entry.amount}. Outstanding balance: ${member.balance}.', 'success')
+    return redirect(url_for('members.view', member_id=member.id))
 
 @members_bp.route('/register', methods=['GET', 'POST'])
 def register():
@@ -237,11 +333,14 @@ def delete(member_id):
     member = Member.query.get_or_404(member_id)
     
     # Check if the member has active loans
-    active_loans = [c for c in member.circulations if c.return_date is None]
-    if active_loans:
+    if member.get_active_loans_count():
         flash('Cannot delete member. There are active loans for this member.', 'danger')
         return redirect(url_for('members.view', member_id=member.id))
     
+    if member.balance_cents > 0:
+        flash('Cannot delete member. There are outstanding fines for this member.', 'danger')
+        return redirect(url_for('members.view', member_id=member.id))
+    
     db.session.delete(member)
     db.session.commit()
     
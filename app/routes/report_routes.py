@@ -1,14 +1,23 @@
-from flask import Blueprint, render_template, request
+from flask import Blueprint, Response, abort, render_template, request, current_app, stream_with_context
 from flask_login import login_required, current_user
 from sqlalchemy import func
+from sqlalchemy.orm import load_only
 from datetime import datetime, timedelta
 from app.models.book import Book
 from app.models.member import Member
 from app.models.circulation import Circulation
+from app.models.circulation_stats import DailyCirculationStat
 from app import db
+from app.utils.engine import read_from_replica
+from app.utils.export import EXPORT_FORMATS, gzip_chunks, serialize_rows, stream_query
+from app.utils.pagination import keyset_paginate
+from app.utils.stats import circulation_summary, inventory_summary
 
 reports_bp = Blueprint('reports', __name__, url_prefix='/reports')
 
+# Reports only read, so they run against the read replica when there is one
+reports_bp.before_request(read_from_replica)
+
 @reports_bp.route('/')
 @login_required
 def index():
@@ -28,49 +37,31 @@ def circulation_stats():
     
     # Get time period from query params (defaults to last 30 days)
     days = request.args.get('days', default=30, type=int)
-    start_date = datetime.utcnow() - timedelta(days=days)
-    
-    # Total checkouts in period
-    total_checkouts = Circulation.query.filter(Circulation.checkout_date >= start_date).count()
-    
-    # Total returns in period
-    total_returns = Circulation.query.filter(
-        Circulation.return_date.isnot(None),
-        Circulation.return_date >= start_date
-    ).count()
-    
-    # Current active loans
-    active_loans = Circulation.query.filter(Circulation.return_date.is_(None)).count()
-    
-    # Overdue loans
-    overdue_loans = Circulation.query.filter(
-        Circulation.return_date.is_(None),
-        Circulation.due_date < datetime.utcnow()
-    ).count()
-    
-    # Total fines collected
-    fines_collected = db.session.query(func.sum(Circulation.fine_amount)).filter(
-        Circulation.fine_paid == True,
-        Circulation.return_date >= start_date
-    ).scalar() or 0
-    
-    # Books with highest circulation
-    popular_books = db.session.query(
-        Book,
-        func.count(Circulation.id).label('loan_count')
-    ).join(Book.circulations).filter(
-        Circulation.checkout_date >= start_date
-    ).group_by(Book.id).order_by(func.count(Circulation.id).desc()).limit(10).all()
+    start_day = (datetime.utcnow() - timedelta(days=days)).date()
+    
+    # Checkouts, returns, active/overdue loans and fines collected
+    summary = circulation_summary(days, start_day)
+    
+    # Books with highest circulation, ranked from the daily rollup before
+    # loading only the top ten books
+    top_books = db.session.query(
+        DailyCirculationStat.book_id,
+        func.sum(DailyCirculationStat.checkouts).label('loan_count')
+    ).filter(
+        DailyCirculationStat.day >= start_day,
+        DailyCirculationStat.checkouts > 0
+    ).group_by(DailyCirculationStat.book_id).order_by(
+        func.sum(DailyCirculationStat.checkouts).desc()
+    ).limit(10).subquery()
+    popular_books = db.session.query(Book, top_books.c.loan_count).join(
+        top_books, top_books.c.book_id == Book.id
+    ).order_by(top_books.c.loan_count.desc()).all()
     
     return render_template(
         'reports/circulation_stats.html',
         days=days,
-        total_checkouts=total_checkouts,
-        total_returns=total_returns,
-        active_loans=active_loans,
-        overdue_loans=overdue_loans,
-        fines_collected=fines_collected,
-        popular_books=popular_books
+        popular_books=popular_books,
+        **summary
     )
 
 @reports_bp.route('/member-activity')
@@ -85,12 +76,18 @@ def member_activity():
     start_date = datetime.utcnow() - timedelta(days=days)
     
     # Most active members (by number of checkouts)
-    active_members = db.session.query(
-        Member,
-        func.count(Circulation.id).label('checkout_count')
-    ).join(Member.circulations).filter(
-        Circulation.checkout_date >= start_date
-    ).group_by(Member.id).order_by(func.count(Circulation.id).desc()).limit(10).all()
+    top_members = db.session.query(
+        DailyCirculationStat.member_id,
+        func.sum(DailyCirculationStat.checkouts).label('checkout_count')
+    ).filter(
+        DailyCirculationStat.day >= start_date.date(),
+        DailyCirculationStat.checkouts > 0
+    ).group_by(DailyCirculationStat.member_id).order_by(
+        func.sum(DailyCirculationStat.checkouts).desc()
+    ).limit(10).subquery()
+    active_members = db.session.query(Member, top_members.c.checkout_count).join(
+        top_members, top_members.c.member_id == Member.id
+    ).order_by(top_members.c.checkout_count.desc()).all()
     
     # Members with overdue books
     members_with_overdue = db.session.query(
@@ -119,30 +116,138 @@ def inventory():
     if not current_user.is_admin:
         return render_template('errors/403.html'), 403
     
-    # Total books in collection
-    total_books = db.session.query(func.sum(Book.quantity)).scalar() or 0
-    
-    # Total unique titles
-    unique_titles = Book.query.count()
+    # Totals, list sizes and books by category
+    summary = inventory_summary()
     
-    # Books by category
-    books_by_category = db.session.query(
-        Book.category, 
-        func.count(Book.id).label('book_count'),
-        func.sum(Book.quantity).label('total_copies')
-    ).group_by(Book.category).order_by(func.count(Book.id).desc()).all()
+    # The two book lists are keyset-paginated by title, each from its own index
+    per_page = current_app.config['BOOKS_PER_PAGE']
+    listing = Book.query.options(load_only(
+        Book.id, Book.title, Book.author, Book.category, Book.isbn,
+        Book.quantity, Book.available_quantity, Book.last_loaned_at
+    ))
+    sort_key = [Book.title, Book.id]
     
     # Books with zero availability
-    unavailable_books = Book.query.filter(Book.available_quantity == 0).all()
+    unavailable_page = keyset_paginate(
+        listing.filter(Book.available_quantity == 0),
+        sort_key,
+        per_page,
+        after=request.args.get('unavailable_after'),
+        before=request.args.get('unavailable_before')
+    )
     
-    # Books never checked out (may need optimization for large libraries)
-    never_loaned = Book.query.filter(~Book.circulations.any()).all()
+    # Books never checked out, from the maintained loan_count
+    never_loaned_page = keyset_paginate(
+        listing.filter(Book.loan_count == 0),
+        sort_key,
+        per_page,
+        after=request.args.get('never_after'),
+        before=request.args.get('never_before')
+    )
     
     return render_template(
         'reports/inventory.html',
-        total_books=total_books,
-        unique_titles=unique_titles,
-        books_by_category=books_by_category,
-        unavailable_books=unavailable_books,
-        never_loaned=never_loaned
-    )
\ No newline at end of file
+        unavailable_page=unavailable_page,
+        never_loaned_page=never_loaned_page,
+        **summary
+    )
+
+def _parse_day(name):
+    """Read an optional YYYY-MM-DD query parameter"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        abort(400, description=f'{name} must be a date in YYYY-MM-DD format')
+
+def _export_response(name, query):
+    """Stream a column query as a CSV or NDJSON download
+
+    Rows go from a server-side cursor straight into the response in
+    batches, so memory use does not grow with the size of the export.
+    """
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        abort(400, description='format must be csv or ndjson')
+    compress = request.args.get('gzip', type=int, default=0) == 1
+    
+    columns = [column['name'] for column in query.column_descriptions]
+    chunks = serialize_rows(stream_query(query), columns, fmt)
+    filename = f'{name}-{datetime.utcnow():%Y%m%d}.{fmt}'
+    if compress:
+        chunks = gzip_chunks(chunks)
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    else:
+        mimetype = EXPORT_FORMATS[fmt]
+    
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
+
+@reports_bp.route('/export/books')
+@login_required
+def export_books():
+    """Export the catalog"""
+    if not current_user.is_admin:
+        return render_template('errors/403.html'), 403
+    
+    query = db.session.query(
+        Book.id, Book.title, Book.author, Book.isbn, Book.publisher,
+        Book.publication_year, Book.category, Book.language, Book.pages,
+        Book.quantity, Book.available_quantity, Book.location_shelf,
+        Book.date_added, Book.loan_count, Book.last_loaned_at
+    ).order_by(Book.id)
+    return _export_response('books', query)
+
+@reports_bp.route('/export/members')
+@login_required
+def export_members():
+    """Export the member list, without credentials"""
+    if not current_user.is_admin:
+        return render_template('errors/403.html'), 403
+    
+    query = db.session.query(
+        Member.id, Member.member_id, Member.first_name, Member.last_name,
+        Member.email, Member.phone, Member.address, Member.registration_date,
+        Member.is_active, Member.is_admin
+    ).order_by(Member.id)
+    return _export_response('members', query)
+
+@reports_bp.route('/export/circulations')
+@login_required
+def export_circulations():
+    """Export circulation history, optionally for a checkout date range
+    
+    ``start`` and ``end`` are inclusive YYYY-MM-DD dates.
+    """
+    if not current_user.is_admin:
+        return render_template('errors/403.html'), 403
+    
+    start = _parse_day('start')
+    end = _parse_day('end')
+    
+    query = db.session.query(
+        Circulation.id,
+        Circulation.book_id,
+        Book.isbn,
+        Book.title,
+        Circulation.member_id,
+        Member.member_id.label('member_number'),
+        Circulation.checkout_date,
+        Circulation.due_date,
+        Circulation.return_date,
+        Circulation.fine_amount,
+        Circulation.fine_paid
+    ).join(Book, Book.id == Circulation.book_id).join(
+        Member, Member.id == Circulation.member_id
+    )
+    if start:
+        query = query.filter(Circulation.checkout_date >= start)
+    if end:
+        query = query.filter(Circulation.checkout_date < end + timedelta(days=1))
+    # Walks ix_circulations_checkout_date in order
+    query = query.order_by(Circulation.checkout_date, Circulation.id)
+    return _export_response('circulations', query)
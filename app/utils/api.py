@@ -0,0 +1,76 @@
+import hashlib
+from datetime import date, datetime
+from flask import abort, current_app, request
+
+API_MAX_PER_PAGE = 100
+
+
+def parse_fields(available):
+    """Read the ``fields`` sparse fieldset parameter
+
+    Args:
+        available (dict): Field name -> column, in default output order
+
+    Returns:
+        list: Requested field names (always including ``id``), or every
+        field when the parameter is absent
+    """
+    requested = request.args.get('fields')
+    if not requested:
+        return list(available)
+    names = [name.strip() for name in requested.split(',') if name.strip()]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        abort(400, description=f'Unknown fields: {", ".join(unknown)}')
+    return ['id'] + [name for name in available if name in names and name != 'id']
+
+
+def parse_per_page(default):
+    per_page = request.args.get('per_page', default=default, type=int)
+    return min(max(per_page, 1), API_MAX_PER_PAGE)
+
+
+def to_json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def serialize(row, fields):
+    """Turn a column row into a dict holding only the requested fields"""
+    return {name: to_json_value(getattr(row, name)) for name in fields}
+
+
+def compute_etag(*parts):
+    """Hash the version parts of a representation into a strong ETag value"""
+    digest = hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+    return digest[:32]
+
+
+def not_modified(etag, last_modified=None):
+    """Build a 304 response if the client's cached copy is still current
+
+    If-None-Match wins over If-Modified-Since when both are sent.
+
+    Returns:
+        Response: An empty 304, or None if the full response is needed
+    """
+    if request.if_none_match:
+        fresh = request.if_none_match.contains(etag)
+    elif request.if_modified_since and last_modified:
+        fresh = last_modified.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None)
+    else:
+        fresh = False
+    if not fresh:
+        return None
+    response = current_app.response_class(status=304)
+    return with_validators(response, etag, last_modified)
+
+
+def with_validators(response, etag, last_modified=None):
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    # Cached copies must be revalidated, which is what makes the 304s cheap
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
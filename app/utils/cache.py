@@ -0,0 +1,367 @@
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+try:
+    import redis
+except ImportError:  # optional: only needed for a redis:// CACHE_URL
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class LRUCache:
+    """A bounded, thread-safe in-process store whose entries expire
+
+    The least recently used entry is evicted once ``maxsize`` is reached.
+    Each gunicorn worker holds its own copy.
+    """
+
+    name = 'memory'
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return _MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self, prefix=''):
+        with self._lock:
+            if not prefix:
+                self._entries.clear()
+                return
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCache:
+    """A cache in a local SQLite file, shared by every worker on the host
+
+    A stand-in for Redis on single-host deployments: WAL mode lets the
+    workers read concurrently, values are pickled, and expired rows are
+    purged every ``PURGE_EVERY`` writes.
+    """
+
+    name = 'sqlite'
+    PURGE_EVERY = 500
+
+    def __init__(self, path, maxsize=None):
+        self.path = path
+        self.evictions = 0
+        self._local = threading.local()
+        self._writes = 0
+
+    def _connection(self):
+        # One connection per thread, and never one inherited across a fork
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL'
+                ') WITHOUT ROWID'
+            )
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return connection
+
+    def get(self, key):
+        row = self._connection().execute(
+            'SELECT value FROM cache WHERE key = ? AND expires_at > ?', (key, time.time())
+        ).fetchone()
+        return _MISSING if row is None else pickle.loads(row[0])
+
+    def set(self, key, value, ttl):
+        connection = self._connection()
+        connection.execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)',
+            (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), time.time() + ttl)
+        )
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            purged = connection.execute('DELETE FROM cache WHERE expires_at <= ?', (time.time(),))
+            self.evictions += purged.rowcount
+
+    def delete(self, key):
+        self._connection().execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def clear(self, prefix=''):
+        # A key range rather than LIKE, so the primary key index is used
+        self._connection().execute(
+            'DELETE FROM cache WHERE key >= ? AND key < ?', (prefix, prefix + '\uffff')
+        )
+
+    def __len__(self):
+        return self._connection().execute('SELECT count(*) FROM cache').fetchone()[0]
+
+
+class RedisCache:
+    """A cache in Redis, shared by every worker that can reach it"""
+
+    name = 'redis'
+
+    def __init__(self, url, maxsize=None):
+        if redis is None:
+            raise RuntimeError('CACHE_URL points at Redis but the redis package is not installed.')
+        self.evictions = 0
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        raw = self._client.get(key)
+        return _MISSING if raw is None else pickle.loads(raw)
+
+    def set(self, key, value, ttl):
+        self._client.set(key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), px=max(int(ttl * 1000), 1))
+
+    def delete(self, key):
+        self._client.delete(key)
+
+    def clear(self, prefix=''):
+        keys = list(self._client.scan_iter(match=f'{prefix}*', count=500))
+        if keys:
+            self._client.delete(*keys)
+
+    def __len__(self):
+        return self._client.dbsize()
+
+
+def create_backend(url, maxsize=1024):
+    """Build a cache backend from a URL
+
+    ``memory://`` (the default) is a per-worker LRU, ``sqlite:///path``
+    a file shared by the workers on one host and ``redis://host:port/db``
+    a Redis server.
+    """
+    scheme = urlparse(url or 'memory://').scheme
+    if scheme == 'memory':
+        return LRUCache(maxsize)
+    if scheme == 'sqlite':
+        return SQLiteCache(url[len('sqlite:///'):], maxsize)
+    if scheme in ('redis', 'rediss', 'unix'):
+        return RedisCache(url, maxsize)
+    raise ValueError(f'Unsupported CACHE_URL scheme: {scheme}')
+
+
+_backend = LRUCache()
+_namespaces = {}
+
+
+class Cache:
+    """One namespace of cached values in the configured backend
+
+    Committing a change to any of ``models`` made through the session
+    (ORM flushes, and INSERT, UPDATE and DELETE statements run with
+    ``session.execute``, Core ones included) clears the whole namespace.
+    ``bulk_insert_mappings``/``bulk_update_mappings`` and raw SQL text are
+    not seen; their callers clear the namespace themselves. With a
+    shared backend the clear reaches every worker; with the in-process one
+    other workers keep their copies for at most ``ttl`` seconds, unless the
+    namespace is ``shared_only`` and so not cached at all.
+
+    Args:
+        namespace (str): Key prefix, also the ``<NAMESPACE>_CACHE_TTL``
+            config key that overrides ``ttl``
+        ttl (int): Seconds an entry lives (0 disables caching)
+        models (tuple): Names of the mapped classes whose writes invalidate
+            the namespace
+        shared_only (bool): Cache only in a backend shared by every worker,
+            for values another worker must never serve stale
+    """
+
+    def __init__(self, namespace, ttl=60, models=(), shared_only=False):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.models = frozenset(models)
+        self.shared_only = shared_only
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+        _namespaces[namespace] = self
+
+    def _key(self, key):
+        return f'{self.namespace}:' + ':'.join(str(part) for part in key)
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get_or_set(self, key, factory):
+        """Return the cached value for ``key`` (a tuple), computing and storing it on a miss
+
+        A failing shared backend is logged and treated as a miss.
+        """
+        if self.ttl <= 0:
+            return factory()
+        full_key = self._key(key)
+        try:
+            value = _backend.get(full_key)
+        except Exception:
+            logger.exception('Cache read failed for %s', full_key)
+            self._count('errors')
+            value = _MISSING
+        if value is not _MISSING:
+            self._count('hits')
+            return value
+
+        self._count('misses')
+        value = factory()
+        try:
+            _backend.set(full_key, value, self.ttl)
+        except Exception:
+            logger.exception('Cache write failed for %s', full_key)
+            self._count('errors')
+        return value
+
+    def delete(self, key):
+        _backend.delete(self._key(key))
+
+    def clear(self):
+        """Drop every entry in the namespace"""
+        self._count('invalidations')
+        try:
+            _backend.clear(f'{self.namespace}:')
+        except Exception:
+            logger.exception('Cache clear failed for %s', self.namespace)
+            self._count('errors')
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            'invalidations': self.invalidations,
+            'errors': self.errors,
+        }
+
+
+def cache_stats():
+    """Backend details and this worker's hit and miss counters per namespace"""
+    return {
+        'backend': _backend.name,
+        'entries': len(_backend),
+        'evictions': _backend.evictions,
+        'namespaces': {name: cache.stats() for name, cache in sorted(_namespaces.items())},
+    }
+
+
+def clear_caches(*namespaces):
+    """Clear the given namespaces, or all of them"""
+    for name in namespaces or list(_namespaces):
+        _namespaces[name].clear()
+
+
+def _namespaces_for(class_name):
+    return {name for name, cache in _namespaces.items() if class_name in cache.models}
+
+
+def _mark_dirty(session, flush_context, instances):
+    changed = session.new | session.dirty | session.deleted
+    dirty = set().union(*(_namespaces_for(type(obj).__name__) for obj in changed))
+    if dirty:
+        session.info.setdefault('dirty_caches', set()).update(dirty)
+
+
+def _written_class_name(orm_execute_state):
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None:
+        return mapper.class_.__name__
+    # Core statements name a table rather than a class, e.g. the importer's
+    # INSERT .. ON CONFLICT DO UPDATE on Book.__table__
+    from app import db
+
+    table = getattr(orm_execute_state.statement, 'table', None)
+    for mapper in db.Model.registry.mappers:
+        if mapper.local_table is table:
+            return mapper.class_.__name__
+    return None
+
+
+def _mark_dirty_on_bulk(orm_execute_state):
+    # Bulk INSERT/UPDATE/DELETE statements bypass the flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        class_name = _written_class_name(orm_execute_state)
+        dirty = _namespaces_for(class_name) if class_name else set()
+        if dirty:
+            orm_execute_state.session.info.setdefault('dirty_caches', set()).update(dirty)
+
+
+def _clear_after_commit(session):
+    for name in session.info.pop('dirty_caches', ()):
+        _namespaces[name].clear()
+
+
+def _discard_after_rollback(session, previous_transaction):
+    # A rolled-back SAVEPOINT leaves the outer transaction's writes to
+    # commit, so only the outermost rollback forgets them (the savepoint's
+    # own marks are kept too: a spare clear is harmless, a missed one is not)
+    if previous_transaction.parent is None:
+        session.info.pop('dirty_caches', None)
+
+
+_listeners_installed = False
+
+
+def init_cache(app):
+    """Configure the cache backend and namespace TTLs, and invalidate on commit
+
+    ``CACHE_URL`` picks the backend (see ``create_backend``) and
+    ``CACHE_MAX_ENTRIES`` bounds the in-process LRU. Every namespace takes
+    its TTL from ``<NAMESPACE>_CACHE_TTL`` when set; ``shared_only`` ones
+    are disabled on the in-process backend.
+    """
+    global _backend, _listeners_installed
+    # Declare the application's namespaces before any write can happen
+    from app.utils import catalog, stats  # noqa: F401
+
+    _backend = create_backend(app.config.get('CACHE_URL'), app.config.get('CACHE_MAX_ENTRIES', 1024))
+    for name, cache in _namespaces.items():
+        cache.ttl = app.config.get(f'{name.upper()}_CACHE_TTL', cache.ttl)
+        if cache.shared_only and _backend.name == LRUCache.name:
+            cache.ttl = 0
+    if not _listeners_installed:
+        event.listen(Session, 'before_flush', _mark_dirty)
+        event.listen(Session, 'do_orm_execute', _mark_dirty_on_bulk)
+        event.listen(Session, 'after_commit', _clear_after_commit)
+        event.listen(Session, 'after_soft_rollback', _discard_after_rollback)
+        _listeners_installed = True
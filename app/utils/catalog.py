@@ -0,0 +1,51 @@
+from types import SimpleNamespace
+from app import db
+from app.utils.cache import Cache
+
+# Book detail pages and category lists; any committed write to books
+# (catalog edits, imports, and the availability counters moved by
+# checkouts and returns) clears them
+catalog_cache = Cache('catalog', ttl=300, models=('Book',))
+
+# What the book detail page shows, all straight from the books row
+DETAIL_FIELDS = (
+    'id', 'title', 'author', 'isbn', 'publisher', 'publication_year', 'description',
+    'category', 'language', 'pages', 'quantity', 'available_quantity',
+    'location_shelf', 'date_added', 'cover_image',
+)
+
+
+def book_detail(book_id):
+    """A book's detail fields, cached, or None if there is no such book
+
+    Returns:
+        SimpleNamespace: Read-only attributes named as in ``DETAIL_FIELDS``
+    """
+    from app.models.book import Book
+
+    def compute():
+        row = db.session.query(*[getattr(Book, field) for field in DETAIL_FIELDS]).filter(
+            Book.id == book_id
+        ).first()
+        return dict(row._asdict()) if row else None
+
+    fields = catalog_cache.get_or_set(('book', book_id), compute)
+    return SimpleNamespace(**fields) if fields else None
+
+
+def book_categories():
+    """Distinct book categories in name order, for the catalog filters
+
+    Read from the leading column of the books inventory index.
+    """
+    from app.models.book import Book
+
+    def compute():
+        return [
+            category for category, in db.session.query(Book.category).filter(
+                Book.category.isnot(None),
+                Book.category != ''
+            ).distinct().order_by(Book.category)
+        ]
+
+    return catalog_cache.get_or_set(('categories',), compute)
@@ -0,0 +1,144 @@
+from functools import wraps
+from flask_sqlalchemy import SQLAlchemy, SignallingSession, get_state
+from sqlalchemy import event, orm
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+REPLICA_BIND = 'replica'
+
+
+class RoutingSession(SignallingSession):
+    """A session that can send plain SELECTs to the read replica
+
+    Once ``read_from_replica`` has flagged the session, SELECT statements
+    go to the ``replica`` bind. Flushes, bulk UPDATE/DELETE, raw SQL and
+    ``SELECT ... FOR UPDATE`` stay on the primary. Without a replica
+    configured everything goes to the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None):
+        if (
+            self.info.get('use_replica')
+            and getattr(clause, 'is_select', False)
+            and getattr(clause, '_for_update_arg', None) is None
+            and REPLICA_BIND in (self.app.config['SQLALCHEMY_BINDS'] or {})
+        ):
+            return get_state(self.app).db.get_engine(self.app, bind=REPLICA_BIND)
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """Flask-SQLAlchemy with ``RoutingSession`` as its session class"""
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+def read_from_replica():
+    """Send this request's SELECTs to the read replica
+
+    The flag lasts until the session is removed at the end of the request,
+    so streamed responses read from the replica too. Reads may lag the
+    primary by the replica's replication delay.
+    """
+    from app import db
+    db.session().info['use_replica'] = True
+
+
+def replica_reads(view):
+    """Decorate a read-only view so its queries go to the read replica"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        read_from_replica()
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def pool_options(config):
+    """Engine options for the connection pool, from the ``DB_POOL_*`` settings
+
+    With ``SQLITE_TUNING`` on, SQLite database files get a small pool too,
+    so a connection keeps its PRAGMAs, page cache and memory map across
+    requests instead of being reopened for every checkout. Connections may
+    then be handed to another thread, which the pool keeps to one at a
+    time. Otherwise SQLite is left to Flask-SQLAlchemy.
+    """
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() == 'sqlite':
+        if not config['SQLITE_TUNING'] or url.database in (None, '', ':memory:'):
+            return {}
+        return {
+            'poolclass': QueuePool,
+            'pool_size': config['DB_POOL_SIZE'],
+            'max_overflow': config['DB_MAX_OVERFLOW'],
+            'pool_timeout': config['DB_POOL_TIMEOUT'],
+            'connect_args': {'check_same_thread': False},
+        }
+    return {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+
+
+def sqlite_pragmas(config):
+    """The PRAGMAs run on every new SQLite connection, in order
+
+    WAL lets readers carry on while one worker writes, ``busy_timeout``
+    makes a writer wait for the lock instead of failing with "database is
+    locked", and ``synchronous=NORMAL`` keeps the database consistent under
+    WAL while skipping the fsync on every commit. ``mmap_size`` and
+    ``cache_size`` keep hot pages in memory. Foreign keys are off in SQLite
+    unless asked for.
+    """
+    if not config['SQLITE_TUNING']:
+        return []
+    pragmas = [
+        'PRAGMA journal_mode=WAL',
+        f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT_MS'])}",
+        'PRAGMA synchronous=NORMAL',
+        f"PRAGMA mmap_size={int(config['SQLITE_MMAP_SIZE'])}",
+        f"PRAGMA cache_size={int(config['SQLITE_CACHE_SIZE'])}",
+    ]
+    if config['SQLITE_FOREIGN_KEYS']:
+        pragmas.append('PRAGMA foreign_keys=ON')
+    return pragmas
+
+
+def _run_on_connect(engine, pragmas):
+    @event.listens_for(engine, 'connect')
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
+def init_engine(app):
+    """Configure the pool, the read replica bind and the SQLite profile
+
+    ``REPLICA_DATABASE_URL`` adds a ``replica`` bind; SQLite connections to
+    it are also made read-only.
+    """
+    from app import db
+
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = dict(
+        pool_options(app.config), **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+    )
+    if app.config.get('REPLICA_DATABASE_URL'):
+        app.config['SQLALCHEMY_BINDS'] = dict(
+            app.config.get('SQLALCHEMY_BINDS') or {}, **{REPLICA_BIND: app.config['REPLICA_DATABASE_URL']}
+        )
+
+    pragmas = sqlite_pragmas(app.config)
+    engine = db.get_engine(app)
+    if engine.dialect.name == 'sqlite' and pragmas:
+        _run_on_connect(engine, pragmas)
+    if REPLICA_BIND in (app.config.get('SQLALCHEMY_BINDS') or {}):
+        replica = db.get_engine(app, bind=REPLICA_BIND)
+        if replica.dialect.name == 'sqlite':
+            _run_on_connect(replica, pragmas + ['PRAGMA query_only=ON'])
@@ -0,0 +1,75 @@
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+# Rows fetched per round trip and serialized per chunk of output
+EXPORT_BATCH_SIZE = 1000
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'Cannot serialize {type(value).__name__}')
+
+
+def stream_query(query, batch_size=EXPORT_BATCH_SIZE):
+    """Iterate a column query through a server-side cursor
+
+    ``stream_results`` keeps drivers that support it (psycopg2, mysqlclient)
+    from buffering the whole result; ``yield_per`` fetches one batch at a
+    time. Select columns rather than entities so no rows are kept in the
+    session's identity map.
+    """
+    return query.execution_options(stream_results=True).yield_per(batch_size)
+
+
+def serialize_rows(rows, columns, fmt, batch_size=EXPORT_BATCH_SIZE):
+    """Encode rows as CSV or NDJSON, yielding one chunk per batch of rows
+
+    Args:
+        rows (iterable): Result rows with the given column names
+        columns (list): Column names, in output order
+        fmt (str): 'csv' or 'ndjson'
+        batch_size (int): Rows per yielded chunk
+
+    Yields:
+        str: Encoded output
+    """
+    buffer = io.StringIO()
+    if fmt == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        write = writer.writerow
+    else:
+        def write(row):
+            buffer.write(json.dumps(dict(zip(columns, row)), default=_json_default))
+            buffer.write('\n')
+
+    pending = 0
+    for row in rows:
+        write(row)
+        pending += 1
+        if pending >= batch_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def gzip_chunks(chunks, level=6):
+    """Compress a stream of text chunks into a gzip stream, incrementally"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
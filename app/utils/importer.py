@@ -0,0 +1,281 @@
+import csv
+import re
+import time
+from datetime import datetime
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+from app.utils.search import normalize_isbn
+
+IMPORT_FORMATS = ('csv', 'marc')
+IMPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 500
+
+# Columns a catalog row may set; anything else in the input is ignored
+BOOK_FIELDS = (
+    'title', 'author', 'isbn', 'publisher', 'publication_year', 'description',
+    'category', 'language', 'pages', 'quantity', 'location_shelf', 'cover_image',
+)
+REQUIRED_FIELDS = ('title', 'author', 'isbn')
+INTEGER_FIELDS = ('publication_year', 'pages', 'quantity')
+
+# MARC tag/subfield -> book field for the mnemonic (.mrk) text format
+MARC_FIELDS = {
+    ('020', 'a'): 'isbn',
+    ('041', 'a'): 'language',
+    ('100', 'a'): 'author',
+    ('245', 'a'): 'title',
+    ('260', 'b'): 'publisher',
+    ('260', 'c'): 'publication_year',
+    ('264', 'b'): 'publisher',
+    ('264', 'c'): 'publication_year',
+    ('300', 'a'): 'pages',
+    ('520', 'a'): 'description',
+    ('650', 'a'): 'category',
+    ('852', 'h'): 'location_shelf',
+}
+MARC_LINE = re.compile(r'^=(\w{3})  (.*)$')
+LEADING_DIGITS = re.compile(r'\d+')
+
+
+class RecordError(Exception):
+    """A single input record that cannot be imported"""
+
+
+class ImportResult:
+    """Running totals for a bulk import"""
+
+    def __init__(self):
+        self.rows = 0
+        self.imported = 0
+        self.duplicates = 0
+        self.error_count = 0
+        self.errors = []
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def add_error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+
+def isbn_is_valid(isbn):
+    """Check the ISBN-10 or ISBN-13 check digit of a normalized ISBN"""
+    if len(isbn) == 10:
+        total = sum((10 - i) * (10 if c == 'X' else int(c)) for i, c in enumerate(isbn))
+        return 'X' not in isbn[:9] and total % 11 == 0
+    if len(isbn) == 13:
+        total = sum((3 if i % 2 else 1) * int(c) for i, c in enumerate(isbn))
+        return total % 10 == 0
+    return False
+
+
+def read_csv(stream):
+    """Yield (line number, record) pairs from a CSV file with a header row"""
+    reader = csv.DictReader(stream)
+    for record in reader:
+        yield reader.line_num, record
+
+
+def read_marc(stream):
+    """Yield (line number, record) pairs from MARC mnemonic text (.mrk)
+
+    Records start with ``=LDR`` and are separated by blank lines. Only the
+    tags in ``MARC_FIELDS`` are read; the first occurrence of each wins.
+    """
+    record, start = {}, None
+    for number, line in enumerate(stream, 1):
+        line = line.rstrip('\r\n')
+        if not line.strip():
+            if record:
+                yield start, record
+            record, start = {}, None
+            continue
+        match = MARC_LINE.match(line)
+        if not match:
+            continue
+        tag, data = match.groups()
+        if start is None:
+            start = number
+        if tag < '010':
+            continue
+        # Two indicator characters, then $-delimited subfields
+        for subfield in data[2:].split('$')[1:]:
+            field = MARC_FIELDS.get((tag, subfield[:1]))
+            if field and field not in record:
+                record[field] = subfield[1:].strip(' /:;,.')
+    if record:
+        yield start, record
+
+
+READERS = {'csv': read_csv, 'marc': read_marc}
+
+
+def clean_record(record):
+    """Validate an input record and turn it into a books row mapping
+
+    Raises:
+        RecordError: When a required field is missing or a value is invalid
+    """
+    row = {}
+    for field in BOOK_FIELDS:
+        value = record.get(field)
+        value = value.strip() if isinstance(value, str) else value
+        row[field] = value or None
+
+    missing = [field for field in REQUIRED_FIELDS if not row[field]]
+    if missing:
+        raise RecordError(f'missing {", ".join(missing)}')
+
+    # Drop qualifiers such as "9780306406157 (pbk.)"
+    isbn = normalize_isbn(row['isbn'].split()[0])
+    if not isbn or not isbn_is_valid(isbn):
+        raise RecordError(f'invalid ISBN {row["isbn"]!r}')
+    row['isbn'] = isbn
+
+    for field in INTEGER_FIELDS:
+        if row[field] is None:
+            continue
+        match = LEADING_DIGITS.search(str(row[field]))
+        if not match:
+            raise RecordError(f'{field} must be a number, got {row[field]!r}')
+        row[field] = int(match.group())
+
+    row['quantity'] = row['quantity'] or 1
+    return row
+
+
+def upsert_books(session, rows):
+    """Insert or update a batch of book rows keyed on ISBN
+
+    SQLite and Postgres run one ``INSERT .. ON CONFLICT (isbn) DO UPDATE``
+    executemany. Other backends look up the existing ISBNs and split the
+    batch into bulk inserts and bulk updates. Fields left empty in the
+    input keep their current value. A row's quantity is the number of
+    copies the library should own; see ``sync_copies``.
+    """
+    from app.models.book import Book
+
+    table = Book.__table__
+    dialect = session.connection().dialect.name
+    updated_fields = [field for field in BOOK_FIELDS if field not in ('isbn', 'quantity')]
+    wanted = {row['isbn']: row['quantity'] for row in rows}
+    # New books start without copies; the counters follow the copies added
+    rows = [dict(row, quantity=0, available_quantity=0) for row in rows]
+
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        statement = insert(table)
+        set_ = {
+            field: func.coalesce(statement.excluded[field], table.c[field])
+            for field in updated_fields
+        }
+        # Column onupdate defaults don't apply to ON CONFLICT DO UPDATE
+        set_['row_version'] = table.c.row_version + 1
+        set_['updated_at'] = datetime.utcnow()
+        session.execute(
+            statement.on_conflict_do_update(index_elements=['isbn'], set_=set_),
+            rows
+        )
+    else:
+        existing = dict(
+            session.query(Book.isbn, Book.id).filter(Book.isbn.in_([row['isbn'] for row in rows]))
+        )
+        inserts, updates = [], []
+        for row in rows:
+            if row['isbn'] not in existing:
+                inserts.append(row)
+                continue
+            update = {field: row[field] for field in updated_fields if row.get(field) is not None}
+            updates.append(dict(update, id=existing[row['isbn']]))
+        if inserts:
+            session.bulk_insert_mappings(Book, inserts)
+        if updates:
+            session.bulk_update_mappings(Book, updates)
+
+    sync_copies(session, wanted)
+
+
+def sync_copies(session, wanted):
+    """Add or withdraw copies so each book owns the number wanted
+
+    Copies for the whole batch are added with one INSERT. Only shelf copies
+    are withdrawn, so a book with copies out on loan may keep more than
+    wanted; its available count never goes below zero.
+
+    Args:
+        wanted (dict): ISBN -> number of copies
+    """
+    from app.models.book import Book
+    from app.models.book_copy import BookCopy
+
+    added, withdrawn = {}, {}
+    for book_id, isbn, quantity in session.query(Book.id, Book.isbn, Book.quantity).filter(
+        Book.isbn.in_(wanted)
+    ):
+        change = wanted[isbn] - (quantity or 0)
+        if change > 0:
+            added[book_id] = change
+        elif change < 0:
+            withdrawn[book_id] = -change
+    BookCopy.add_many(added)
+    for book_id, count in withdrawn.items():
+        BookCopy.withdraw(book_id, count)
+
+
+def import_books(stream, fmt='csv', batch_size=IMPORT_BATCH_SIZE, progress=None):
+    """Stream catalog records into the books table in batches
+
+    Each batch is upserted and committed on its own, so memory use is
+    bounded by ``batch_size`` and a bad record only costs its own row.
+
+    Args:
+        stream: Text file object to read from
+        fmt (str): 'csv' or 'marc'
+        batch_size (int): Rows per upsert and commit
+        progress (callable): Called with the ImportResult after every batch
+
+    Returns:
+        ImportResult: Row counts, per-row errors and throughput
+    """
+    from app import db
+    from app.utils.cache import clear_caches
+
+    result = ImportResult()
+    batch = {}
+
+    def flush():
+        upsert_books(db.session, list(batch.values()))
+        db.session.commit()
+        result.imported += len(batch)
+        result.elapsed = time.perf_counter() - result.started
+        batch.clear()
+        if progress:
+            progress(result)
+
+    for line, record in READERS[fmt](stream):
+        result.rows += 1
+        try:
+            row = clean_record(record)
+        except RecordError as error:
+            result.add_error(line, str(error))
+            continue
+        # A repeated ISBN within one batch would hit the same row twice in
+        # a single statement; the later record wins
+        if row['isbn'] in batch:
+            result.duplicates += 1
+        batch[row['isbn']] = row
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    result.elapsed = time.perf_counter() - result.started
+    # The bulk_*_mappings path on other backends is not seen by the
+    # commit-time invalidation
+    clear_caches('catalog', 'stats')
+    return result
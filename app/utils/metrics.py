@@ -0,0 +1,308 @@
+import atexit
+import hmac
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from flask import Response, abort, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the histogram buckets (Prometheus ``le`` labels)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+METRICS = {
+    'http_requests_total': ('counter', 'Requests served, by endpoint, method and status.'),
+    'http_request_duration_seconds': ('histogram', 'Time to build the response, by endpoint.'),
+    'http_request_db_queries': ('histogram', 'SQL statements run per request, by endpoint.'),
+    'db_query_duration_seconds_total': ('counter', 'Time spent in SQL statements, by endpoint.'),
+    'db_slow_queries_total': ('counter', 'SQL statements slower than SLOW_QUERY_MS, by endpoint.'),
+    'cache_hits_total': ('counter', 'Cache lookups served from the cache, by namespace.'),
+    'cache_misses_total': ('counter', 'Cache lookups that were computed, by namespace.'),
+    'cache_invalidations_total': ('counter', 'Namespace clears after writes, by namespace.'),
+    'cache_errors_total': ('counter', 'Cache backend failures, by namespace.'),
+}
+
+
+def _format_labels(labels):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return ','.join(f'{key}="{escape(value)}"' for key, value in labels)
+
+
+class MetricsRegistry:
+    """This worker's counters and histograms, as Prometheus series
+
+    Every series is a running total kept under its rendered name and label
+    string. Series changed since the last ``take_changes`` are tracked so
+    only those are published to the shared store.
+    """
+
+    def __init__(self):
+        self._values = {}
+        self._changed = set()
+        self._lock = threading.Lock()
+
+    def _add(self, name, labels, amount):
+        key = (name, _format_labels(labels))
+        self._values[key] = self._values.get(key, 0) + amount
+        self._changed.add(key)
+
+    def inc(self, name, labels=(), amount=1):
+        with self._lock:
+            self._add(name, labels, amount)
+
+    def set(self, name, labels, value):
+        key = (name, _format_labels(labels))
+        with self._lock:
+            if self._values.get(key) != value:
+                self._values[key] = value
+                self._changed.add(key)
+
+    def observe(self, name, labels, value, buckets):
+        """Count ``value`` into a histogram with cumulative ``buckets``"""
+        with self._lock:
+            for bound in buckets:
+                if value <= bound:
+                    self._add(f'{name}_bucket', labels + (('le', bound),), 1)
+            self._add(f'{name}_bucket', labels + (('le', '+Inf'),), 1)
+            self._add(f'{name}_sum', labels, value)
+            self._add(f'{name}_count', labels, 1)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    def take_changes(self):
+        with self._lock:
+            changes = {key: self._values[key] for key in self._changed}
+            self._changed.clear()
+            return changes
+
+    def keep_changes(self, changes):
+        """Mark series taken by ``take_changes`` as unpublished again"""
+        with self._lock:
+            self._changed.update(changes)
+
+
+class SQLiteMetricsStore:
+    """Per-worker metric totals in a SQLite file shared by the workers
+
+    Each worker replaces its own rows with its running totals, and the
+    totals of workers that have exited are kept, so summing over workers
+    gives counters that never go backwards.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS metrics ('
+                'worker TEXT NOT NULL, name TEXT NOT NULL, labels TEXT NOT NULL, value REAL NOT NULL, '
+                'PRIMARY KEY (worker, name, labels)) WITHOUT ROWID'
+            )
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return connection
+
+    def publish(self, worker, changes):
+        if not changes:
+            return
+        connection = self._connection()
+        with connection:
+            connection.execute('BEGIN')
+            connection.executemany(
+                'INSERT OR REPLACE INTO metrics (worker, name, labels, value) VALUES (?, ?, ?, ?)',
+                [(worker, name, labels, value) for (name, labels), value in changes.items()]
+            )
+
+    def totals(self):
+        return {
+            (name, labels): value for name, labels, value in self._connection().execute(
+                'SELECT name, labels, sum(value) FROM metrics GROUP BY name, labels'
+            )
+        }
+
+
+registry = MetricsRegistry()
+_store = None
+_slow_query_seconds = None
+_publish_seconds = 1.0
+_last_publish = 0.0
+_worker = None
+
+
+def _worker_id():
+    # A new id per process, so a reused pid never overwrites a dead worker's totals
+    global _worker
+    if _worker is None or _worker[0] != os.getpid():
+        _worker = (os.getpid(), f'{os.getpid()}-{uuid.uuid4().hex[:8]}')
+    return _worker[1]
+
+
+def _endpoint():
+    if not has_request_context():
+        return 'none'
+    return request.url_rule.endpoint if request.url_rule else 'unmatched'
+
+
+def _record_cache_stats():
+    from app.utils.cache import cache_stats
+
+    for namespace, stats in cache_stats()['namespaces'].items():
+        labels = (('namespace', namespace),)
+        for counter in ('hits', 'misses', 'invalidations', 'errors'):
+            registry.set(f'cache_{counter}_total', labels, stats[counter])
+
+
+def publish(force=False):
+    """Write this worker's changed series to the shared store
+
+    At most once every ``METRICS_PUBLISH_SECONDS`` unless ``force``d, and
+    once more when the worker exits.
+    """
+    global _last_publish
+    if _store is None:
+        return
+    now = time.monotonic()
+    if not force and now - _last_publish < _publish_seconds:
+        return
+    _last_publish = now
+    _record_cache_stats()
+    changes = registry.take_changes()
+    try:
+        _store.publish(_worker_id(), changes)
+    except sqlite3.Error:
+        logger.exception('Publishing metrics to %s failed', _store.path)
+        registry.keep_changes(changes)
+
+
+def _sort_key(item):
+    (name, labels), _ = item
+    # Order histogram buckets by bound rather than as text
+    base, found, bound = labels.rpartition('le="')
+    if found:
+        bound = bound.rstrip('"')
+        return name, base, float('inf') if bound == '+Inf' else float(bound)
+    return name, labels, 0.0
+
+
+def render():
+    """All workers' metrics in the Prometheus text format"""
+    if _store is not None:
+        publish(force=True)
+        values = _store.totals()
+    else:
+        _record_cache_stats()
+        values = registry.snapshot()
+
+    lines, described = [], set()
+    for (name, labels), value in sorted(values.items(), key=_sort_key):
+        base = name
+        for suffix in ('_bucket', '_sum', '_count'):
+            if name.endswith(suffix) and name[:-len(suffix)] in METRICS:
+                base = name[:-len(suffix)]
+        if base not in described and base in METRICS:
+            kind, help_text = METRICS[base]
+            lines += [f'# HELP {base} {help_text}', f'# TYPE {base} {kind}']
+            described.add(base)
+        lines.append(f'{name}{{{labels}}} {value:g}' if labels else f'{name} {value:g}')
+    return '\n'.join(lines) + '\n'
+
+
+def _start_query(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+def _finish_query(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_metrics_started', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    if has_app_context():
+        g.db_time = g.get('db_time', 0.0) + elapsed
+    if _slow_query_seconds is not None and elapsed >= _slow_query_seconds:
+        registry.inc('db_slow_queries_total', (('endpoint', _endpoint()),))
+        logger.warning('Slow query (%.1fms) in %s: %.500s; parameters: %.500r',
+                       elapsed * 1000, _endpoint(), ' '.join(statement.split()), parameters)
+
+
+def _may_read_metrics(token):
+    from flask_login import current_user
+
+    if token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return True
+    if request.remote_addr in ('127.0.0.1', '::1'):
+        return True
+    return current_user.is_authenticated and current_user.is_admin
+
+
+_listeners_installed = False
+
+
+def init_metrics(app):
+    """Instrument requests and SQL statements, and serve ``/metrics``
+
+    Every request records its latency, SQL statement count and SQL time
+    per endpoint and, with ``SERVER_TIMING_HEADER``, reports them in a
+    ``Server-Timing`` header. Statements slower than ``SLOW_QUERY_MS`` are
+    logged with their parameters. With ``METRICS_DB`` set, workers publish
+    their totals to that SQLite file and ``/metrics`` sums them; otherwise
+    it reports the worker that answers. ``/metrics`` is served to requests
+    bearing ``METRICS_TOKEN``, to admins and to requests from this host.
+    """
+    global _store, _slow_query_seconds, _publish_seconds, _listeners_installed
+    _store = SQLiteMetricsStore(app.config['METRICS_DB']) if app.config.get('METRICS_DB') else None
+    _publish_seconds = app.config.get('METRICS_PUBLISH_SECONDS', 1.0)
+    slow_query_ms = app.config.get('SLOW_QUERY_MS')
+    _slow_query_seconds = slow_query_ms / 1000 if slow_query_ms else None
+    if not _listeners_installed:
+        event.listen(Engine, 'before_cursor_execute', _start_query)
+        event.listen(Engine, 'after_cursor_execute', _finish_query)
+        atexit.register(publish, force=True)
+        _listeners_installed = True
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started = g.get('request_started')
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        queries = g.get('query_count', 0)
+        db_time = g.get('db_time', 0.0)
+        endpoint = (('endpoint', _endpoint()),)
+        registry.inc('http_requests_total', endpoint + (
+            ('method', request.method), ('status', response.status_code)
+        ))
+        registry.observe('http_request_duration_seconds', endpoint, elapsed, LATENCY_BUCKETS)
+        registry.observe('http_request_db_queries', endpoint, queries, QUERY_COUNT_BUCKETS)
+        registry.inc('db_query_duration_seconds_total', endpoint, db_time)
+        if app.config.get('SERVER_TIMING_HEADER'):
+            response.headers['Server-Timing'] = (
+                f'app;dur={elapsed * 1000:.1f}, db;dur={db_time * 1000:.1f};desc="{queries} queries"'
+            )
+        publish()
+        return response
+
+    def metrics():
+        if not _may_read_metrics(app.config.get('METRICS_TOKEN')):
+            abort(403)
+        return Response(render(), mimetype='text/plain; version=0.0.4')
+
+    app.add_url_rule('/metrics', 'metrics', metrics)
@@ -0,0 +1,115 @@
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import tuple_
+
+
+def encode_cursor(values):
+    """Encode a row's sort key values into an opaque URL-safe cursor token"""
+    payload = [
+        {'dt': value.isoformat()} if isinstance(value, datetime) else value
+        for value in values
+    ]
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """Decode a cursor token back into sort key values
+
+    Returns None for missing or malformed tokens so callers can fall back
+    to the first page instead of erroring.
+    """
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(raw.decode('utf-8'))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(payload, list):
+        return None
+    values = []
+    for value in payload:
+        if isinstance(value, dict):
+            if set(value) != {'dt'} or not isinstance(value['dt'], str):
+                return None
+            try:
+                value = datetime.fromisoformat(value['dt'])
+            except ValueError:
+                return None
+        elif value is not None and not isinstance(value, (str, int, float, bool)):
+            return None
+        values.append(value)
+    return values
+
+
+class KeysetPage:
+    """A single page of keyset-paginated results"""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def keyset_paginate(query, columns, per_page, after=None, before=None, descending=False):
+    """Paginate a query by seeking past a sort key instead of using OFFSET
+
+    The cost of fetching any page depends only on ``per_page`` (given an
+    index on ``columns``), not on how deep into the result set it is.
+
+    Args:
+        query: The base query to paginate (without ordering or limit)
+        columns (list): Columns forming a unique sort key, e.g. (title, id)
+        per_page (int): Maximum number of rows per page
+        after (str): Cursor of the last row on the previous page
+        before (str): Cursor of the first row on the next page
+        descending (bool): Sort the key in descending order
+
+    Returns:
+        KeysetPage: The rows plus cursors for the neighbouring pages
+    """
+    after_key = decode_cursor(after)
+    before_key = decode_cursor(before)
+    if after_key is not None and len(after_key) != len(columns):
+        after_key = None
+    if before_key is not None and len(before_key) != len(columns):
+        before_key = None
+
+    # Walking backwards means flipping the sort order and reversing the page
+    backwards = before_key is not None and after_key is None
+    reverse = descending != backwards
+    key = tuple_(*columns)
+
+    if backwards:
+        query = query.filter(key > tuple_(*before_key) if descending else key < tuple_(*before_key))
+    elif after_key is not None:
+        query = query.filter(key < tuple_(*after_key) if descending else key > tuple_(*after_key))
+
+    order = [column.desc() if reverse else column.asc() for column in columns]
+    rows = query.order_by(*order).limit(per_page + 1).all()
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    def cursor_for(row):
+        return encode_cursor([getattr(row, column.key) for column in columns])
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if has_more or backwards:
+            next_cursor = cursor_for(rows[-1])
+        if (has_more and backwards) or (after_key is not None and not backwards):
+            prev_cursor = cursor_for(rows[0])
+    return KeysetPage(rows, next_cursor=next_cursor, prev_cursor=prev_cursor)
@@ -0,0 +1,67 @@
+from contextlib import contextmanager
+from flask import g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_listener_installed = False
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_app_context():
+        g.query_count = g.get('query_count', 0) + 1
+
+
+class QueryCount:
+    """Number of SQL statements executed inside a ``count_queries`` block"""
+
+    def __init__(self):
+        self.start = g.get('query_count', 0)
+        self.end = None
+
+    @property
+    def count(self):
+        end = self.end if self.end is not None else g.get('query_count', 0)
+        return end - self.start
+
+
+@contextmanager
+def count_queries():
+    """Count the SQL statements executed within the block
+
+    Must be used inside an application context, e.g.::
+
+        with app.test_request_context(), count_queries() as counter:
+            ...
+        assert counter.count <= 3
+    """
+    counter = QueryCount()
+    try:
+        yield counter
+    finally:
+        counter.end = g.get('query_count', 0)
+
+
+def init_query_counter(app):
+    """Count SQL statements per request and guard against query explosions
+
+    Every request exposes its statement count in an ``X-Query-Count`` header
+    when ``QUERY_COUNT_HEADER`` is enabled, and logs a warning when it runs
+    more than ``MAX_QUERIES_PER_REQUEST`` statements.
+    """
+    global _listener_installed
+    if not _listener_installed:
+        event.listen(Engine, 'before_cursor_execute', _count_query)
+        _listener_installed = True
+
+    @app.after_request
+    def check_query_count(response):
+        count = g.get('query_count', 0)
+        if app.config.get('QUERY_COUNT_HEADER'):
+            response.headers['X-Query-Count'] = str(count)
+        limit = app.config.get('MAX_QUERIES_PER_REQUEST')
+        if limit and count > limit:
+            app.logger.warning(
+                '%s %s ran %d SQL queries (limit %d)', request.method, request.path, count, limit
+            )
+        return response
+
@@ -0,0 +1,209 @@
+import re
+from datetime import datetime, timedelta
+from sqlalchemy import case, func
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+
+class Explain(Executable, ClauseElement):
+    """Wrap a SELECT so executing it returns the database's query plan"""
+
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(Explain)
+def _explain(element, compiler, **kw):
+    return 'EXPLAIN ' + compiler.process(element.statement, **kw)
+
+
+@compiles(Explain, 'sqlite')
+def _explain_sqlite(element, compiler, **kw):
+    return 'EXPLAIN QUERY PLAN ' + compiler.process(element.statement, **kw)
+
+
+# Queries that are allowed to read a whole table, with the reason why
+KNOWN_FULL_SCANS = {}
+
+
+def hot_queries():
+    """The filtered queries behind circulation_routes and report_routes
+
+    Keep these in step with the routes: ``flask explain-queries`` fails when
+    any of them can no longer be answered from an index.
+
+    Returns:
+        list: (name, query) pairs
+    """
+    from app import db
+    from app.models.book import Book
+    from app.models.book_copy import BookCopy
+    from app.models.member import Member
+    from app.models.circulation import Circulation
+    from app.models.circulation_stats import DailyCirculationStat
+    from app.models.fines import FineLedgerEntry
+    from app.models.hold import Hold
+
+    now = datetime.utcnow()
+    start_date = now - timedelta(days=30)
+    open_loans = Circulation.query.filter(Circulation.return_date.is_(None))
+    returned_loans = Circulation.query.filter(Circulation.return_date.isnot(None))
+    newest_first = (Circulation.checkout_date.desc(), Circulation.id.desc())
+
+    return [
+        ('books.view loan history',
+         Circulation.query.filter(Circulation.book_id == 1).order_by(*newest_first).limit(21)),
+        ('circulation.index open loans',
+         open_loans.order_by(*newest_first).limit(21)),
+        ('circulation.index loan history',
+         returned_loans.order_by(*newest_first).limit(21)),
+        ('circulation.index member open loans',
+         open_loans.filter(Circulation.member_id == 1).order_by(*newest_first).limit(21)),
+        ('circulation.index member loan history',
+         returned_loans.filter(Circulation.member_id == 1).order_by(*newest_first).limit(21)),
+        ('circulation.checkout loan status',
+         db.session.query(func.count(Circulation.id)).filter(
+             Circulation.member_id == 1, Circulation.return_date.is_(None))),
+        ('circulation.checkout available books',
+         Book.query.filter(Book.available_quantity > 0)),
+        ('circulation.overdue',
+         open_loans.filter(Circulation.due_date < now)
+         .order_by(Circulation.due_date, Circulation.id).limit(21)),
+        ('circulation.overdue member',
+         open_loans.filter(Circulation.member_id == 1, Circulation.due_date < now)
+         .order_by(Circulation.due_date, Circulation.id).limit(21)),
+        ('dashboard open loans',
+         db.session.query(
+             func.count(Circulation.id), func.count(case((Circulation.due_date < now, 1)))
+         ).filter(Circulation.return_date.is_(None))),
+        ('reports period totals',
+         db.session.query(
+             func.sum(DailyCirculationStat.checkouts), func.sum(DailyCirculationStat.returns)
+         ).filter(DailyCirculationStat.day >= start_date.date())),
+        ('reports popular books',
+         _top_by(DailyCirculationStat.book_id, Book, start_date)),
+        ('reports active members',
+         _top_by(DailyCirculationStat.member_id, Member, start_date)),
+        ('holds next in line',
+         db.session.query(Hold.id).filter(Hold.book_id == 1, Hold.status == Hold.WAITING)
+         .order_by(Hold.placed_at, Hold.id).limit(1)),
+        ('books categories',
+         db.session.query(Book.category).filter(Book.category.isnot(None), Book.category != '')
+         .distinct().order_by(Book.category)),
+        ('copies next on shelf',
+         db.session.query(BookCopy.id).filter(BookCopy.book_id == 1, BookCopy.status == BookCopy.AVAILABLE)
+         .order_by(BookCopy.id).limit(1)),
+        ('copies batch pick',
+         db.session.query(BookCopy.book_id, func.min(BookCopy.id)).filter(
+             BookCopy.book_id.in_([1, 2, 3]), BookCopy.status == BookCopy.AVAILABLE
+         ).group_by(BookCopy.book_id)),
+        ('copies by barcode',
+         BookCopy.query.filter(BookCopy.barcode == 'B000000010001')),
+        ('books.view copies',
+         BookCopy.query.filter(BookCopy.book_id == 1, BookCopy.status != BookCopy.WITHDRAWN)
+         .order_by(BookCopy.id)),
+        ('holds pickup shelf',
+         Hold.query.filter(Hold.status == Hold.READY).order_by(Hold.expires_at)),
+        ('reports fines collected',
+         db.session.query(func.sum(FineLedgerEntry.amount_cents)).filter(
+             FineLedgerEntry.kind == FineLedgerEntry.PAYMENT, FineLedgerEntry.created_at >= start_date)),
+        ('members.view fine entries',
+         FineLedgerEntry.query.filter(FineLedgerEntry.member_id == 1)
+         .order_by(FineLedgerEntry.created_at.desc(), FineLedgerEntry.id.desc()).limit(10)),
+        ('reports members with overdue',
+         db.session.query(Member, func.count(Circulation.id)).join(Member.circulations).filter(
+             Circulation.return_date.is_(None), Circulation.due_date < now
+         ).group_by(Member.id).order_by(func.count(Circulation.id).desc())),
+        ('reports new members',
+         db.session.query(func.count(Member.id)).filter(Member.registration_date >= start_date)),
+        ('reports export circulations',
+         db.session.query(Circulation.id, Book.isbn, Member.member_id)
+         .join(Book, Book.id == Circulation.book_id).join(Member, Member.id == Circulation.member_id)
+         .filter(Circulation.checkout_date >= start_date, Circulation.checkout_date < now)
+         .order_by(Circulation.checkout_date, Circulation.id)),
+        ('reports inventory summary',
+         db.session.query(
+             func.sum(Book.quantity), func.count(Book.id), func.count(case((Book.loan_count == 0, 1)))
+         )),
+        ('reports books by category',
+         db.session.query(Book.category, func.count(Book.id), func.sum(Book.quantity))
+         .group_by(Book.category)),
+        ('reports unavailable books',
+         Book.query.filter(Book.available_quantity == 0).order_by(Book.title, Book.id).limit(13)),
+        ('reports never loaned books',
+         Book.query.filter(Book.loan_count == 0).order_by(Book.title, Book.id).limit(13)),
+    ]
+
+
+def _top_by(column, model, start_date):
+    from app import db
+    from app.models.circulation_stats import DailyCirculationStat
+
+    total = func.sum(DailyCirculationStat.checkouts)
+    top = db.session.query(column, total.label('loan_count')).filter(
+        DailyCirculationStat.day >= start_date.date(),
+        DailyCirculationStat.checkouts > 0
+    ).group_by(column).order_by(total.desc()).limit(10).subquery()
+    return db.session.query(model, top.c.loan_count).join(
+        top, top.c[column.key] == model.id
+    ).order_by(top.c.loan_count.desc())
+
+
+def explain(connection, query):
+    """Return the query plan lines for an ORM query or Core select"""
+    statement = getattr(query, 'statement', query)
+    rows = connection.execute(Explain(statement)).fetchall()
+    if connection.dialect.name == 'sqlite':
+        # (id, parent, notused, detail)
+        return [row[-1] for row in rows]
+    return [row[0] for row in rows]
+
+
+def full_scans(plan, dialect_name, tables):
+    """Pick out the plan lines that read a whole table rather than an index
+
+    Scans of derived tables (e.g. an aggregated ``anon_1`` subquery) are
+    ignored; only the tables named in ``tables`` count.
+    """
+    offending = []
+    for line in plan:
+        if dialect_name == 'sqlite':
+            match = re.match(r'SCAN (\w+)', line)
+            uses_index = any(marker in line for marker in (
+                'USING INDEX', 'USING COVERING INDEX', 'USING INTEGER PRIMARY KEY'
+            ))
+            if match and match.group(1) in tables and not uses_index:
+                offending.append(line)
+        else:
+            match = re.search(r'Seq Scan on (\w+)', line)
+            if match and match.group(1) in tables:
+                offending.append(line)
+    return offending
+
+
+def check_query_plans(connection):
+    """EXPLAIN every hot query and collect the ones that fall back to a full scan
+
+    Queries listed in ``KNOWN_FULL_SCANS`` are reported but never counted
+    as offending.
+
+    Returns:
+        list: (name, plan lines, offending lines) for every hot query
+    """
+    from app import db
+
+    dialect_name = connection.dialect.name
+    tables = set(db.metadata.tables)
+    if dialect_name == 'postgresql':
+        # Tiny test tables always favour sequential scans; ask whether an
+        # index plan exists at all
+        connection.exec_driver_sql('SET enable_seqscan = off')
+
+    results = []
+    for name, query in hot_queries():
+        plan = explain(connection, query)
+        scans = [] if name in KNOWN_FULL_SCANS else full_scans(plan, dialect_name, tables)
+        results.append((name, plan, scans))
+    return results
@@ -0,0 +1,268 @@
+import re
+from sqlalchemy import DDL, column, func, literal_column, or_, table
+from sqlalchemy.exc import OperationalError
+
+# External-content FTS5 indexes over the searchable columns of each table.
+# The triggers keep them in sync with every INSERT, UPDATE and DELETE,
+# including bulk statements that bypass the ORM.
+SEARCH_COLUMNS = {
+    'books': ('title', 'author', 'isbn'),
+    'members': ('first_name', 'last_name', 'email', 'member_id'),
+}
+
+
+def _sqlite_fts_ddl(table_name, columns):
+    names = ', '.join(columns)
+    new_values = ', '.join(f'new.{column}' for column in columns)
+    old_values = ', '.join(f'old.{column}' for column in columns)
+    fts = f'{table_name}_fts'
+    return [
+        f"""CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+            {names},
+            content='{table_name}', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table_name} BEGIN
+            INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new_values});
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table_name} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old_values});
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {names} ON {table_name} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old_values});
+            INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new_values});
+        END""",
+    ]
+
+
+def _postgres_document(columns):
+    return " || ' ' || ".join(f"coalesce({column}, '')" for column in columns)
+
+
+SQLITE_FTS_DDL = {name: _sqlite_fts_ddl(name, columns) for name, columns in SEARCH_COLUMNS.items()}
+
+# Postgres computes the document on the fly, so an expression index is all
+# that is needed to stay in sync.
+POSTGRES_DOCUMENTS = {name: _postgres_document(columns) for name, columns in SEARCH_COLUMNS.items()}
+POSTGRES_FTS_DDL = {
+    name: [f"CREATE INDEX IF NOT EXISTS ix_{name}_fts ON {name} "
+           f"USING GIN (to_tsvector('simple', {document}))"]
+    for name, document in POSTGRES_DOCUMENTS.items()
+}
+
+books_fts = table('books_fts', column('rowid'), column('rank'), column('books_fts'))
+members_fts = table('members_fts', column('rowid'), column('rank'), column('members_fts'))
+
+ISBN_PATTERN = re.compile(r'^(\d{9}[\dX]|\d{13})$')
+TERM_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+_fts5_available = {}
+
+
+def install_search_index(target, connection, tables=None, **kw):
+    """Create the full-text index for a table, if the backend has one
+
+    Registered as an ``after_create`` listener on each searchable table.
+    Called with ``target=None`` by ``flask search-reindex`` and migrations
+    to install the indexes for ``tables`` (every searchable table by default).
+    """
+    if target is not None:
+        tables = [target.name]
+    elif tables is None:
+        tables = list(SEARCH_COLUMNS)
+
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        ddl = SQLITE_FTS_DDL
+    elif dialect == 'postgresql':
+        ddl = POSTGRES_FTS_DDL
+    else:
+        return
+    try:
+        for name in tables:
+            for statement in ddl[name]:
+                connection.execute(DDL(statement))
+    except OperationalError:
+        # SQLite builds without FTS5 fall back to LIKE matching
+        return
+
+
+def rebuild_search_index(connection, tables=None):
+    """Install the full-text indexes and repopulate them from their tables"""
+    tables = list(tables or SEARCH_COLUMNS)
+    install_search_index(None, connection, tables=tables)
+    if connection.dialect.name != 'sqlite':
+        return
+    for name in tables:
+        if has_fts5(connection, name):
+            connection.execute(DDL(f"INSERT INTO {name}_fts({name}_fts) VALUES ('rebuild')"))
+
+
+def has_fts5(connection, table_name='books'):
+    """Check whether the connected SQLite database has the table's FTS5 index"""
+    key = (str(connection.engine.url), table_name)
+    if not _fts5_available.get(key):
+        found = connection.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (f'{table_name}_fts',)
+        ).first()
+        _fts5_available[key] = found is not None
+    return _fts5_available[key]
+
+
+def normalize_isbn(query):
+    """Return the query as a bare ISBN-10/13 string, or None if it isn't one"""
+    candidate = re.sub(r'[\s-]', '', query).upper()
+    return candidate if ISBN_PATTERN.match(candidate) else None
+
+
+def like_escape(text):
+    """Escape LIKE wildcards so ``text`` matches literally (use with ``escape='\\'``)"""
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def prefix_match(terms):
+    """FTS5 query matching rows that have a word starting with every term"""
+    return ' '.join('"%s"*' % term for term in terms)
+
+
+def _suggest(query, model, fts, text, fallback_columns, fallback_order):
+    """Filter and order a query by prefix matches on its full-text index
+
+    Returns None when the input is too short to be worth a lookup.
+    """
+    from app import db
+
+    compact = re.sub(r'[\s-]', '', text)
+    # Hyphenated ISBNs and IDs are looked up as one token
+    terms = [compact.lower()] if compact.isdigit() else TERM_PATTERN.findall(text.lower())
+    if not terms or len(''.join(terms)) < 2:
+        return None
+
+    connection = db.session.connection()
+    dialect = connection.dialect.name
+    table_name = model.__tablename__
+    if dialect == 'sqlite' and has_fts5(connection, table_name):
+        return query.join(fts, fts.c.rowid == model.id).filter(
+            fts.c[f'{table_name}_fts'].op('MATCH')(prefix_match(terms))
+        ).order_by(fts.c.rank, *fallback_order)
+    if dialect == 'postgresql':
+        document = func.to_tsvector('simple', literal_column(POSTGRES_DOCUMENTS[table_name]))
+        tsquery = func.to_tsquery('simple', ' & '.join('%s:*' % term for term in terms))
+        return query.filter(document.op('@@')(tsquery)).order_by(
+            func.ts_rank(document, tsquery).desc(), *fallback_order
+        )
+    return query.filter(
+        or_(*[column.ilike(f'{like_escape(text)}%', escape='\\') for column in fallback_columns])
+    ).order_by(*fallback_order)
+
+
+def suggest_books(text, limit=10, available_only=False):
+    """Type-ahead matches on title, author and ISBN prefixes
+
+    Args:
+        text (str): What has been typed so far
+        limit (int): Maximum number of suggestions
+        available_only (bool): Skip books with no copy on the shelf
+
+    Returns:
+        list: (id, title, author, isbn, available_quantity) rows, best first
+    """
+    from app import db
+    from app.models.book import Book
+
+    query = db.session.query(Book.id, Book.title, Book.author, Book.isbn, Book.available_quantity)
+    if available_only:
+        query = query.filter(Book.available_quantity > 0)
+    query = _suggest(
+        query, Book, books_fts, (text or '').strip(),
+        (Book.title, Book.author, Book.isbn), (Book.title, Book.id)
+    )
+    return query.limit(limit).all() if query is not None else []
+
+
+def suggest_members(text, limit=10, active_only=False):
+    """Type-ahead matches on member name, email and member ID prefixes
+
+    Returns:
+        list: (id, member_id, first_name, last_name, email) rows, best first
+    """
+    from app import db
+    from app.models.member import Member
+
+    query = db.session.query(Member.id, Member.member_id, Member.first_name, Member.last_name, Member.email)
+    if active_only:
+        query = query.filter(Member.is_active == True)
+    query = _suggest(
+        query, Member, members_fts, (text or '').strip(),
+        (Member.first_name, Member.last_name, Member.email, Member.member_id),
+        (Member.last_name, Member.first_name, Member.id)
+    )
+    return query.limit(limit).all() if query is not None else []
+
+
+def search_books(query, category=None, page=1, per_page=12):
+    """Search the catalog, best matches first
+
+    Exact ISBNs are answered from the unique isbn index. Everything else goes
+    through SQLite FTS5 or a Postgres tsvector index with prefix matching on
+    every term, falling back to LIKE matching on other backends.
+
+    Args:
+        query (str): Free-text search terms
+        category (str): Optional exact category filter
+        page (int): 1-based page number
+        per_page (int): Maximum number of results per page
+
+    Returns:
+        tuple: (books on this page, whether another page follows)
+    """
+    from app import db
+    from app.models.book import Book
+
+    query = (query or '').strip()
+    page = max(page, 1)
+    search_query = Book.query
+
+    isbn = normalize_isbn(query) if query else None
+    if isbn:
+        books = Book.query.filter(Book.isbn.in_({isbn, query})).all()
+        if category:
+            books = [book for book in books if book.category == category]
+        if books:
+            return books, False
+
+    terms = TERM_PATTERN.findall(query)
+    if query and not terms:
+        # Only punctuation, such as a lone '%': nothing can match
+        return [], False
+    if terms:
+        connection = db.session.connection()
+        dialect = connection.dialect.name
+        if dialect == 'sqlite' and has_fts5(connection):
+            match = prefix_match(terms)
+            search_query = search_query.join(books_fts, books_fts.c.rowid == Book.id).filter(
+                books_fts.c.books_fts.op('MATCH')(match)
+            ).order_by(books_fts.c.rank, Book.id)
+        elif dialect == 'postgresql':
+            document = func.to_tsvector('simple', literal_column(POSTGRES_DOCUMENTS['books']))
+            tsquery = func.to_tsquery('simple', ' & '.join('%s:*' % term for term in terms))
+            search_query = search_query.filter(document.op('@@')(tsquery)).order_by(
+                func.ts_rank(document, tsquery).desc(), Book.id
+            )
+        else:
+            pattern = f'%{like_escape(query)}%'
+            search_query = search_query.filter(
+                or_(
+                    Book.title.ilike(pattern, escape='\\'),
+                    Book.author.ilike(pattern, escape='\\'),
+                    Book.isbn.ilike(pattern, escape='\\')
+                )
+            ).order_by(Book.title, Book.id)
+    else:
+        search_query = search_query.order_by(Book.title, Book.id)
+
+    if category:
+        search_query = search_query.filter(Book.category == category)
+
+    books = search_query.offset((page - 1) * per_page).limit(per_page + 1).all()
+    return books[:per_page], len(books) > per_page
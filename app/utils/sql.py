@@ -0,0 +1,38 @@
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+from sqlalchemy.types import Integer
+
+
+class days_between(FunctionElement):
+    """Whole days from one timestamp to a later one, like ``timedelta.days``
+
+    ``days_between(start, end)`` compiles to each backend's own date
+    arithmetic so set-based updates can compute day counts in SQL.
+    """
+    type = Integer()
+    name = 'days_between'
+    inherit_cache = True
+
+
+@compiles(days_between)
+def _days_between(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return 'CAST(FLOOR(EXTRACT(EPOCH FROM (%s - %s)) / 86400) AS INTEGER)' % (
+        compiler.process(end, **kw), compiler.process(start, **kw)
+    )
+
+
+@compiles(days_between, 'sqlite')
+def _days_between_sqlite(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return 'CAST(julianday(%s) - julianday(%s) AS INTEGER)' % (
+        compiler.process(end, **kw), compiler.process(start, **kw)
+    )
+
+
+@compiles(days_between, 'mysql')
+def _days_between_mysql(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return 'TIMESTAMPDIFF(DAY, %s, %s)' % (
+        compiler.process(start, **kw), compiler.process(end, **kw)
+    )
@@ -0,0 +1,103 @@
+from datetime import datetime, time
+from sqlalchemy import case, func, select
+from app import db
+from app.utils.cache import Cache
+
+# Dashboard and report figures, keyed by view (and days where relevant).
+# Any commit that touches books, members or circulations (checkout,
+# return, renew, catalog edits) clears them.
+stats_cache = Cache('stats', ttl=60, models=(
+    'Book', 'Member', 'Circulation', 'DailyCirculationStat', 'FineLedgerEntry'
+))
+
+
+def dashboard_stats():
+    """Admin dashboard totals in a single aggregate query
+
+    The open-loan counts come from one pass over the open loans (served by
+    the partial return_date IS NULL indexes); the book and member totals ride
+    along as scalar subqueries.
+    """
+    from app.models.book import Book
+    from app.models.member import Member
+    from app.models.circulation import Circulation
+
+    def compute():
+        row = db.session.query(
+            select(func.coalesce(func.sum(Book.quantity), 0)).scalar_subquery().label('total_books'),
+            select(func.count(Member.id)).scalar_subquery().label('total_members'),
+            func.count(Circulation.id).label('active_loans'),
+            func.count(case((Circulation.due_date < datetime.utcnow(), 1))).label('overdue_loans')
+        ).filter(Circulation.return_date.is_(None)).one()
+        return dict(row._asdict())
+
+    return stats_cache.get_or_set(('dashboard',), compute)
+
+
+def circulation_summary(days, start_day):
+    """Checkout, return, loan and fine figures for a reporting window
+
+    Period checkouts and returns are summed from the daily rollup in one
+    aggregate query and fines collected from the fine ledger in another;
+    current active and overdue loans and their accrued fines come from one
+    pass over open loans.
+
+    Args:
+        days (int): Length of the reporting window, used as the cache key
+        start_day (date): First day of the reporting window
+    """
+    from app.models.circulation import Circulation
+    from app.models.circulation_stats import DailyCirculationStat
+    from app.models.fines import FineLedgerEntry
+
+    def compute():
+        totals = db.session.query(
+            func.coalesce(func.sum(DailyCirculationStat.checkouts), 0).label('total_checkouts'),
+            func.coalesce(func.sum(DailyCirculationStat.returns), 0).label('total_returns')
+        ).filter(DailyCirculationStat.day >= start_day).one()
+        fines_collected = FineLedgerEntry.collected_since(datetime.combine(start_day, time.min))
+        open_loans = db.session.query(
+            func.count(Circulation.id).label('active_loans'),
+            func.count(case((Circulation.due_date < datetime.utcnow(), 1))).label('overdue_loans'),
+            # Stored by the fine accrual job rather than computed per loan here
+            func.coalesce(func.sum(Circulation.fine_amount), 0).label('fines_accrued')
+        ).filter(Circulation.return_date.is_(None)).one()
+        return {**totals._asdict(), **open_loans._asdict(), 'fines_collected': fines_collected}
+
+    return stats_cache.get_or_set(('circulation_summary', days), compute)
+
+
+def inventory_summary():
+    """Catalog-wide inventory totals and per-category breakdown
+
+    Both come from index-only scans of the books inventory index: one
+    aggregate query for the totals (including the sizes of the unavailable
+    and never-loaned lists) and one for the categories.
+    """
+    from app.models.book import Book
+
+    def compute():
+        totals = db.session.query(
+            func.coalesce(func.sum(Book.quantity), 0).label('total_books'),
+            func.count(Book.id).label('unique_titles'),
+            func.coalesce(func.sum(Book.available_quantity), 0).label('available_books'),
+            func.count(case((Book.available_quantity == 0, 1))).label('unavailable_count'),
+            func.count(case((Book.loan_count == 0, 1))).label('never_loaned_count')
+        ).one()._asdict()
+        totals['on_loan'] = totals['total_books'] - totals['available_books']
+        totals['categories'] = [
+            tuple(row) for row in db.session.query(
+                Book.category,
+                func.count(Book.id),
+                func.coalesce(func.sum(Book.quantity), 0),
+                func.coalesce(func.sum(Book.available_quantity), 0)
+            ).group_by(Book.category).order_by(func.count(Book.id).desc())
+        ]
+        return totals
+
+    return stats_cache.get_or_set(('inventory',), compute)
+
+
+def invalidate_stats():
+    """Drop every cached dashboard and report figure"""
+    stats_cache.clear()
@@ -0,0 +1,447 @@
+import math
+import random
+import time
+from array import array
+from datetime import datetime, timedelta
+from itertools import accumulate
+from werkzeug.security import generate_password_hash
+
+# Rows generated at scale 1.0, roughly a large city library system
+SCALE_ROWS = {'books': 1000000, 'members': 200000, 'circulations': 10000000}
+SEED_BATCH_SIZE = 10000
+HISTORY_DAYS = 3 * 365
+
+# Popularity is a power law: a draw lands on rank ``n * random() ** SKEW``,
+# so with these exponents the top 1% of titles take about a fifth of all
+# loans and the top 10% of members about two fifths
+BOOK_SKEW = 3.0
+MEMBER_SKEW = 2.5
+MAX_COPIES = 20
+ACTIVE_LOAN_SHARE = 0.02
+OPEN_LOAN_MEAN_DAYS = 10  # about a quarter of open loans are past due
+LATE_RETURN_RATE = 0.15
+LATE_RETURN_MEAN_DAYS = 6
+FINE_PAID_RATE = 0.7
+INACTIVE_MEMBER_RATE = 0.03
+PRE_HISTORY_MEMBER_SHARE = 0.6
+
+# The two sign-ins the README documents; every other member shares the
+# password ``MEMBER_PASSWORD``
+DEMO_ACCOUNTS = (
+    ('Admin', 'User', 'admin@example.com', 'admin123', True),
+    ('John', 'Doe', 'john@example.com', 'password123', False),
+)
+MEMBER_PASSWORD = 'password123'
+
+FIRST_NAMES = (
+    'James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda', 'David', 'Elizabeth',
+    'William', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah', 'Carlos', 'Karen',
+    'Wei', 'Aisha', 'Mohammed', 'Priya', 'Hiroshi', 'Olga', 'Kwame', 'Sofia', 'Mateo', 'Fatima',
+)
+LAST_NAMES = (
+    'Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez', 'Martinez',
+    'Hernandez', 'Lopez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore', 'Jackson', 'Martin', 'Lee',
+    'Chen', 'Okafor', 'Khan', 'Patel', 'Tanaka', 'Ivanova', 'Mensah', 'Rossi', 'Silva', 'Nguyen',
+)
+TITLE_WORDS = (
+    'Shadow', 'River', 'Garden', 'Winter', 'Empire', 'Silence', 'Glass', 'Storm', 'Harbor', 'Memory',
+    'Night', 'Fire', 'Stone', 'Forest', 'Crown', 'Mirror', 'Ocean', 'Letter', 'Bridge', 'Star',
+    'Road', 'House', 'Island', 'Secret', 'Mountain', 'City', 'Dream', 'Clock', 'Wolf', 'Light',
+)
+TITLE_FORMS = (
+    'The {0}', 'The {0} of the {1}', '{0} and {1}', 'A {0} in the {1}', 'Beyond the {0}',
+    'The Last {0}', 'Children of the {0}', 'The {0} Keeper', 'Under the {0}', 'The {0} Years',
+)
+# Category and its share of the catalog
+CATEGORIES = (
+    ('Fiction', 22), ('Mystery', 9), ('Science Fiction', 7), ('Fantasy', 7), ('Romance', 6),
+    ('Young Adult', 6), ('Biography', 5), ('History', 6), ('Science', 5), ('Self-Help', 4),
+    ('Children', 8), ('Horror', 3), ('Poetry', 2), ('Travel', 3), ('Cooking', 3), ('Non-Fiction', 4),
+)
+PUBLISHERS = (
+    'Penguin', 'HarperCollins', 'Simon & Schuster', 'Macmillan', 'Hachette', 'Scholastic',
+    'Vintage', 'Anchor', 'Bantam', 'Del Rey', 'Tor', 'Random House', 'Norton', 'Wiley',
+)
+LANGUAGES = (('English', 88), ('Spanish', 5), ('French', 3), ('German', 2), ('Chinese', 2))
+
+
+class SeedResult:
+    """Row counts and throughput for a synthetic data run"""
+
+    def __init__(self):
+        self.counts = {'books': 0, 'book_copies': 0, 'members': 0, 'circulations': 0, 'fine_ledger': 0}
+        self.step = None
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    @property
+    def rows(self):
+        return sum(self.counts.values())
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+
+def scaled_sizes(scale, books=None, members=None, circulations=None):
+    """Row targets for a scale factor, with any explicit counts taking precedence"""
+    sizes = {name: max(1, round(rows * scale)) for name, rows in SCALE_ROWS.items()}
+    for name, value in (('books', books), ('members', members), ('circulations', circulations)):
+        if value is not None:
+            sizes[name] = value
+    sizes['members'] = max(sizes['members'], len(DEMO_ACCOUNTS))
+    return sizes
+
+
+def isbn13(number):
+    """A valid ISBN-13 in the 978 prefix, unique for each ``number``"""
+    digits = f'978{number:09d}'
+    total = sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(digits))
+    return digits + str(-total % 10)
+
+
+def _scatter(count):
+    """Map popularity ranks 0..count-1 to ids 1..count with a coprime stride
+
+    Popular rows then sit all over the tables and indexes, as they would
+    in real data, instead of being the first ids inserted.
+    """
+    stride = 1000003
+    while math.gcd(stride, count) != 1:
+        stride += 2
+    return lambda rank: rank * stride % count + 1
+
+
+def _weighted(pairs):
+    values, weights = zip(*pairs)
+    return values, list(accumulate(weights))
+
+
+class _Generator:
+    """One run's random state and the per-row arrays the tables share"""
+
+    def __init__(self, sizes, seed, batch_size, now, result, progress):
+        self.sizes = sizes
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.now = now
+        self.result = result
+        self.progress = progress
+        self.book_id = _scatter(sizes['books'])
+        self.member_id = _scatter(sizes['members'])
+
+    def days_ago(self, days):
+        return self.now - timedelta(days=days)
+
+    def book_rank(self):
+        return int(self.sizes['books'] * self.rng.random() ** BOOK_SKEW)
+
+    def member_rank(self):
+        return int(self.sizes['members'] * self.rng.random() ** MEMBER_SKEW)
+
+    def insert(self, table, rows, name):
+        from app import db
+
+        if rows:
+            db.session.execute(table.insert(), rows)
+            self.result.counts[name] += len(rows)
+
+    def commit(self):
+        from app import db
+
+        db.session.commit()
+        self.result.elapsed = time.perf_counter() - self.result.started
+        if self.progress:
+            self.progress(self.result)
+
+    def plan(self):
+        """Draw copy counts, member activity and the open loans up front
+
+        Open loans are capped by each book's copies and each member's loan
+        limit, so books and copies can be written with their final
+        counters and statuses.
+        """
+        from app.config import Config
+
+        rng, sizes = self.rng, self.sizes
+        books, members = sizes['books'], sizes['members']
+
+        # Copies by popularity: the top titles get up to MAX_COPIES, and
+        # each book's copies take a run of ids starting at first_copy
+        self.copies = array('H', [0]) * (books + 1)
+        for rank in range(books):
+            self.copies[self.book_id(rank)] = (
+                1 + int((MAX_COPIES - 2) * (1 - rank / books) ** 20) + (rng.random() < 0.3)
+            )
+        self.first_copy = array('q', [0]) * (books + 1)
+        next_copy = 1
+        for book_id in range(1, books + 1):
+            self.first_copy[book_id] = next_copy
+            next_copy += self.copies[book_id]
+
+        # Registration as days before now, the demo accounts first of all
+        history_before = HISTORY_DAYS + 5 * 365
+        self.registered = array('d', (
+            history_before - rng.random() * 5 * 365 if rng.random() < PRE_HISTORY_MEMBER_SHARE
+            else rng.random() * HISTORY_DAYS
+            for _ in range(members)
+        ))
+        self.active = bytearray(rng.random() >= INACTIVE_MEMBER_RATE for _ in range(members))
+        for index in range(len(DEMO_ACCOUNTS)):
+            self.registered[index] = history_before
+            self.active[index] = 1
+
+        # Open loans, most recent few weeks, some past due
+        on_loan = array('H', [0]) * (books + 1)
+        borrowed = array('H', [0]) * (members + 1)
+        wanted = round(sizes['circulations'] * ACTIVE_LOAN_SHARE)
+        self.open_loans = []
+        for _ in range(wanted):
+            age = min(rng.expovariate(1 / OPEN_LOAN_MEAN_DAYS), 120.0)
+            member_id = self.pick_member(age, lambda m: (
+                self.active[m - 1] and borrowed[m] < Config.MAX_BOOKS_PER_MEMBER
+            ))
+            book_id = None
+            for _ in range(8):
+                candidate = self.book_id(self.book_rank())
+                if on_loan[candidate] < self.copies[candidate]:
+                    book_id = candidate
+                    break
+            if member_id is None or book_id is None:
+                continue
+            copy_id = self.first_copy[book_id] + on_loan[book_id]
+            on_loan[book_id] += 1
+            borrowed[member_id] += 1
+            self.open_loans.append((age, book_id, member_id, copy_id))
+        self.open_loans.sort(reverse=True)
+        self.on_loan = on_loan
+
+    def pick_member(self, days_ago, eligible=None):
+        """A skewed draw of a member registered ``days_ago`` or earlier"""
+        for _ in range(8):
+            member_id = self.member_id(self.member_rank())
+            if self.registered[member_id - 1] >= days_ago and (eligible is None or eligible(member_id)):
+                return member_id
+        return None
+
+    def write_members(self):
+        from app.models.member import Member
+
+        rng, table = self.rng, Member.__table__
+        shared_hash = generate_password_hash(MEMBER_PASSWORD)
+        demo = {
+            index + 1: (first, last, email, generate_password_hash(password), is_admin)
+            for index, (first, last, email, password, is_admin) in enumerate(DEMO_ACCOUNTS)
+        }
+        rows = []
+        for member_id in range(1, self.sizes['members'] + 1):
+            if member_id in demo:
+                first, last, email, password_hash, is_admin = demo[member_id]
+            else:
+                first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+                email = f'{first}.{last}.{member_id}@example.com'.lower()
+                password_hash, is_admin = shared_hash, False
+            registered = self.days_ago(self.registered[member_id - 1])
+            rows.append({
+                'id': member_id, 'member_id': f'LIB-{member_id:07d}', 'first_name': first, 'last_name': last,
+                'email': email, 'password_hash': password_hash,
+                'phone': f'555-{rng.randint(100, 999)}-{rng.randint(1000, 9999)}',
+                'address': f'{rng.randint(1, 9999)} {rng.choice(TITLE_WORDS)} St, Sample City',
+                'registration_date': registered, 'is_active': bool(self.active[member_id - 1]),
+                'is_admin': is_admin, 'balance_cents': 0, 'row_version': 1, 'updated_at': registered,
+            })
+            if len(rows) >= self.batch_size:
+                self.insert(table, rows, 'members')
+                self.commit()
+                rows = []
+        self.insert(table, rows, 'members')
+        self.commit()
+
+    def write_books(self):
+        """Books in id order, each batch followed by its copies"""
+        from app.models.book import Book
+        from app.models.book_copy import BookCopy
+
+        rng = self.rng
+        categories, category_weights = _weighted(CATEGORIES)
+        languages, language_weights = _weighted(LANGUAGES)
+        books, copies = [], []
+        for book_id in range(1, self.sizes['books'] + 1):
+            category = rng.choices(categories, cum_weights=category_weights)[0]
+            title = rng.choice(TITLE_FORMS).format(rng.choice(TITLE_WORDS), rng.choice(TITLE_WORDS))
+            author = f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+            added = self.days_ago(HISTORY_DAYS + rng.random() * 10 * 365)
+            owned, lent = self.copies[book_id], self.on_loan[book_id]
+            books.append({
+                'id': book_id, 'title': title, 'author': author, 'isbn': isbn13(book_id),
+                'publisher': rng.choice(PUBLISHERS), 'publication_year': rng.randint(1900, self.now.year),
+                'description': f'{title}, a {category.lower()} title by {author}.',
+                'category': category, 'language': rng.choices(languages, cum_weights=language_weights)[0],
+                'pages': rng.randint(80, 900), 'quantity': owned, 'available_quantity': owned - lent,
+                'location_shelf': f'{category[0]}-{rng.randint(1, 99)}', 'date_added': added,
+                'cover_image': None, 'loan_count': 0, 'last_loaned_at': None, 'row_version': 1,
+                'updated_at': added,
+            })
+            first = self.first_copy[book_id]
+            for number in range(owned):
+                copies.append({
+                    'id': first + number, 'book_id': book_id,
+                    'barcode': BookCopy.barcode_for(book_id, number + 1),
+                    'status': BookCopy.ON_LOAN if number < lent else BookCopy.AVAILABLE,
+                    'location_shelf': None, 'added_at': added,
+                })
+            if len(books) >= self.batch_size:
+                self.insert(Book.__table__, books, 'books')
+                self.insert(BookCopy.__table__, copies, 'book_copies')
+                self.commit()
+                books, copies = [], []
+        self.insert(Book.__table__, books, 'books')
+        self.insert(BookCopy.__table__, copies, 'book_copies')
+        self.commit()
+
+    def write_circulations(self):
+        """Returned loans spread over the history, then the open ones
+
+        Ids rise with checkout date, as they do in a live system. Late
+        returns carry their fine, and each fine goes into the ledger along
+        with a payment when it was settled.
+        """
+        from app.config import Config
+        from app.models.circulation import Circulation
+        from app.models.fines import FineLedgerEntry, to_cents
+
+        rng = self.rng
+        loan_days = Config.MAX_LOAN_DAYS
+        returned = self.sizes['circulations'] - len(self.open_loans)
+        loans, ledger = [], []
+        loan_id = 0
+
+        def flush():
+            self.insert(Circulation.__table__, loans, 'circulations')
+            self.insert(FineLedgerEntry.__table__, ledger, 'fine_ledger')
+            self.commit()
+            loans.clear()
+            ledger.clear()
+
+        for n in range(returned):
+            age = HISTORY_DAYS * (1 - (n + rng.random()) / returned)
+            # The demo member stands in for the rare draw with nobody registered yet
+            member_id = self.pick_member(age) or 2
+            book_id = self.book_id(self.book_rank())
+            kept = (loan_days + 1 + rng.expovariate(1 / LATE_RETURN_MEAN_DAYS)
+                    if rng.random() < LATE_RETURN_RATE else rng.uniform(0.5, loan_days))
+            if kept >= age:
+                # Would still be out today; bring it back before now instead
+                kept = age * rng.random()
+            checkout = self.days_ago(age)
+            due = checkout + timedelta(days=loan_days)
+            returned_at = checkout + timedelta(days=kept)
+            late = Circulation.days_overdue(due, returned_at)
+            fine = late * Config.FINE_PER_DAY
+            paid = fine > 0 and rng.random() < FINE_PAID_RATE
+            loan_id += 1
+            loans.append({
+                'id': loan_id, 'book_id': book_id, 'member_id': member_id,
+                'copy_id': self.first_copy[book_id] + rng.randrange(self.copies[book_id]),
+                'checkout_date': checkout, 'due_date': due, 'return_date': returned_at,
+                'fine_amount': fine, 'fine_paid': paid, 'overdue_days': late,
+                'fines_accrued_at': None, 'notes': None, 'row_version': 1, 'updated_at': returned_at,
+            })
+            if fine > 0:
+                entry = {'member_id': member_id, 'circulation_id': loan_id, 'created_at': returned_at,
+                         'recorded_by_id': None, 'note': None}
+                ledger.append(dict(entry, kind=FineLedgerEntry.FINE, amount_cents=to_cents(fine)))
+                if paid:
+                    ledger.append(dict(entry, kind=FineLedgerEntry.PAYMENT, amount_cents=-to_cents(fine)))
+            if len(loans) >= self.batch_size:
+                flush()
+
+        for age, book_id, member_id, copy_id in self.open_loans:
+            checkout = self.days_ago(age)
+            loan_id += 1
+            loans.append({
+                'id': loan_id, 'book_id': book_id, 'member_id': member_id, 'copy_id': copy_id,
+                'checkout_date': checkout, 'due_date': checkout + timedelta(days=loan_days),
+                'return_date': None, 'fine_amount': 0.0, 'fine_paid': False, 'overdue_days': 0,
+                'fines_accrued_at': None, 'notes': None, 'row_version': 1, 'updated_at': checkout,
+            })
+            if len(loans) >= self.batch_size:
+                flush()
+        if loans:
+            flush()
+
+
+def clear_library():
+    """Delete every catalog, member and circulation row, children first"""
+    from app import db
+    from app.models.book import Book
+    from app.models.book_copy import BookCopy
+    from app.models.circulation import Circulation
+    from app.models.circulation_stats import DailyCirculationStat
+    from app.models.fines import FineLedgerEntry
+    from app.models.hold import Hold
+    from app.models.member import Member
+
+    for model in (DailyCirculationStat, FineLedgerEntry, Hold, Circulation, BookCopy, Book, Member):
+        model.query.delete(synchronize_session=False)
+    db.session.commit()
+
+
+def generate_library(scale=0.01, seed=42, batch_size=SEED_BATCH_SIZE, books=None, members=None,
+                     circulations=None, as_of=None, progress=None):
+    """Fill an empty database with a synthetic library at ``scale``
+
+    Scale 1.0 is about a million books, 200,000 members and ten million
+    loans (see ``SCALE_ROWS``). Loans follow power-law popularity for
+    titles and borrowers, popular titles own more copies, some returns are
+    late and fined, and a few percent of loans are still open, some of
+    them overdue. The same ``seed`` and ``as_of`` always produce the same
+    rows.
+
+    Rows go in as multi-row Core INSERTs with explicit ids, committed
+    every ``batch_size`` rows, so memory use stays bounded by a batch plus
+    a few bytes per book and member. Members share one precomputed
+    password hash. The derived data (loan counters, accrued fines, member
+    balances, the daily rollup) is then built with the set-based rebuilds.
+
+    Args:
+        as_of (datetime): The generated "today", now by default
+        progress (callable): Called with the SeedResult after every batch
+            and derived-data step
+
+    Returns:
+        SeedResult: Row counts and throughput
+    """
+    from app import db
+    from app.models.book import Book
+    from app.models.circulation import Circulation
+    from app.models.circulation_stats import DailyCirculationStat
+    from app.models.fines import FineLedgerEntry
+    from app.utils.cache import clear_caches
+
+    result = SeedResult()
+    sizes = scaled_sizes(scale, books, members, circulations)
+    now = as_of or datetime.utcnow().replace(microsecond=0)
+    generator = _Generator(sizes, seed, batch_size, now, result, progress)
+
+    result.step = 'planning'
+    generator.plan()
+    result.step = 'members'
+    generator.write_members()
+    result.step = 'books'
+    generator.write_books()
+    result.step = 'circulations'
+    generator.write_circulations()
+
+    for step, rebuild in (
+        ('loan counters', Book.refresh_loan_stats),
+        ('overdue fines', lambda: Circulation.accrue_fines(generator.now)),
+        ('member balances', FineLedgerEntry.refresh_balances),
+        ('daily rollup', lambda: DailyCirculationStat.backfill(window_days=7)),
+    ):
+        result.step = step
+        rebuild()
+        generator.commit()
+    clear_caches()
+    result.step = None
+    return result
@@ -0,0 +1,54 @@
+import time
+from sqlalchemy.exc import OperationalError
+
+# Postgres serialization failure, deadlock and lock-not-available
+RETRYABLE_PGCODES = {'40001', '40P01', '55P03'}
+SQLITE_LOCK_MESSAGES = ('database is locked', 'database table is locked')
+
+
+class ConflictError(Exception):
+    """A bulk conditional update changed fewer rows than it read as eligible
+
+    Another transaction got to some of the rows in between; the unit of
+    work should be rolled back and re-run against fresh state.
+    """
+
+
+def is_conflict(error):
+    """Check whether a database error is a lock or serialization conflict"""
+    pgcode = getattr(error.orig, 'pgcode', None)
+    if pgcode:
+        return pgcode in RETRYABLE_PGCODES
+    return any(message in str(error.orig) for message in SQLITE_LOCK_MESSAGES)
+
+
+def retry_on_conflict(operation, attempts=3, backoff=0.05):
+    """Run ``operation`` and commit, retrying on conflicts
+
+    Database lock, deadlock and serialization errors are retried, as is
+    ``ConflictError`` from an optimistic bulk update. The operation is
+    re-run from scratch after a rollback, so it must do all of its reads
+    and writes itself rather than relying on state from a previous attempt.
+
+    Args:
+        operation (callable): Does the work in ``db.session``; its return
+            value is passed through
+        attempts (int): Maximum number of tries
+        backoff (float): Seconds to wait before the first retry, doubled
+            after every failure
+
+    Returns:
+        Whatever ``operation`` returned on the attempt that committed
+    """
+    from app import db
+
+    for attempt in range(1, attempts + 1):
+        try:
+            result = operation()
+            db.session.commit()
+            return result
+        except (OperationalError, ConflictError) as error:
+            db.session.rollback()
+            if attempt == attempts or not (isinstance(error, ConflictError) or is_conflict(error)):
+                raise
+            time.sleep(backoff * 2 ** (attempt - 1))
@@ -0,0 +1,30 @@
+"""index book loan history
+
+Replaces the single-column book index on circulations with one that also
+orders a book's loans newest first, for the paged history on the book page.
+
+Revision ID: 5b8e2f9c41d7
+Revises: 771dc8e82b54
+Create Date: 2026-10-18 16:12:05.318447
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b8e2f9c41d7'
+down_revision = '771dc8e82b54'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_circulations_book_checkout', 'circulations',
+                    ['book_id', 'checkout_date', 'id'], unique=False)
+    op.drop_index('ix_circulations_book_id', table_name='circulations')
+
+
+def downgrade():
+    op.create_index('ix_circulations_book_id', 'circulations', ['book_id'], unique=False)
+    op.drop_index('ix_circulations_book_checkout', table_name='circulations')
@@ -0,0 +1,34 @@
+"""add member search index
+
+Full-text index over member names, emails and member IDs for the
+checkout type-ahead, populated from the existing rows.
+
+Revision ID: ca561813f105
+Revises: 0324257ea3b5
+Create Date: 2026-10-18 04:33:47.770602
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.utils.search import rebuild_search_index
+
+
+# revision identifiers, used by Alembic.
+revision = 'ca561813f105'
+down_revision = '0324257ea3b5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    rebuild_search_index(op.get_bind(), tables=['members'])
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        for trigger in ('members_fts_ai', 'members_fts_ad', 'members_fts_au'):
+            op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        op.execute('DROP TABLE IF EXISTS members_fts')
+    elif op.get_bind().dialect.name == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_members_fts')
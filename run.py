@@ -1,18 +1,12 @@
 import os
 from app import create_app, db
-from flask_migrate import Migrate
 
 app = create_app()
-migrate = Migrate(app, db)
 
-# Import models to ensure they're recognized by Alembic
-from app.models.book import Book
-from app.models.member import Member
-from app.models.circulation import Circulation
-
-# Create a CLI context for Flask commands like flask db migrate
+# Names preloaded in `flask shell`; imported there rather than at startup
 @app.shell_context_processor
 def make_shell_context():
+    from app.models import Book, Member, Circulation
     return {
         'db': db, 
         'Book': Book, 